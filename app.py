@@ -1,13 +1,29 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-from tkcalendar import DateEntry
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from tkinter import ttk, messagebox, simpledialog, filedialog
 import datetime
+import os
+import threading
+import time
+from decimal import Decimal
+from background import BackgroundExecutor
 from database import *
+from diagnostics import recorder, timed
+from journal import Replayer, WriteJournal
 from dotenv import load_dotenv
 
+# tkcalendar, numpy and matplotlib are imported on first use so the window
+# can paint before they load
+
+def load_report_modules():
+    """Import the charting stack; runs on a worker when Reports first opens."""
+    import numpy
+    import matplotlib.figure
+
 class ExpenseTrackerApp:
+    # Rows fetched per keyset page, and the most pages kept in the Treeview
+    PAGE_SIZE = 200
+    MAX_PAGES = 3
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Expense Tracker")
@@ -17,9 +33,6 @@ class ExpenseTrackerApp:
         # Load environment variables
         load_dotenv()
         
-        # Initialize database
-        create_tables()
-        
         # Configure styles
         self.style = ttk.Style()
         self.style.theme_use('clam')
@@ -31,20 +44,65 @@ class ExpenseTrackerApp:
         self.main_container = ttk.Frame(root)
         self.main_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
+        # Status bar with a loading indicator for background database work
+        status_frame = ttk.Frame(self.main_container)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_var = tk.StringVar(value="Ready")
+        ttk.Label(status_frame, textvariable=self.status_var).pack(side=tk.LEFT)
+        self.busy_bar = ttk.Progressbar(status_frame, mode='indeterminate', length=120)
+        ttk.Button(status_frame, text="Diagnostics", command=self.show_diagnostics).pack(side=tk.RIGHT)
+        self.queue_var = tk.StringVar()
+        ttk.Label(status_frame, textvariable=self.queue_var).pack(side=tk.RIGHT, padx=10)
+        self.diagnostics_window = None
+        
+        # Database calls run on worker threads so the window never blocks
+        self.executor = BackgroundExecutor(root, on_busy_change=self.set_busy)
+        
+        # Adds, edits and deletes are journaled locally first and replayed
+        # into the database in the background, so a save never waits on an
+        # unreachable or slow server and is not lost if it is down
+        self.journal = WriteJournal(os.getenv('EXPENSE_TRACKER_JOURNAL', 'expense_tracker.journal'))
+        self.replayer = Replayer(
+            self.journal,
+            apply_queued_writes,
+            permanent=QUEUED_WRITE_DATA_ERRORS,
+            on_applied=lambda entries, results: self.executor.post(self.on_writes_applied, entries, results),
+            on_rejected=lambda entry, error: self.executor.post(self.on_write_rejected, entry, error)
+        )
+        
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.main_container)
         self.notebook.pack(fill=tk.BOTH, expand=True)
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
         
         # Create tabs
         self.create_add_expense_tab()
         self.create_view_expenses_tab()
         self.create_reports_tab()
+        self.create_budgets_tab()
+        
+        # Budget thresholds are checked on every committed write, usually on
+        # the journal replayer's thread; alerts are shown on the Tk thread
+        add_budget_listener(lambda alerts: self.executor.post(self.show_budget_alerts, alerts))
         
         # Initialize variables
         self.current_year = datetime.datetime.now().year
         self.current_month = datetime.datetime.now().month
         
-        # Load initial data
+        # Schema check and the first page load run on a worker, so the
+        # window paints without waiting for the database
+        self.executor.submit(
+            create_tables,
+            key='startup',
+            on_success=lambda _: self.on_database_ready(),
+            on_error=self.error_callback("Failed to open the database")
+        )
+        self.root.after_idle(self.create_date_picker)
+        self.update_queue_status()
+    
+    def on_database_ready(self):
+        """Start replaying journaled writes and load the first page."""
+        self.replayer.start()
         self.load_expenses()
     
     def create_add_expense_tab(self):
@@ -72,27 +130,48 @@ class ExpenseTrackerApp:
         
         ttk.Label(frame, text="Date:").grid(row=2, column=0, sticky=tk.W, pady=5)
         self.date_var = tk.StringVar(value=datetime.date.today().strftime('%Y-%m-%d'))
-        self.date_entry = DateEntry(
-            frame, 
-            textvariable=self.date_var, 
-            width=18, 
-            background='darkblue',
-            foreground='white',
-            borderwidth=2,
-            date_pattern='yyyy-mm-dd'
-        )
+        # Plain entry until create_date_picker swaps in the calendar widget
+        self.date_entry = ttk.Entry(frame, textvariable=self.date_var, width=20)
         self.date_entry.grid(row=2, column=1, sticky=tk.W, pady=5)
         
         ttk.Label(frame, text="Description:").grid(row=3, column=0, sticky=tk.NW, pady=5)
         self.desc_text = tk.Text(frame, width=30, height=4)
         self.desc_text.grid(row=3, column=1, sticky=tk.W, pady=5)
         
+        # Fill in the category the rules give the description, unless one was picked
+        self.suggested_category = None
+        self.suggest_job = None
+        self.desc_text.bind('<KeyRelease>', lambda event: self.schedule_suggestion())
+        self.amount_var.trace_add('write', lambda *args: self.schedule_suggestion())
+        
         # Buttons
         button_frame = ttk.Frame(frame)
         button_frame.grid(row=4, column=0, columnspan=2, pady=15)
         
         ttk.Button(button_frame, text="Add Expense", command=self.add_expense).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Clear Form", command=self.clear_form).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Import...", command=self.import_expenses).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Rules...", command=self.manage_rules).pack(side=tk.LEFT, padx=5)
+        
+        # Bulk import progress
+        self.import_status_var = tk.StringVar()
+        ttk.Label(frame, textvariable=self.import_status_var).grid(row=5, column=0, columnspan=2, sticky=tk.W)
+    
+    def create_date_picker(self):
+        """Replace the plain date entry with a tkcalendar DateEntry."""
+        from tkcalendar import DateEntry
+        frame = self.date_entry.master
+        self.date_entry.destroy()
+        self.date_entry = DateEntry(
+            frame, 
+            textvariable=self.date_var, 
+            width=18, 
+            background='darkblue',
+            foreground='white',
+            borderwidth=2,
+            date_pattern='yyyy-mm-dd'
+        )
+        self.date_entry.grid(row=2, column=1, sticky=tk.W, pady=5)
     
     def create_view_expenses_tab(self):
         """Create the 'View Expenses' tab."""
@@ -133,13 +212,54 @@ class ExpenseTrackerApp:
             command=self.load_expenses
         ).pack(side=tk.LEFT, padx=10)
         
+        ttk.Button(
+            filter_frame, 
+            text="Export...", 
+            command=self.export_expenses
+        ).pack(side=tk.LEFT, padx=5)
+        
+        # Full-text search over descriptions in every month
+        ttk.Button(filter_frame, text="Search", command=self.run_search).pack(side=tk.RIGHT, padx=5)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(filter_frame, textvariable=self.search_var, width=24)
+        search_entry.pack(side=tk.RIGHT, padx=5)
+        search_entry.bind('<Return>', lambda event: self.run_search())
+        ttk.Label(filter_frame, text="Search:").pack(side=tk.RIGHT, padx=5)
+        
+        # Quick filter over the loaded month, applied in memory
+        quick_frame = ttk.Frame(tab)
+        quick_frame.pack(fill=tk.X, padx=10)
+        ttk.Label(quick_frame, text="Quick filter - Category:").pack(side=tk.LEFT, padx=5)
+        self.quick_category_var = tk.StringVar(value='All')
+        self.quick_category_combobox = ttk.Combobox(
+            quick_frame,
+            textvariable=self.quick_category_var,
+            values=['All'],
+            state='readonly',
+            width=14
+        )
+        self.quick_category_combobox.pack(side=tk.LEFT, padx=5)
+        ttk.Label(quick_frame, text="Amount from:").pack(side=tk.LEFT, padx=5)
+        self.quick_min_var = tk.StringVar()
+        ttk.Entry(quick_frame, textvariable=self.quick_min_var, width=8).pack(side=tk.LEFT)
+        ttk.Label(quick_frame, text="to:").pack(side=tk.LEFT, padx=5)
+        self.quick_max_var = tk.StringVar()
+        ttk.Entry(quick_frame, textvariable=self.quick_max_var, width=8).pack(side=tk.LEFT)
+        ttk.Label(quick_frame, text="Text:").pack(side=tk.LEFT, padx=5)
+        self.quick_text_var = tk.StringVar()
+        ttk.Entry(quick_frame, textvariable=self.quick_text_var, width=18).pack(side=tk.LEFT)
+        ttk.Button(quick_frame, text="Clear", command=self.clear_quick_filter).pack(side=tk.LEFT, padx=10)
+        self.quick_filter_job = None
+        for var in (self.quick_category_var, self.quick_min_var, self.quick_max_var, self.quick_text_var):
+            var.trace_add('write', lambda *args: self.schedule_quick_filter())
+        
         # Treeview for expenses
         tree_frame = ttk.Frame(tab)
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
         # Add scrollbars
-        tree_scroll_y = ttk.Scrollbar(tree_frame)
-        tree_scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_scroll_y = ttk.Scrollbar(tree_frame)
+        self.tree_scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
         
         tree_scroll_x = ttk.Scrollbar(tree_frame, orient=tk.HORIZONTAL)
         tree_scroll_x.pack(side=tk.BOTTOM, fill=tk.X)
@@ -147,7 +267,7 @@ class ExpenseTrackerApp:
         # Create treeview
         self.tree = ttk.Treeview(
             tree_frame,
-            yscrollcommand=tree_scroll_y.set,
+            yscrollcommand=self.on_tree_scroll,
             xscrollcommand=tree_scroll_x.set,
             selectmode='extended',
             columns=('id', 'date', 'category', 'amount', 'description')
@@ -155,7 +275,7 @@ class ExpenseTrackerApp:
         self.tree.pack(fill=tk.BOTH, expand=True)
         
         # Configure scrollbars
-        tree_scroll_y.config(command=self.tree.yview)
+        self.tree_scroll_y.config(command=self.tree.yview)
         tree_scroll_x.config(command=self.tree.xview)
         
         # Define columns
@@ -166,20 +286,53 @@ class ExpenseTrackerApp:
         self.tree.column('amount', width=100, anchor=tk.E)
         self.tree.column('description', width=300, anchor=tk.W)
         
-        # Create headings
-        self.tree.heading('id', text='ID', anchor=tk.CENTER)
-        self.tree.heading('date', text='Date', anchor=tk.CENTER)
-        self.tree.heading('category', text='Category', anchor=tk.CENTER)
-        self.tree.heading('amount', text='Amount', anchor=tk.CENTER)
-        self.tree.heading('description', text='Description', anchor=tk.CENTER)
+        # Create headings; clicking one sorts the loaded month by it
+        self.heading_titles = {
+            'id': 'ID', 'date': 'Date', 'category': 'Category',
+            'amount': 'Amount', 'description': 'Description'
+        }
+        for column, title in self.heading_titles.items():
+            self.tree.heading(column, text=title, anchor=tk.CENTER,
+                              command=lambda column=column: self.sort_view(column))
+        
+        # Sorted/filtered view of the loaded month: row indexes into
+        # view_columns, and the slice of them shown in the Treeview
+        self.sort_column = None
+        self.sort_descending = False
+        self.local_order = None
+        self.local_window = (0, 0)
+        
+        # Keyset paging state for the visible window of rows
+        self.view_range = None
+        self.view_total = Decimal(0)
+        self.first_key = None
+        self.last_key = None
+        self.more_before = False
+        self.more_after = False
+        self.paging = False
+        
+        # Set while the view shows search results instead of a month
+        self.search_text = None
+        self.search_offset = 0
         
         # Add context menu
         self.context_menu = tk.Menu(self.tree, tearoff=0)
         self.context_menu.add_command(label="Edit", command=self.edit_expense)
         self.context_menu.add_command(label="Delete", command=self.delete_expense)
+        self.context_menu.add_separator()
+        self.context_menu.add_command(label="Change Category...", command=self.recategorize_selected)
+        self.context_menu.add_command(label="Shift Dates...", command=self.shift_selected_dates)
+        self.context_menu.add_separator()
+        self.context_menu.add_command(label="Undo", command=self.undo_batch, state=tk.DISABLED)
+        self.undo_menu_index = self.context_menu.index('end')
+        
+        # Rows saved before the last batch operation, for Undo
+        self.last_batch = None
         
         # Bind right-click event
         self.tree.bind("<Button-3>", self.show_context_menu)
+        self.tree.bind("<Delete>", lambda event: self.delete_expense())
+        self.tree.bind("<Control-z>", lambda event: self.undo_batch())
         
         # Summary frame
         summary_frame = ttk.Frame(tab)
@@ -188,10 +341,18 @@ class ExpenseTrackerApp:
         ttk.Label(summary_frame, text="Total Expenses:", font=('Arial', 10, 'bold')).pack(side=tk.LEFT, padx=5)
         self.total_var = tk.StringVar(value="$0.00")
         ttk.Label(summary_frame, textvariable=self.total_var, font=('Arial', 10, 'bold')).pack(side=tk.LEFT)
+        self.search_info_var = tk.StringVar()
+        ttk.Label(summary_frame, textvariable=self.search_info_var).pack(side=tk.RIGHT, padx=5)
+        
+        # Period statistics, recomputed from the month's columns on every change
+        self.view_columns = None
+        self.view_stats_var = tk.StringVar()
+        ttk.Label(tab, textvariable=self.view_stats_var, justify=tk.LEFT).pack(fill=tk.X, padx=15, pady=(0, 5))
     
     def create_reports_tab(self):
         """Create the 'Reports' tab."""
         tab = ttk.Frame(self.notebook)
+        self.reports_tab = tab
         self.notebook.add(tab, text="Reports")
         
         # Filter frame
@@ -228,9 +389,217 @@ class ExpenseTrackerApp:
             command=self.generate_report
         ).pack(side=tk.LEFT, padx=10)
         
+        # Trend options: the span ends at the month selected above
+        trend_frame = ttk.LabelFrame(tab, text="Trend Options", padding=10)
+        trend_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Label(trend_frame, text="Months:").pack(side=tk.LEFT, padx=5)
+        self.trend_months_var = tk.StringVar(value="12")
+        ttk.Spinbox(
+            trend_frame,
+            from_=2,
+            to=120,
+            textvariable=self.trend_months_var,
+            width=6
+        ).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(trend_frame, text="Chart:").pack(side=tk.LEFT, padx=5)
+        self.trend_style_var = tk.StringVar(value="Stacked Bar")
+        ttk.Combobox(
+            trend_frame,
+            textvariable=self.trend_style_var,
+            values=["Stacked Bar", "Line"],
+            state='readonly',
+            width=12
+        ).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(
+            trend_frame,
+            text="Show Trend",
+            command=self.generate_trend
+        ).pack(side=tk.LEFT, padx=10)
+        
+        # Statistics for the reported month
+        self.report_period = None
+        self.report_stats_var = tk.StringVar()
+        ttk.Label(tab, textvariable=self.report_stats_var, justify=tk.LEFT).pack(fill=tk.X, padx=15, pady=5)
+        
         # Chart frame
         self.chart_frame = ttk.Frame(tab)
         self.chart_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        # One figure and canvas live for the whole session; reports redraw
+        # into them instead of creating new ones (created on first use)
+        self.report_figure = None
+        self.report_canvas = None
+        self.report_mode = None
+        self.report_artists = []
+        self.report_pie = None
+        self.report_bars = None
+        self.report_background = None
+    
+    def create_budgets_tab(self):
+        """Create the 'Budgets' tab."""
+        tab = ttk.Frame(self.notebook)
+        self.budgets_tab = tab
+        self.notebook.add(tab, text="Budgets")
+        
+        # Month whose budget use is shown
+        period_frame = ttk.LabelFrame(tab, text="Budget Month", padding=10)
+        period_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Label(period_frame, text="Month:").pack(side=tk.LEFT, padx=5)
+        self.budget_month_var = tk.StringVar(value=datetime.datetime.now().strftime('%B'))
+        months = ["January", "February", "March", "April", "May", "June", 
+                 "July", "August", "September", "October", "November", "December"]
+        ttk.Combobox(
+            period_frame,
+            textvariable=self.budget_month_var,
+            values=months,
+            state='readonly',
+            width=12
+        ).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(period_frame, text="Year:").pack(side=tk.LEFT, padx=5)
+        self.budget_year_var = tk.StringVar(value=str(datetime.datetime.now().year))
+        ttk.Spinbox(
+            period_frame,
+            from_=2000,
+            to=2100,
+            textvariable=self.budget_year_var,
+            width=8
+        ).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(period_frame, text="Show", command=self.load_budgets).pack(side=tk.LEFT, padx=10)
+        
+        # Set or remove one category's monthly budget
+        edit_frame = ttk.LabelFrame(tab, text="Set Budget", padding=10)
+        edit_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Label(edit_frame, text="Category:").pack(side=tk.LEFT, padx=5)
+        self.budget_category_var = tk.StringVar()
+        ttk.Combobox(
+            edit_frame,
+            textvariable=self.budget_category_var,
+            values=list(self.category_combobox['values']),
+            width=14
+        ).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(edit_frame, text="Monthly amount:").pack(side=tk.LEFT, padx=5)
+        self.budget_amount_var = tk.StringVar()
+        ttk.Entry(edit_frame, textvariable=self.budget_amount_var, width=10).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(edit_frame, text="Warn at (%):").pack(side=tk.LEFT, padx=5)
+        self.budget_warn_var = tk.StringVar(value="80")
+        ttk.Spinbox(edit_frame, from_=1, to=100, textvariable=self.budget_warn_var, width=5).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(edit_frame, text="Save", command=self.save_budget).pack(side=tk.LEFT, padx=10)
+        ttk.Button(edit_frame, text="Remove", command=self.remove_budget).pack(side=tk.LEFT)
+        
+        # One progress bar per budget; the rows are kept and updated in place
+        self.style.configure('Warning.Horizontal.TProgressbar', background='orange')
+        self.style.configure('Over.Horizontal.TProgressbar', background='red')
+        self.budget_frame = ttk.Frame(tab, padding=10)
+        self.budget_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.budget_frame.columnconfigure(1, weight=1)
+        self.budget_rows = {}
+        self.budget_period = None
+        self.budget_empty_var = tk.StringVar()
+        ttk.Label(self.budget_frame, textvariable=self.budget_empty_var).grid(row=0, column=0, columnspan=3, sticky=tk.W)
+    
+    def load_budgets(self):
+        """Load the selected month's budget use from the rollup totals."""
+        try:
+            month = datetime.datetime.strptime(self.budget_month_var.get(), '%B').month
+            year = int(self.budget_year_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Failed to load budgets: {str(e)}")
+            return
+        self.executor.submit(
+            get_budget_status, year, month,
+            key='budgets',
+            on_success=lambda rows: self.show_budgets((year, month), rows),
+            on_error=self.error_callback("Failed to load budgets")
+        )
+    
+    def show_budgets(self, period, rows):
+        """Show one progress bar per budget for a month."""
+        if rows is None:
+            messagebox.showerror("Error", "Failed to load budgets.")
+            return
+        self.budget_period = period
+        self.budget_empty_var.set('' if rows else "No budgets yet. Set one above.")
+        wanted = {row['category'] for row in rows}
+        for category in [c for c in self.budget_rows if c not in wanted]:
+            for widget in self.budget_rows.pop(category)[:2]:
+                widget.destroy()
+        for index, row in enumerate(rows, start=1):
+            category = row['category']
+            if category not in self.budget_rows:
+                bar = ttk.Progressbar(self.budget_frame, maximum=100, length=300)
+                text_var = tk.StringVar()
+                label = ttk.Label(self.budget_frame, textvariable=text_var)
+                self.budget_rows[category] = (bar, label, text_var, ttk.Label(self.budget_frame, text=category))
+            bar, label, text_var, name = self.budget_rows[category]
+            name.grid(row=index, column=0, sticky=tk.W, padx=5, pady=4)
+            bar.grid(row=index, column=1, sticky=tk.EW, padx=5, pady=4)
+            label.grid(row=index, column=2, sticky=tk.W, padx=5, pady=4)
+            if row['percent'] > 100:
+                style = 'Over.Horizontal.TProgressbar'
+            elif row['percent'] >= row['warn_percent']:
+                style = 'Warning.Horizontal.TProgressbar'
+            else:
+                style = 'Horizontal.TProgressbar'
+            bar.configure(value=min(row['percent'], 100), style=style)
+            text_var.set(f"${row['spent']:.2f} of ${row['budget']:.2f} ({row['percent']:.0f}%)")
+    
+    def save_budget(self):
+        """Set the budget entered in the form."""
+        category = self.budget_category_var.get().strip()
+        if not category:
+            messagebox.showerror("Error", "Please select a category.")
+            return
+        try:
+            amount = Decimal(self.budget_amount_var.get().replace('$', '').replace(',', ''))
+            warn_percent = int(self.budget_warn_var.get())
+        except (ArithmeticError, ValueError):
+            messagebox.showerror("Error", "Please enter a valid amount and warning percentage.")
+            return
+        self.executor.submit(
+            set_budget, category, amount, warn_percent,
+            on_success=lambda saved: self.on_budget_changed(saved, "save the budget"),
+            on_error=self.error_callback("Failed to save the budget")
+        )
+    
+    def remove_budget(self):
+        """Remove the budget of the category in the form."""
+        category = self.budget_category_var.get().strip()
+        if category and messagebox.askyesno("Confirm Remove", f"Remove the {category} budget?"):
+            self.executor.submit(
+                delete_budget, category,
+                on_success=lambda removed: self.on_budget_changed(removed, "remove the budget"),
+                on_error=self.error_callback("Failed to remove the budget")
+            )
+    
+    def on_budget_changed(self, ok, action):
+        if not ok:
+            messagebox.showerror("Error", f"Failed to {action}.")
+            return
+        self.load_budgets()
+    
+    def show_budget_alerts(self, alerts):
+        """Warn about budgets a committed write pushed past a threshold."""
+        lines = []
+        for alert in alerts:
+            month = datetime.date(alert['year'], alert['month'], 1).strftime('%B %Y')
+            spent = f"${alert['total']:.2f} of ${alert['budget']:.2f}"
+            if alert['level'] == 'over':
+                lines.append(f"{alert['category']} is over budget for {month}: {spent} ({alert['percent']:.0f}%)")
+            else:
+                lines.append(f"{alert['category']} has used {alert['percent']:.0f}% of its {month} budget: {spent}")
+        messagebox.showwarning("Budget Alert", "\n".join(lines))
+        if self.budget_period in {(alert['year'], alert['month']) for alert in alerts}:
+            self.load_budgets()
     
     def add_expense(self):
         """Add a new expense to the database."""
@@ -254,23 +623,392 @@ class ExpenseTrackerApp:
                 messagebox.showerror("Error", "Invalid date format. Use YYYY-MM-DD.")
                 return
             
-            # Add to database
-            transaction_id = add_transaction(amount, category, date, description or None)
-            
-            if transaction_id:
-                messagebox.showinfo("Success", "Expense added successfully!")
-                self.clear_form()
-                self.load_expenses()
-            else:
-                messagebox.showerror("Error", "Failed to add expense to database.")
+            # Queue for the database; the row shows up once it is stored
+            self.journal.append(
+                'add',
+                amount=str(Decimal(str(amount))),
+                category=category,
+                date=date.isoformat(),
+                description=description or None
+            )
+            messagebox.showinfo("Success", "Expense added successfully!")
+            self.clear_form()
+            self.update_queue_status()
                 
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
     
+    def schedule_suggestion(self):
+        """Look up the rules' category shortly after the last keystroke."""
+        if self.suggest_job is not None:
+            self.root.after_cancel(self.suggest_job)
+        self.suggest_job = self.root.after(300, self.request_suggestion)
+    
+    def request_suggestion(self):
+        """Ask the rules for the description's category in the background."""
+        self.suggest_job = None
+        description = self.desc_text.get('1.0', tk.END).strip()
+        if not description or self.category_var.get() not in ('', self.suggested_category):
+            return
+        try:
+            amount = self.amount_var.get() or None
+        except tk.TclError:
+            amount = None
+        self.executor.submit(
+            suggest_category, description, amount,
+            key='suggest',
+            on_success=self.show_suggestion,
+            on_error=lambda e: None
+        )
+    
+    def show_suggestion(self, category):
+        """Put a suggested category in the form if the user hasn't picked one."""
+        if self.category_var.get() in ('', self.suggested_category):
+            self.category_var.set(category or '')
+            self.suggested_category = category
+    
+    def manage_rules(self):
+        """List, add and remove categorization rules, and apply them to stored expenses."""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Categorization Rules")
+        dialog.transient(self.root)
+        frame = ttk.Frame(dialog, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ('priority', 'match', 'amounts', 'category')
+        tree = ttk.Treeview(frame, columns=columns, show='headings', height=10)
+        for column, title, width in zip(columns, ("Order", "Description", "Amount", "Category"),
+                                        (50, 220, 120, 110)):
+            tree.heading(column, text=title)
+            tree.column(column, width=width)
+        tree.grid(row=0, column=0, columnspan=4, sticky=tk.NSEW)
+        frame.columnconfigure(1, weight=1)
+        frame.rowconfigure(0, weight=1)
+        
+        ttk.Label(frame, text="Match:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        kind_var = tk.StringVar(value='contains')
+        ttk.Combobox(frame, textvariable=kind_var, values=['contains', 'regex'], state='readonly',
+                     width=10).grid(row=1, column=1, sticky=tk.W, pady=5)
+        pattern_var = tk.StringVar()
+        ttk.Entry(frame, textvariable=pattern_var, width=30).grid(row=1, column=2, columnspan=2, sticky=tk.EW, pady=5)
+        
+        ttk.Label(frame, text="Amount from/to:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        min_var, max_var = tk.StringVar(), tk.StringVar()
+        ttk.Entry(frame, textvariable=min_var, width=10).grid(row=2, column=1, sticky=tk.W, pady=5)
+        ttk.Entry(frame, textvariable=max_var, width=10).grid(row=2, column=2, sticky=tk.W, pady=5)
+        
+        ttk.Label(frame, text="Category:").grid(row=3, column=0, sticky=tk.W, pady=5)
+        category_var = tk.StringVar()
+        ttk.Combobox(frame, textvariable=category_var, values=list(self.category_combobox['values']),
+                     width=14).grid(row=3, column=1, sticky=tk.W, pady=5)
+        
+        only_other_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            frame, text=f"Only recategorize '{DEFAULT_CATEGORY}' expenses", variable=only_other_var
+        ).grid(row=4, column=0, columnspan=4, sticky=tk.W)
+        status_var = tk.StringVar()
+        ttk.Label(frame, textvariable=status_var).grid(row=5, column=0, columnspan=4, sticky=tk.W)
+        
+        def show_rules(rules):
+            if not dialog.winfo_exists():
+                return
+            if rules is None:
+                messagebox.showerror("Error", "Failed to load rules.", parent=dialog)
+                return
+            tree.delete(*tree.get_children())
+            for rule in rules:
+                low, high = rule['min_amount'], rule['max_amount']
+                amounts = '' if low is None and high is None else (
+                    f"{f'${low}' if low is not None else ''} - {f'${high}' if high is not None else ''}"
+                )
+                match = f"{rule['kind']}: {rule['pattern']}" if rule['pattern'] else "(any)"
+                tree.insert('', tk.END, iid=str(rule['id']),
+                            values=(rule['priority'], match, amounts, rule['category']))
+        
+        def reload_rules(*args):
+            self.executor.submit(get_rules, key='rules', on_success=show_rules,
+                                 on_error=self.error_callback("Failed to load rules"))
+        
+        def add():
+            try:
+                # Bad patterns and amounts are rejected here, before any database work
+                validate_rule(kind_var.get(), pattern_var.get().strip(), min_var.get().strip(), max_var.get().strip())
+            except ValueError as e:
+                messagebox.showerror("Error", str(e), parent=dialog)
+                return
+            if not category_var.get().strip():
+                messagebox.showerror("Error", "Please select a category.", parent=dialog)
+                return
+            self.executor.submit(
+                add_rule, kind_var.get(), pattern_var.get(), category_var.get().strip(),
+                min_var.get().strip() or None, max_var.get().strip() or None,
+                on_success=reload_rules,
+                on_error=self.error_callback("Failed to add the rule")
+            )
+            pattern_var.set('')
+            min_var.set('')
+            max_var.set('')
+        
+        def remove():
+            for item in tree.selection():
+                self.executor.submit(delete_rule, int(item), on_success=reload_rules,
+                                     on_error=self.error_callback("Failed to remove the rule"))
+        
+        def show_progress(processed, changed):
+            if dialog.winfo_exists():
+                status_var.set(f"Checked {processed} expenses, {changed} recategorized...")
+        
+        def on_applied(result):
+            if dialog.winfo_exists():
+                apply_button.config(state=tk.NORMAL)
+                status_var.set('')
+            if result is None:
+                messagebox.showerror("Error", "Failed to apply the rules.")
+                return
+            messagebox.showinfo("Rules Applied", f"Recategorized {result['changed']} of "
+                                                 f"{result['processed']} expenses.")
+            self.refresh_view()
+        
+        def apply():
+            only = (DEFAULT_CATEGORY,) if only_other_var.get() else None
+            apply_button.config(state=tk.DISABLED)
+            status_var.set("Applying rules...")
+            self.executor.submit(
+                lambda: apply_rules(
+                    only=only,
+                    progress=lambda processed, changed: self.executor.post(show_progress, processed, changed)
+                ),
+                on_success=on_applied,
+                on_error=self.error_callback("Failed to apply the rules")
+            )
+        
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=6, column=0, columnspan=4, pady=10)
+        ttk.Button(button_frame, text="Add Rule", command=add).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Remove Selected", command=remove).pack(side=tk.LEFT, padx=5)
+        apply_button = ttk.Button(button_frame, text="Apply to Existing", command=apply)
+        apply_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        reload_rules()
+    
+    def on_writes_applied(self, entries, results):
+        """Show rows added through the journal once the database has them."""
+        for entry in entries:
+            transaction_id = results.get(entry['key'])
+            if entry['op'] == 'add' and transaction_id:
+                self.patch_view(new={
+                    'id': transaction_id,
+                    'amount': Decimal(entry['amount']),
+                    'category': entry['category'],
+                    'date': datetime.date.fromisoformat(entry['date']),
+                    'description': entry.get('description')
+                })
+        self.update_queue_status()
+    
+    def on_write_rejected(self, entry, error):
+        """Report a journaled write the database refused for good."""
+        messagebox.showerror("Error", f"A saved change could not be written to the database: {str(error)}")
+        self.refresh_view()
+    
+    def update_queue_status(self):
+        """Show how many journaled writes wait for the database, once a second."""
+        stats = self.replayer.stats()
+        if stats['depth']:
+            text = f"{stats['depth']} change(s) waiting to sync, oldest {stats['lag']:.0f}s"
+            if stats['last_error']:
+                text += " (database unreachable, retrying)"
+            self.queue_var.set(text)
+        else:
+            self.queue_var.set('')
+        self.root.after(1000, self.update_queue_status)
+    
+    def set_busy(self, busy):
+        """Show or hide the loading indicator in the status bar."""
+        if busy:
+            self.status_var.set("Loading...")
+            self.busy_bar.pack(side=tk.RIGHT, padx=5)
+            self.busy_bar.start(10)
+        else:
+            self.status_var.set("Ready")
+            self.busy_bar.stop()
+            self.busy_bar.pack_forget()
+    
+    def error_callback(self, message):
+        """Build an on_error handler that reports a failed background task."""
+        return lambda e: messagebox.showerror("Error", f"{message}: {str(e)}")
+    
+    def import_expenses(self):
+        """Bulk-import expenses from a CSV or OFX bank export."""
+        path = filedialog.askopenfilename(
+            title="Import Expenses",
+            filetypes=[("Bank exports", "*.csv *.ofx *.qfx"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        
+        def report_progress(processed, inserted):
+            # Called on the worker thread; hand the update over to Tk
+            self.executor.post(
+                self.import_status_var.set, f"Processed {processed} rows, {inserted} new..."
+            )
+        
+        def on_imported(result):
+            self.import_status_var.set('')
+            if result:
+                messagebox.showinfo(
+                    "Import Complete",
+                    f"Imported {result['inserted']} expenses "
+                    f"({result['skipped']} duplicates skipped, "
+                    f"{result['credits']} credits ignored)."
+                )
+                self.load_expenses()
+            else:
+                messagebox.showerror("Error", "Failed to import expenses.")
+        
+        def on_failed(error):
+            self.import_status_var.set('')
+            messagebox.showerror("Error", f"Failed to import expenses: {str(error)}")
+        
+        self.import_status_var.set("Importing...")
+        self.executor.submit(
+            lambda: import_transactions(iter_import_file(path), progress=report_progress),
+            on_success=on_imported,
+            on_error=on_failed
+        )
+    
+    def export_expenses(self):
+        """Export a date range of expenses to CSV or Parquet."""
+        if self.view_range:
+            first, last = self.view_range[0], self.view_range[1] - datetime.timedelta(days=1)
+        else:
+            first = datetime.date.today().replace(day=1)
+            last = datetime.date.today()
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Export Expenses")
+        dialog.transient(self.root)
+        frame = ttk.Frame(dialog, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(frame, text="From:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        from_var = tk.StringVar(value=first.strftime('%Y-%m-%d'))
+        ttk.Entry(frame, textvariable=from_var, width=14).grid(row=0, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(frame, text="To:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        to_var = tk.StringVar(value=last.strftime('%Y-%m-%d'))
+        ttk.Entry(frame, textvariable=to_var, width=14).grid(row=1, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(frame, text="Category:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        category_var = tk.StringVar(value="All")
+        ttk.Combobox(
+            frame,
+            textvariable=category_var,
+            values=["All"] + list(self.category_combobox['values']),
+            state='readonly',
+            width=12
+        ).grid(row=2, column=1, sticky=tk.W, pady=5)
+        
+        progress_bar = ttk.Progressbar(frame, mode='determinate', length=260)
+        progress_bar.grid(row=3, column=0, columnspan=2, pady=(10, 0))
+        status_var = tk.StringVar()
+        ttk.Label(frame, textvariable=status_var).grid(row=4, column=0, columnspan=2, sticky=tk.W)
+        
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=5, column=0, columnspan=2, pady=10)
+        export_button = ttk.Button(button_frame, text="Export")
+        export_button.pack(side=tk.LEFT, padx=5)
+        cancel_button = ttk.Button(button_frame, text="Cancel")
+        cancel_button.pack(side=tk.LEFT, padx=5)
+        
+        # Set while an export is running; Cancel stops it at the next chunk
+        running = {'cancel': None}
+        
+        def show_progress(written, total):
+            if dialog.winfo_exists():
+                progress_bar['maximum'] = max(total, 1)
+                progress_bar['value'] = written
+                status_var.set(f"Exported {written} of {total} rows...")
+        
+        def report_progress(written, total):
+            # Called on the worker thread; hand the update over to Tk
+            self.executor.post(show_progress, written, total)
+        
+        def on_exported(result):
+            running['cancel'] = None
+            if not dialog.winfo_exists():
+                return
+            if result is None:
+                export_button.config(state=tk.NORMAL)
+                status_var.set('')
+                messagebox.showerror("Error", "Failed to export expenses.", parent=dialog)
+            elif result['cancelled']:
+                export_button.config(state=tk.NORMAL)
+                progress_bar['value'] = 0
+                status_var.set("Export cancelled.")
+            else:
+                dialog.destroy()
+                messagebox.showinfo("Export Complete", f"Exported {result['rows']} expenses.")
+        
+        def on_failed(error):
+            running['cancel'] = None
+            if dialog.winfo_exists():
+                export_button.config(state=tk.NORMAL)
+                status_var.set('')
+                messagebox.showerror("Error", f"Failed to export expenses: {str(error)}", parent=dialog)
+        
+        def start_export():
+            try:
+                start = datetime.datetime.strptime(from_var.get(), '%Y-%m-%d').date()
+                end = datetime.datetime.strptime(to_var.get(), '%Y-%m-%d').date() + datetime.timedelta(days=1)
+            except ValueError:
+                messagebox.showerror("Error", "Please enter dates as YYYY-MM-DD.", parent=dialog)
+                return
+            if end <= start:
+                messagebox.showerror("Error", "The end date must not be before the start date.", parent=dialog)
+                return
+            
+            filetypes = [("CSV files", "*.csv")]
+            if parquet_available():
+                filetypes.append(("Parquet files", "*.parquet"))
+            path = filedialog.asksaveasfilename(
+                parent=dialog,
+                title="Export Expenses",
+                defaultextension='.csv',
+                filetypes=filetypes
+            )
+            if not path:
+                return
+            
+            category = category_var.get()
+            running['cancel'] = threading.Event()
+            export_button.config(state=tk.DISABLED)
+            status_var.set("Exporting...")
+            self.executor.submit(
+                export_transactions, path, start, end,
+                [category] if category != "All" else None,
+                progress=report_progress,
+                cancel=running['cancel'],
+                on_success=on_exported,
+                on_error=on_failed
+            )
+        
+        def cancel_or_close():
+            if running['cancel'] is not None:
+                running['cancel'].set()
+                status_var.set("Cancelling...")
+            else:
+                dialog.destroy()
+        
+        export_button.config(command=start_export)
+        cancel_button.config(command=cancel_or_close)
+        dialog.protocol("WM_DELETE_WINDOW", cancel_or_close)
+    
     def clear_form(self):
         """Clear the add expense form."""
         self.amount_var.set(0.0)
         self.category_var.set('')
+        self.suggested_category = None
         self.date_var.set(datetime.date.today().strftime('%Y-%m-%d'))
         self.desc_text.delete('1.0', tk.END)
     
@@ -280,43 +1018,480 @@ class ExpenseTrackerApp:
             month_name = self.month_var.get()
             year = int(self.year_var.get())
             month = datetime.datetime.strptime(month_name, '%B').month
-            
-            # Clear existing items
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-            
-            # Get expenses from database
-            expenses = get_monthly_expenses(year, month)
-            
-            if not expenses:
-                return
-            
-            # Add expenses to treeview
-            total = 0
-            for expense in expenses:
-                self.tree.insert(
-                    '', 'end', 
-                    values=(
-                        expense['id'],
-                        expense['date'].strftime('%Y-%m-%d'),
-                        expense['category'],
-                        f"${expense['amount']:.2f}",
-                        expense.get('description', '')
-                    )
-                )
-                total += float(expense['amount'])
-            
-            # Update total
-            self.total_var.set(f"${total:.2f}")
-            
+            start, end = month_bounds(year, month)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load expenses: {str(e)}")
+            return
+        
+        # A newer Filter click supersedes any load or page fetch still running
+        self.executor.submit(
+            self.fetch_first_page, start, end,
+            key='view',
+            on_success=self.show_first_page,
+            on_error=self.error_callback("Failed to load expenses")
+        )
+    
+    def fetch_first_page(self, start, end):
+        """Worker-thread half of load_expenses; must not touch any widget."""
+        # Totals and statistics come from the whole month in columnar form,
+        # since only a window of rows is loaded into the Treeview
+        columns = get_expenses_columns(start, end)
+        expenses = get_expenses_page(start, end, limit=self.PAGE_SIZE)
+        return start, end, columns, expenses
+    
+    @timed('ui.load_expenses')
+    def show_first_page(self, result):
+        """Replace the Treeview contents with a freshly loaded month."""
+        start, end, columns, expenses = result
+        
+        # Clear existing items in one call
+        self.tree.delete(*self.tree.get_children())
+        
+        self.view_range = (start, end)
+        self.search_text = None
+        self.search_info_var.set('')
+        self.first_key = self.last_key = None
+        self.more_before = False
+        self.more_after = len(expenses) == self.PAGE_SIZE
+        self.paging = False
+        self.view_columns = columns
+        self.view_total = columns.total() if columns is not None else Decimal(0)
+        self.total_var.set(f"${self.view_total:.2f}")
+        self.show_view_stats()
+        self.local_order = None
+        if columns is not None:
+            categories = set(self.category_combobox['values']) | set(columns.categories)
+            self.quick_category_combobox['values'] = ['All'] + sorted(categories)
+        
+        if columns is not None and (self.sort_column or self.quick_filters()):
+            # Keep the sort and quick filter across months
+            self.apply_local_view()
+            return
+        # Later pages load while scrolling
+        self.insert_expense_rows(expenses, 'end')
+    
+    def run_search(self):
+        """Replace the view with ranked search results from every month."""
+        text = self.search_var.get().strip()
+        if not text:
+            self.load_expenses()
+            return
+        self.executor.submit(
+            search_expenses, text,
+            limit=self.PAGE_SIZE,
+            key='view',
+            on_success=lambda expenses: self.show_search_results(text, expenses),
+            on_error=self.error_callback("Failed to search expenses")
+        )
+    
+    def show_search_results(self, text, expenses):
+        """Show the first page of search results; more load while scrolling."""
+        self.tree.delete(*self.tree.get_children())
+        self.view_range = None
+        self.search_text = text
+        self.search_offset = len(expenses)
+        self.view_columns = None
+        self.local_order = None
+        self.view_stats_var.set('')
+        self.first_key = self.last_key = None
+        self.more_before = False
+        self.more_after = len(expenses) == self.PAGE_SIZE
+        self.paging = False
+        self.view_total = Decimal(0)
+        self.add_search_rows(expenses)
+    
+    @timed('ui.page')
+    def search_page_forward(self, expenses):
+        """Append the next page of search results."""
+        try:
+            self.more_after = len(expenses) == self.PAGE_SIZE
+            self.search_offset += len(expenses)
+            # Offsets shift if rows change between pages; skip repeats
+            self.add_search_rows([e for e in expenses if not self.tree.exists(str(e['id']))])
+        finally:
+            self.paging = False
+    
+    def add_search_rows(self, expenses):
+        """Append search results and update the totals shown for them."""
+        self.insert_expense_rows(expenses, 'end')
+        self.view_total += sum((expense['amount'] for expense in expenses), Decimal(0))
+        self.total_var.set(f"${self.view_total:.2f}")
+        count = len(self.tree.get_children())
+        self.search_info_var.set(
+            f"{count}{'+' if self.more_after else ''} matches for \"{self.search_text}\""
+        )
+    
+    def expense_values(self, expense):
+        """Format a transaction row for display in the Treeview."""
+        return (
+            expense['id'],
+            expense['date'].strftime('%Y-%m-%d'),
+            expense['category'],
+            f"${expense['amount']:.2f}",
+            expense.get('description') or ''
+        )
+    
+    def values_to_expense(self, values):
+        """Turn a Treeview row's display values back into a transaction dict."""
+        return {
+            'id': int(values[0]),
+            'date': datetime.datetime.strptime(values[1], '%Y-%m-%d').date(),
+            'category': values[2],
+            'amount': Decimal(values[3].replace('$', '')),
+            'description': values[4] if len(values) > 4 else None
+        }
+    
+    def insert_expense_rows(self, expenses, index):
+        """Insert rows at the start ('0') or end of the Treeview window."""
+        if not expenses:
+            return
+        if index == 'end':
+            for expense in expenses:
+                self.tree.insert('', 'end', iid=str(expense['id']), values=self.expense_values(expense))
+        else:
+            for expense in reversed(expenses):
+                self.tree.insert('', 0, iid=str(expense['id']), values=self.expense_values(expense))
+        if index == 'end' or self.last_key is None:
+            self.last_key = (expenses[-1]['date'], expenses[-1]['id'])
+        if index != 'end' or self.first_key is None:
+            self.first_key = (expenses[0]['date'], expenses[0]['id'])
+    
+    def expense_for(self, item):
+        """The transaction behind a Treeview item, from the loaded columns when possible."""
+        if self.view_columns is not None:
+            index = self.view_columns.position(item)
+            if index is not None:
+                return self.view_columns.row(index)
+        return self.values_to_expense(self.tree.item(item, 'values'))
+    
+    def sort_view(self, column):
+        """Sort the loaded month by a column; clicking it again flips the direction."""
+        if self.view_columns is None or self.search_text is not None:
+            return
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            # Newest, largest first; names and ids ascending
+            self.sort_column = column
+            self.sort_descending = column in ('date', 'amount')
+        self.update_sort_headings()
+        self.apply_local_view()
+    
+    def update_sort_headings(self):
+        """Mark the sorted column's heading with the sort direction."""
+        for column, title in self.heading_titles.items():
+            if column == self.sort_column:
+                title += ' \u25bc' if self.sort_descending else ' \u25b2'
+            self.tree.heading(column, text=title)
+    
+    def quick_filters(self):
+        """The quick filter as ExpenseColumns.matching() arguments ({} if none is set).
+        
+        Raises ValueError for an amount that is not a number.
+        """
+        filters = {}
+        category = self.quick_category_var.get()
+        if category and category != 'All':
+            filters['categories'] = {category}
+        for name, var in (('min_amount', self.quick_min_var), ('max_amount', self.quick_max_var)):
+            value = var.get().strip().replace('$', '').replace(',', '')
+            if value:
+                try:
+                    filters[name] = Decimal(value)
+                except ArithmeticError:
+                    raise ValueError("Amounts must be numbers")
+        text = self.quick_text_var.get().strip()
+        if text:
+            filters['text'] = text
+        return filters
+    
+    def schedule_quick_filter(self):
+        """Apply the quick filter shortly after the last keystroke."""
+        if self.quick_filter_job is not None:
+            self.root.after_cancel(self.quick_filter_job)
+        self.quick_filter_job = self.root.after(150, self.apply_local_view)
+    
+    def clear_quick_filter(self):
+        """Reset the quick filter and sort to the month's normal order."""
+        for var in (self.quick_min_var, self.quick_max_var, self.quick_text_var):
+            var.set('')
+        self.quick_category_var.set('All')
+        self.sort_column = None
+        self.update_sort_headings()
+    
+    @timed('ui.sort_filter')
+    def apply_local_view(self, start=0):
+        """Sort and filter the loaded month in memory and show the result.
+        
+        Works on the month's columns (precomputed per-column orders and a
+        vectorized filter mask) instead of re-querying or re-reading the
+        display strings. ``start`` is the first row of the result to show.
+        """
+        self.quick_filter_job = None
+        columns = self.view_columns
+        if columns is None or self.search_text is not None:
+            return
+        try:
+            filters = self.quick_filters()
+        except ValueError as e:
+            self.search_info_var.set(str(e))
+            return
+        if self.sort_column:
+            order = columns.order_by(self.sort_column, self.sort_descending)
+        else:
+            order = columns.order_by('date', descending=True)
+        if filters:
+            order = order[columns.matching(**filters)[order]]
+            from columnar import from_cents
+            self.search_info_var.set(
+                f"{len(order)} of {len(columns)} expenses match, ${from_cents(columns.cents[order].sum()):.2f}"
+            )
+        else:
+            self.search_info_var.set('')
+        self.local_order = order
+        self.render_local_window(min(start, max(len(order) - self.PAGE_SIZE, 0)))
+    
+    def render_local_window(self, start, stop=None):
+        """Show rows start..stop of the sorted/filtered month in the Treeview.
+        
+        Items already in the tree are moved into place with ``move``; only
+        rows entering the window are inserted and only rows leaving it are
+        deleted.
+        """
+        columns = self.view_columns
+        if stop is None:
+            stop = start + self.PAGE_SIZE
+        stop = min(stop, len(self.local_order))
+        wanted = [int(index) for index in self.local_order[start:stop]]
+        iids = [str(int(columns.ids[index])) for index in wanted]
+        keep = set(iids)
+        stale = [item for item in self.tree.get_children() if item not in keep]
+        if stale:
+            self.tree.delete(*stale)
+        present = set(self.tree.get_children())
+        for position, (index, iid) in enumerate(zip(wanted, iids)):
+            if iid in present:
+                self.tree.move(iid, '', position)
+            else:
+                self.tree.insert('', position, iid=iid, values=self.expense_values(columns.row(index)))
+        self.local_window = (start, stop)
+    
+    def local_page(self, forward):
+        """Slide the in-memory window by a page, keeping at most MAX_PAGES pages."""
+        start, stop = self.local_window
+        count = len(self.tree.get_children())
+        top = start + round(self.tree.yview()[0] * count)
+        if forward:
+            stop = min(stop + self.PAGE_SIZE, len(self.local_order))
+            start = max(start, stop - self.PAGE_SIZE * self.MAX_PAGES)
+        else:
+            start = max(start - self.PAGE_SIZE, 0)
+            stop = min(stop, start + self.PAGE_SIZE * self.MAX_PAGES)
+        self.render_local_window(start, stop)
+        self.tree.yview_moveto((top - start) / max(stop - start, 1))
+    
+    def in_view(self, date):
+        """True if a transaction date falls in the month on screen."""
+        return self.view_range is not None and self.view_range[0] <= date < self.view_range[1]
+    
+    @timed('ui.patch_view')
+    def patch_view(self, old=None, new=None):
+        """Apply one added, edited or deleted row to the view without reloading.
+        
+        ``old`` and ``new`` are transaction dicts for the row before and after
+        the change (``old`` is None for an add, ``new`` is None for a delete).
+        Changes to rows outside the month on screen leave the view untouched.
+        While search results are shown, only rows already listed are updated.
+        """
+        if self.search_text is not None:
+            if old is not None and self.tree.exists(str(old['id'])):
+                self.view_total -= old['amount']
+                if new is None:
+                    self.tree.delete(str(old['id']))
+                else:
+                    self.view_total += new['amount']
+                    self.tree.item(str(old['id']), values=self.expense_values(new))
+                self.total_var.set(f"${self.view_total:.2f}")
+            return
+        old_in_view = old is not None and self.in_view(old['date'])
+        new_in_view = new is not None and self.in_view(new['date'])
+        if self.local_order is not None:
+            if old_in_view or new_in_view:
+                self.view_total += (new['amount'] if new_in_view else 0) - (old['amount'] if old_in_view else 0)
+                self.total_var.set(f"${self.view_total:.2f}")
+                self.view_columns = self.view_columns.patched(
+                    old if old_in_view else None, new if new_in_view else None
+                )
+                self.show_view_stats()
+                if new_in_view and self.tree.exists(str(new['id'])):
+                    self.tree.item(str(new['id']), values=self.expense_values(new))
+                # Re-sort and re-filter in memory, staying at the same place
+                self.apply_local_view(self.local_window[0])
+            return
+        if old_in_view:
+            self.view_total -= old['amount']
+            if not new_in_view:
+                if self.tree.exists(str(old['id'])):
+                    self.tree.delete(str(old['id']))
+        if new_in_view:
+            self.view_total += new['amount']
+            self.place_expense(new)
+        self.total_var.set(f"${self.view_total:.2f}")
+        if self.view_columns is not None and (old_in_view or new_in_view):
+            self.view_columns = self.view_columns.patched(
+                old if old_in_view else None, new if new_in_view else None
+            )
+            self.show_view_stats()
+        children = self.tree.get_children()
+        if children:
+            self.first_key = self.row_key(children[0])
+            self.last_key = self.row_key(children[-1])
+    
+    def format_stats(self, stats):
+        """Two-line text for a get_expense_stats / ExpenseColumns.summary result."""
+        if not stats or not stats['count']:
+            return "No expenses in this period."
+        top = ', '.join(f"{name} ${total:.2f} ({count})" for name, total, count in stats['top'])
+        return (
+            f"{stats['count']} expenses    Mean ${stats['mean']:.2f}    Median ${stats['median']:.2f}    "
+            f"90th percentile ${stats['p90']:.2f}    Max ${stats['max']:.2f}    "
+            f"Daily burn ${stats['daily_burn']:.2f}/day\n"
+            f"Top merchants: {top}"
+        )
+    
+    def show_view_stats(self):
+        """Refresh the statistics under the View Expenses list (and Reports, for the same month)."""
+        if self.view_columns is None or self.view_range is None:
+            self.view_stats_var.set('')
+            return
+        stats = self.view_columns.summary(*self.view_range)
+        self.view_stats_var.set(self.format_stats(stats))
+        if self.report_period == self.view_range:
+            self.report_stats_var.set(self.format_stats(stats))
+    
+    def place_expense(self, expense):
+        """Insert or update one row at its (date, id) position in the window."""
+        iid = str(expense['id'])
+        key = (expense['date'], expense['id'])
+        children = self.tree.get_children()
+        others = [child for child in children if child != iid]
+        
+        # Rows are newest first: skip past every row that sorts above this one
+        lo, hi = 0, len(others)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.row_key(others[mid]) > key:
+                lo = mid + 1
+            else:
+                hi = mid
+        
+        if (lo == 0 and self.more_before) or (lo == len(others) and self.more_after):
+            # Outside the loaded window; paging will fetch it when needed
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+            return
+        
+        values = self.expense_values(expense)
+        if self.tree.exists(iid) and children.index(iid) == lo:
+            self.tree.item(iid, values=values)
+        else:
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+            self.tree.insert('', lo, iid=iid, values=values)
+    
+    def row_key(self, item):
+        """Return the (date, id) keyset position of a Treeview item."""
+        expense = self.expense_for(item)
+        return (expense['date'], expense['id'])
+    
+    def on_tree_scroll(self, first, last):
+        """Update the scrollbar and page rows in when nearing either edge."""
+        self.tree_scroll_y.set(first, last)
+        if self.paging:
+            return
+        if self.local_order is not None:
+            # Sorted or filtered: page through the month in memory
+            start, stop = self.local_window
+            if float(last) >= 0.9 and stop < len(self.local_order):
+                self.local_page(forward=True)
+            elif float(first) <= 0.1 and start > 0:
+                self.local_page(forward=False)
+            return
+        if self.search_text is not None:
+            if float(last) >= 0.9 and self.more_after:
+                self.paging = True
+                self.executor.submit(
+                    search_expenses, self.search_text, limit=self.PAGE_SIZE, offset=self.search_offset,
+                    key='view', on_success=self.search_page_forward, on_error=self.paging_failed
+                )
+            return
+        if self.view_range is None:
+            return
+        start, end = self.view_range
+        if float(last) >= 0.9 and self.more_after:
+            self.paging = True
+            self.executor.submit(
+                get_expenses_page, start, end, after=self.last_key, limit=self.PAGE_SIZE,
+                key='view', on_success=self.page_forward, on_error=self.paging_failed
+            )
+        elif float(first) <= 0.1 and self.more_before:
+            self.paging = True
+            self.executor.submit(
+                get_expenses_page, start, end, before=self.first_key, limit=self.PAGE_SIZE,
+                key='view', on_success=self.page_backward, on_error=self.paging_failed
+            )
+    
+    def paging_failed(self, error):
+        """Stop paging after a failed page fetch."""
+        self.paging = False
+        self.more_before = self.more_after = False
+        messagebox.showerror("Error", f"Failed to load expenses: {str(error)}")
+    
+    @timed('ui.page')
+    def page_forward(self, expenses):
+        """Append the next page and drop rows that scrolled far out of view."""
+        try:
+            self.more_after = len(expenses) == self.PAGE_SIZE
+            if not expenses:
+                return
+            top = round(self.tree.yview()[0] * len(self.tree.get_children()))
+            self.insert_expense_rows(expenses, 'end')
+            children = self.tree.get_children()
+            excess = len(children) - self.PAGE_SIZE * self.MAX_PAGES
+            if excess > 0:
+                self.tree.delete(*children[:excess])
+                self.first_key = self.row_key(children[excess])
+                self.more_before = True
+                self.tree.yview_moveto(max(top - excess, 0) / (len(children) - excess))
+        finally:
+            self.paging = False
+    
+    @timed('ui.page')
+    def page_backward(self, expenses):
+        """Prepend the previous page and drop rows far below the view."""
+        try:
+            self.more_before = len(expenses) == self.PAGE_SIZE
+            if not expenses:
+                return
+            top = round(self.tree.yview()[0] * len(self.tree.get_children()))
+            self.insert_expense_rows(expenses, 0)
+            children = self.tree.get_children()
+            excess = len(children) - self.PAGE_SIZE * self.MAX_PAGES
+            if excess > 0:
+                self.tree.delete(*children[-excess:])
+                self.last_key = self.row_key(children[-excess - 1])
+                self.more_after = True
+            self.tree.yview_moveto((top + len(expenses)) / (len(children) - max(excess, 0)))
+        finally:
+            self.paging = False
     
     def show_context_menu(self, event):
         """Show context menu on right-click."""
         item = self.tree.identify_row(event.y)
         if item:
-            self.tree.selection_set(item)
+            # Keep a multi-row selection when right-clicking inside it
+            if item not in self.tree.selection():
+                self.tree.selection_set(item)
             self.context_menu.post(event.x_root, event.y_root)
     
     def edit_expense(self):
@@ -325,9 +1500,7 @@ class ExpenseTrackerApp:
         if not selected:
             return
             
-        item = self.tree.item(selected[0], 'values')
-        if not item:
-            return
+        old = self.expense_for(selected[0])
             
         # Create edit dialog
         dialog = tk.Toplevel(self.root)
@@ -337,9 +1510,9 @@ class ExpenseTrackerApp:
         dialog.grab_set()
         
         # Variables
-        amount_var = tk.DoubleVar(value=float(item[3].replace('$', '')))
-        category_var = tk.StringVar(value=item[2])
-        date_var = tk.StringVar(value=item[1])
+        amount_var = tk.DoubleVar(value=float(old['amount']))
+        category_var = tk.StringVar(value=old['category'])
+        date_var = tk.StringVar(value=old['date'].strftime('%Y-%m-%d'))
         
         # Form
         ttk.Label(dialog, text="Amount:").pack(pady=5)
@@ -359,8 +1532,8 @@ class ExpenseTrackerApp:
         ttk.Label(dialog, text="Description:").pack(pady=5)
         desc_text = tk.Text(dialog, height=4)
         desc_text.pack(pady=5, padx=10, fill=tk.X)
-        if len(item) > 4:
-            desc_text.insert('1.0', item[4])
+        if old['description']:
+            desc_text.insert('1.0', old['description'])
         
         def save_changes():
             try:
@@ -386,25 +1559,25 @@ class ExpenseTrackerApp:
                     return
                 
                 # Update in database
-                connection = create_connection()
-                if connection:
-                    try:
-                        cursor = connection.cursor()
-                        query = """
-                            UPDATE transactions 
-                            SET amount = %s, category = %s, date = %s, description = %s
-                            WHERE id = %s
-                        """
-                        cursor.execute(query, (amount, category, date, description or None, item[0]))
-                        connection.commit()
-                        messagebox.showinfo("Success", "Expense updated successfully!")
-                        dialog.destroy()
-                        self.load_expenses()
-                    except Error as e:
-                        messagebox.showerror("Error", f"Failed to update expense: {str(e)}")
-                    finally:
-                        cursor.close()
-                        connection.close()
+                new = {
+                    'id': old['id'],
+                    'amount': Decimal(str(amount)),
+                    'category': category,
+                    'date': date,
+                    'description': description or None
+                }
+                self.journal.append(
+                    'update',
+                    id=old['id'],
+                    amount=str(new['amount']),
+                    category=category,
+                    date=date.isoformat(),
+                    description=description or None
+                )
+                messagebox.showinfo("Success", "Expense updated successfully!")
+                dialog.destroy()
+                self.patch_view(old=old, new=new)
+                self.update_queue_status()
                 
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -413,7 +1586,8 @@ class ExpenseTrackerApp:
         button_frame = ttk.Frame(dialog)
         button_frame.pack(pady=10)
         
-        ttk.Button(button_frame, text="Save", command=save_changes).pack(side=tk.LEFT, padx=5)
+        save_button = ttk.Button(button_frame, text="Save", command=save_changes)
+        save_button.pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
     
     def delete_expense(self):
@@ -421,28 +1595,127 @@ class ExpenseTrackerApp:
         selected = self.tree.selection()
         if not selected:
             return
-            
-        item = self.tree.item(selected[0], 'values')
-        if not item:
+        
+        if len(selected) > 1:
+            ids = self.selected_ids()
+            if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete these {len(ids)} expenses?"):
+                self.run_batch(f"delete {len(ids)} expenses", delete_transactions, ids)
             return
             
         if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this expense?"):
+            old = self.expense_for(selected[0])
             try:
-                connection = create_connection()
-                if connection:
-                    try:
-                        cursor = connection.cursor()
-                        cursor.execute("DELETE FROM transactions WHERE id = %s", (item[0],))
-                        connection.commit()
-                        messagebox.showinfo("Success", "Expense deleted successfully!")
-                        self.load_expenses()
-                    except Error as e:
-                        messagebox.showerror("Error", f"Failed to delete expense: {str(e)}")
-                    finally:
-                        cursor.close()
-                        connection.close()
+                self.journal.append('delete', id=old['id'])
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {str(e)}")
+                return
+            messagebox.showinfo("Success", "Expense deleted successfully!")
+            self.patch_view(old=old)
+            self.update_queue_status()
+    
+    def selected_ids(self):
+        """Return the transaction ids of every selected Treeview row."""
+        return [int(self.tree.item(item, 'values')[0]) for item in self.tree.selection()]
+    
+    def recategorize_selected(self):
+        """Move every selected expense to one category."""
+        ids = self.selected_ids()
+        if not ids:
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Change Category")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        ttk.Label(dialog, text=f"New category for {len(ids)} expenses:").pack(pady=5, padx=10)
+        category_var = tk.StringVar()
+        ttk.Combobox(
+            dialog,
+            textvariable=category_var,
+            values=list(self.category_combobox['values'])
+        ).pack(pady=5, padx=10, fill=tk.X)
+        
+        def apply_category():
+            category = category_var.get().strip()
+            if not category:
+                messagebox.showerror("Error", "Please select a category.", parent=dialog)
+                return
+            dialog.destroy()
+            self.run_batch(
+                f"change the category of {len(ids)} expenses", update_transactions, ids,
+                category=category
+            )
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="Apply", command=apply_category).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+    
+    def shift_selected_dates(self):
+        """Move the date of every selected expense by a number of days."""
+        ids = self.selected_ids()
+        if not ids:
+            return
+        days = simpledialog.askinteger(
+            "Shift Dates",
+            f"Move {len(ids)} expenses by how many days?\n(Negative numbers move them earlier.)",
+            parent=self.root,
+            minvalue=-3650,
+            maxvalue=3650
+        )
+        if days:
+            self.run_batch(f"shift {len(ids)} expenses by {days} days", update_transactions, ids, days=days)
+    
+    def run_batch(self, label, func, ids, **kwargs):
+        """Run a batch update/delete in the background and keep its rows for Undo."""
+        self.executor.submit(
+            func, ids,
+            on_success=lambda rows: self.on_batch_done(label, rows),
+            on_error=self.error_callback(f"Failed to {label}"),
+            **kwargs
+        )
+    
+    def on_batch_done(self, label, rows):
+        """Report a finished batch operation and refresh the view."""
+        if rows is None:
+            messagebox.showerror("Error", f"Failed to {label}.")
+            return
+        self.last_batch = (label, rows) if rows else None
+        if self.last_batch:
+            self.context_menu.entryconfig(self.undo_menu_index, label=f"Undo: {label}", state=tk.NORMAL)
+        messagebox.showinfo("Success", f"Done: {label}. Use Undo (Ctrl+Z) to revert.")
+        self.refresh_view()
+    
+    def undo_batch(self):
+        """Restore the rows changed or deleted by the last batch operation."""
+        if not self.last_batch:
+            return
+        label, rows = self.last_batch
+        if not messagebox.askyesno("Confirm Undo", f"Undo: {label}?"):
+            return
+        self.executor.submit(
+            restore_transactions, rows,
+            on_success=self.on_batch_undone,
+            on_error=self.error_callback("Failed to undo")
+        )
+    
+    def on_batch_undone(self, restored):
+        """Report the outcome of an undo and refresh the view."""
+        if restored:
+            self.last_batch = None
+            self.context_menu.entryconfig(self.undo_menu_index, label="Undo", state=tk.DISABLED)
+            self.refresh_view()
+        else:
+            messagebox.showerror("Error", "Failed to undo.")
+    
+    def refresh_view(self):
+        """Reload whatever the View Expenses tab is showing."""
+        if self.search_text is not None:
+            self.search_var.set(self.search_text)
+            self.run_search()
+        else:
+            self.load_expenses()
     
     def generate_report(self):
         """Generate and display expense report."""
@@ -450,45 +1723,294 @@ class ExpenseTrackerApp:
             month_name = self.report_month_var.get()
             year = int(self.report_year_var.get())
             month = datetime.datetime.strptime(month_name, '%B').month
-            
-            # Clear previous chart
-            for widget in self.chart_frame.winfo_children():
-                widget.destroy()
-            
-            # Get expenses by category
-            expenses = get_expenses_by_category(year, month)
-            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
+            return
+        
+        # Get expenses by category; a newer request replaces a pending one
+        period = month_bounds(year, month)
+        self.executor.submit(
+            lambda: (get_expenses_by_category(year, month), get_expense_stats(*period)),
+            key='report',
+            on_success=lambda result: self.show_report(month_name, year, *result, period=period),
+            on_error=self.error_callback("Failed to generate report")
+        )
+    
+    def on_tab_changed(self, event):
+        """Start loading the charting modules the first time Reports opens."""
+        if self.notebook.select() == str(self.budgets_tab):
+            self.load_budgets()
+            return
+        if self.report_canvas is None and self.notebook.select() == str(self.reports_tab):
+            self.executor.submit(
+                load_report_modules,
+                key='report-modules',
+                on_success=lambda _: self.get_report_canvas(),
+                on_error=self.error_callback("Failed to load the charting modules")
+            )
+    
+    def get_report_canvas(self):
+        """Return the persistent report figure, creating it on first use."""
+        if self.report_canvas is None:
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            from matplotlib.figure import Figure
+            # Figure is used directly so no pyplot figure manager ever holds it
+            self.report_figure = Figure(figsize=(12, 5))
+            self.report_canvas = FigureCanvasTkAgg(self.report_figure, master=self.chart_frame)
+            self.report_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+            self.report_canvas.mpl_connect('draw_event', self.on_report_draw)
+        return self.report_canvas
+    
+    def draw_report(self):
+        """Render the report figure now, timed as one chart repaint."""
+        with recorder.span('ui.chart_render'):
+            self.report_canvas.draw()
+    
+    def on_report_draw(self, event):
+        """After a full redraw, save the static background for blitting."""
+        self.report_background = self.report_canvas.copy_from_bbox(self.report_figure.bbox)
+        for artist in self.report_artists:
+            artist.axes.draw_artist(artist)
+    
+    def clear_report(self):
+        """Blank the shared figure so the previous chart doesn't linger."""
+        if self.report_canvas is None:
+            return
+        self.report_figure.clear()
+        # The next report lays its axes out from scratch
+        self.report_mode = None
+        self.report_artists = []
+        self.report_canvas.draw_idle()
+    
+    def show_report(self, month_name, year, expenses, stats=None, period=None):
+        """Draw the report charts for one month's category totals."""
+        import numpy as np
+        self.report_period = period
+        self.report_stats_var.set(self.format_stats(stats) if stats is not None else '')
+        try:
             if not expenses:
+                self.clear_report()
                 messagebox.showinfo("No Data", f"No expenses found for {month_name} {year}")
                 return
             
             # Prepare data
             categories = [expense['category'] for expense in expenses]
-            amounts = [float(expense['total']) for expense in expenses]
+            amounts = np.array([float(expense['total']) for expense in expenses])
+            period = f"{month_name} {year}"
+            
+            self.get_report_canvas()
+            if self.report_mode == ('month', tuple(categories)):
+                self.update_month_report(period, amounts)
+            else:
+                self.build_month_report(period, categories, amounts)
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
+    
+    def build_month_report(self, period, categories, amounts):
+        """Lay out the pie and bar charts from scratch on the shared figure."""
+        figure = self.report_figure
+        figure.clear()
+        ax1, ax2 = figure.subplots(1, 2)
+        
+        # Pie chart
+        wedges, labels, percents = ax1.pie(amounts, labels=categories, autopct='%1.1f%%', startangle=90)
+        ax1.set_title(f'Expense Distribution - {period}')
+        
+        # Bar chart
+        bars = ax2.bar(categories, amounts, color='skyblue')
+        ax2.set_title(f'Expenses by Category - {period}')
+        ax2.set_ylabel('Amount ($)')
+        ax2.set_ylim(0, amounts.max() * 1.1)
+        for label in ax2.get_xticklabels():
+            label.set_rotation(45)
+            label.set_ha('right')
+        
+        # Data artists are drawn separately so later updates can be blitted
+        self.report_artists = list(wedges) + list(labels) + list(percents) + list(bars)
+        for artist in self.report_artists:
+            artist.set_animated(True)
+        self.report_pie = (wedges, labels, percents)
+        self.report_bars = bars
+        self.report_mode = ('month', tuple(categories))
+        
+        # Adjust layout
+        figure.tight_layout()
+        self.draw_report()
+    
+    def update_month_report(self, period, amounts):
+        """Move the existing pie wedges and bars to new values in place."""
+        import numpy as np
+        ax1, ax2 = self.report_figure.axes
+        wedges, labels, percents = self.report_pie
+        
+        # Same geometry as Axes.pie(startangle=90, labeldistance=1.1, pctdistance=0.6)
+        fractions = amounts / amounts.sum()
+        bounds = 90 + 360 * np.concatenate(([0.0], np.cumsum(fractions)))
+        middles = np.deg2rad((bounds[:-1] + bounds[1:]) / 2)
+        for i, wedge in enumerate(wedges):
+            wedge.set_theta1(bounds[i])
+            wedge.set_theta2(bounds[i + 1])
+            x, y = np.cos(middles[i]), np.sin(middles[i])
+            labels[i].set_position((1.1 * x, 1.1 * y))
+            labels[i].set_ha('left' if x > 0 else 'right')
+            percents[i].set_position((0.6 * x, 0.6 * y))
+            percents[i].set_text(f'{fractions[i] * 100:1.1f}%')
+        for bar, amount in zip(self.report_bars, amounts):
+            bar.set_height(amount)
+        
+        title = f'Expense Distribution - {period}'
+        top = ax2.get_ylim()[1]
+        if (self.report_background is not None and ax1.get_title() == title
+                and amounts.max() <= top and amounts.max() * 1.1 >= top * 0.5):
+            # Only data changed: repaint the artists over the saved background
+            started = time.perf_counter() if recorder.enabled else None
+            self.report_canvas.restore_region(self.report_background)
+            for artist in self.report_artists:
+                artist.axes.draw_artist(artist)
+            self.report_canvas.blit(self.report_figure.bbox)
+            if started is not None:
+                recorder.record('ui.chart_blit', time.perf_counter() - started)
+        else:
+            ax1.set_title(title)
+            ax2.set_title(f'Expenses by Category - {period}')
+            ax2.set_ylim(0, amounts.max() * 1.1)
+            self.draw_report()
+    
+    def generate_trend(self):
+        """Generate a multi-month category trend report."""
+        try:
+            year = int(self.report_year_var.get())
+            month = datetime.datetime.strptime(self.report_month_var.get(), '%B').month
+            span = int(self.trend_months_var.get())
+            if span < 1:
+                raise ValueError("the trend needs at least one month")
+            start_year, start_month = divmod(year * 12 + month - span, 12)
+            start_month += 1
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate trend: {str(e)}")
+            return
+
+        self.executor.submit(
+            get_category_matrix, start_year, start_month, year, month,
+            key='report',
+            on_success=self.show_trend,
+            on_error=self.error_callback("Failed to generate trend")
+        )
+
+    def show_trend(self, matrix):
+        """Draw a month x category trend as stacked bars or lines."""
+        import numpy as np
+        self.report_period = None
+        self.report_stats_var.set('')
+        try:
+            if not matrix or not matrix['categories']:
+                self.clear_report()
+                messagebox.showinfo("No Data", "No expenses found for the selected period")
+                return
             
-            # Create figure
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+            totals = matrix['totals']
+            labels = [datetime.date(y, m, 1).strftime('%b %Y') for y, m in matrix['months']]
+            x = np.arange(len(labels))
             
-            # Pie chart
-            ax1.pie(amounts, labels=categories, autopct='%1.1f%%', startangle=90)
-            ax1.set_title(f'Expense Distribution - {month_name} {year}')
+            self.get_report_canvas()
+            figure = self.report_figure
+            figure.clear()
+            ax = figure.subplots()
+            if self.trend_style_var.get() == "Line":
+                lines = ax.plot(x, totals, marker='o')
+                for line, category in zip(lines, matrix['categories']):
+                    line.set_label(category)
+            else:
+                # Each column stacks on the running sum of the columns before it
+                bottoms = np.cumsum(totals, axis=1) - totals
+                for column, category in enumerate(matrix['categories']):
+                    ax.bar(x, totals[:, column], bottom=bottoms[:, column], label=category)
             
-            # Bar chart
-            ax2.bar(categories, amounts, color='skyblue')
-            ax2.set_title(f'Expenses by Category - {month_name} {year}')
-            ax2.set_ylabel('Amount ($)')
-            plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45, ha='right')
+            ax.set_title(f'Expense Trend - {labels[0]} to {labels[-1]}')
+            ax.set_ylabel('Amount ($)')
+            ax.set_xticks(x)
+            ax.set_xticklabels(labels, rotation=45, ha='right')
+            ax.legend(loc='upper left', fontsize='small')
             
-            # Adjust layout
-            plt.tight_layout()
+            self.report_mode = 'trend'
+            self.report_artists = []
             
-            # Embed in Tkinter
-            canvas = FigureCanvasTkAgg(fig, master=self.chart_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+            # Adjust layout
+            figure.tight_layout()
+            self.draw_report()
             
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
+            messagebox.showerror("Error", f"Failed to generate trend: {str(e)}")
+
+    def show_diagnostics(self):
+        """Open the timing diagnostics window (enables recording)."""
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+        recorder.enabled = True
+        
+        window = tk.Toplevel(self.root)
+        window.title("Diagnostics")
+        window.geometry("900x550")
+        self.diagnostics_window = window
+        
+        # Controls
+        controls = ttk.Frame(window)
+        controls.pack(fill=tk.X, padx=10, pady=5)
+        recording_var = tk.BooleanVar(value=recorder.enabled)
+        ttk.Checkbutton(
+            controls,
+            text="Record timings",
+            variable=recording_var,
+            command=lambda: setattr(recorder, 'enabled', recording_var.get())
+        ).pack(side=tk.LEFT)
+        ttk.Button(controls, text="Reset", command=recorder.reset).pack(side=tk.LEFT, padx=5)
+        stats_var = tk.StringVar()
+        ttk.Label(controls, textvariable=stats_var).pack(side=tk.LEFT, padx=10)
+        
+        # Latency percentiles per span
+        spans = ttk.Treeview(
+            window,
+            columns=('span', 'count', 'p50', 'p95', 'p99', 'max'),
+            show='headings',
+            height=10
+        )
+        for column, width in (('span', 200), ('count', 80), ('p50', 90), ('p95', 90), ('p99', 90), ('max', 90)):
+            spans.heading(column, text=column if column in ('span', 'count') else f"{column} (ms)")
+            spans.column(column, width=width, anchor=tk.W if column == 'span' else tk.E)
+        spans.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        # Slow span samples with their SQL
+        ttk.Label(window, text=f"Slow spans (>= {recorder.slow_ms:.0f} ms)").pack(anchor=tk.W, padx=10)
+        slow = ttk.Treeview(window, columns=('at', 'span', 'ms', 'sql'), show='headings', height=8)
+        for column, width in (('at', 70), ('span', 140), ('ms', 80), ('sql', 560)):
+            slow.heading(column, text=column)
+            slow.column(column, width=width, anchor=tk.E if column == 'ms' else tk.W)
+        slow.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def refresh():
+            if not window.winfo_exists():
+                return
+            spans.delete(*spans.get_children())
+            for name, stats in recorder.summary().items():
+                spans.insert('', 'end', values=(
+                    name, stats['count'],
+                    f"{stats['p50']:.2f}", f"{stats['p95']:.2f}",
+                    f"{stats['p99']:.2f}", f"{stats['max']:.2f}"
+                ))
+            slow.delete(*slow.get_children())
+            for sample in recorder.slow_samples():
+                slow.insert('', 'end', values=(sample['at'], sample['span'], f"{sample['ms']:.1f}", sample['sql'] or ''))
+            pool, cache, queued = get_pool_stats(), get_cache_stats(), self.replayer.stats()
+            stats_var.set(
+                f"Pool: {pool['in_use']}/{pool['size']} in use, {pool['opens']} opens, {pool['waits']} waits   "
+                f"Cache: {cache['hits']} hits / {cache['misses']} misses, {cache['bytes'] // 1024} KiB   "
+                f"Journal: {queued['depth']} queued, {queued['lag']:.1f}s lag, {queued['applied']} replayed"
+            )
+            window.after(1000, refresh)
+        
+        refresh()
 
 def main():
     """Main function to run the application."""
@@ -496,6 +2018,10 @@ def main():
         root = tk.Tk()
         app = ExpenseTrackerApp(root)
         root.mainloop()
+        app.replayer.stop()
+        app.journal.close()
+        app.executor.shutdown()
+        close_pool()
     except Exception as e:
         messagebox.showerror("Fatal Error", f"Application failed to start: {str(e)}")
         raise
@@ -0,0 +1,121 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class BackgroundExecutor:
+    """Run blocking work (database calls) on worker threads for a Tk app.
+
+    Results are handed back to the Tk thread through a queue that is drained
+    with ``after()``, so callbacks may touch widgets freely. Requests can be
+    submitted under a ``key``; a newer request with the same key supersedes
+    the older one, which is cancelled if it has not started yet and whose
+    result is dropped otherwise.
+    """
+
+    def __init__(self, root, max_workers=4, poll_interval=50, on_busy_change=None):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.on_busy_change = on_busy_change
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db-worker')
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._pending = {}
+        self._closed = False
+        self._after_id = self.root.after(self.poll_interval, self._poll)
+
+    @property
+    def busy(self):
+        """True while any submitted request has not delivered its result."""
+        with self._lock:
+            return bool(self._pending)
+
+    def submit(self, func, *args, on_success=None, on_error=None, key=None, **kwargs):
+        """Run func(*args, **kwargs) on a worker and deliver the outcome to Tk.
+
+        on_success(result) or on_error(exception) is called on the Tk thread.
+        """
+        with self._lock:
+            if self._closed:
+                return None
+            generation = self._generations.get(key, 0) + 1
+            if key is not None:
+                self._generations[key] = generation
+                superseded = self._pending.pop(key, None)
+                if superseded is not None:
+                    superseded.cancel()
+            token = key if key is not None else object()
+            future = self._pool.submit(self._run, token, key, generation, func, args, kwargs,
+                                       on_success, on_error)
+            self._pending[token] = future
+        self._notify_busy()
+        return future
+
+    def cancel(self, key):
+        """Drop the outstanding request submitted under key, if any."""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            future = self._pending.pop(key, None)
+        if future is not None:
+            future.cancel()
+            self._notify_busy()
+
+    def post(self, func, *args):
+        """Schedule func(*args) on the Tk thread; safe to call from any thread."""
+        self._results.put((func, args))
+
+    def _run(self, token, key, generation, func, args, kwargs, on_success, on_error):
+        try:
+            result = func(*args, **kwargs)
+            outcome = (on_success, (result,)) if on_success else None
+        except Exception as e:
+            outcome = (on_error or self._report_error, (e,))
+        self._results.put((self._deliver, (token, key, generation, outcome)))
+
+    def _deliver(self, token, key, generation, outcome):
+        with self._lock:
+            if key is not None and self._generations.get(key) != generation:
+                return
+            self._pending.pop(token, None)
+        self._notify_busy()
+        if outcome:
+            callback, args = outcome
+            callback(*args)
+
+    def _report_error(self, error):
+        print(f"Background task failed: {error}")
+
+    def _notify_busy(self):
+        if self.on_busy_change:
+            if threading.current_thread() is threading.main_thread():
+                self.on_busy_change(self.busy)
+            else:
+                self.post(lambda: self.on_busy_change(self.busy))
+
+    def _poll(self):
+        try:
+            while True:
+                func, args = self._results.get_nowait()
+                try:
+                    func(*args)
+                except Exception as e:
+                    self._report_error(e)
+        except queue.Empty:
+            pass
+        if not self._closed:
+            self._after_id = self.root.after(self.poll_interval, self._poll)
+
+    def shutdown(self):
+        """Stop polling and let running work finish without delivering results."""
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            future.cancel()
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,281 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import database
+from rules import RuleSet
+from storage import MySQLBackend, SQLiteBackend
+
+CATEGORIES = ['Food', 'Transport', 'Shopping', 'Bills', 'Entertainment', 'Health', 'Education', 'Other']
+MERCHANTS = ['Amazon', 'Uber', 'Walmart', 'Netflix', 'Starbucks', 'Shell', 'Target', 'Pharmacy',
+             'Electric Co', 'Bookstore', 'Cinema', 'Grocery Mart', 'Airline', 'Gym']
+
+def synthetic_rows(count, months, seed=42):
+    """Yield ``count`` reproducible random transactions spread over ``months``."""
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    start_year, start_month = divmod(today.year * 12 + today.month - months, 12)
+    start = datetime.date(start_year, start_month + 1, 1)
+    span = (database.month_bounds(today.year, today.month)[1] - start).days
+    for i in range(count):
+        yield {
+            'amount': max(round(rng.lognormvariate(3, 1), 2), 0.01),
+            'category': rng.choice(CATEGORIES),
+            'date': start + datetime.timedelta(days=rng.randrange(span)),
+            'description': f"{rng.choice(MERCHANTS)} #{rng.randrange(10000)}",
+            'import_hash': f"bench-{seed}-{i}",
+        }
+
+def measure(func, repeat):
+    """Call func ``repeat`` times and summarize the wall-clock timings in ms."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'runs': repeat,
+        'min_ms': round(timings[0], 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+    }
+
+def reset_backend(args, rows):
+    """Point database.py at an empty benchmark database for one dataset size."""
+    if args.backend == 'sqlite':
+        path = os.path.join(args.workdir, f"bench_{rows}.db")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        backend = SQLiteBackend(path)
+    else:
+        backend = MySQLBackend(
+            host=os.getenv('DB_HOST'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            database=args.mysql_database
+        )
+        backend.create_database()
+        connection = backend.connect()
+        cursor = connection.cursor()
+        cursor.execute("DROP TABLE IF EXISTS transactions")
+        cursor.execute("DROP TABLE IF EXISTS monthly_category_totals")
+        cursor.execute("DROP TABLE IF EXISTS schema_version")
+        cursor.execute("DROP TABLE IF EXISTS archived_years")
+        cursor.execute("DROP TABLE IF EXISTS budgets")
+        cursor.execute("DROP TABLE IF EXISTS category_rules")
+        connection.commit()
+        connection.close()
+    database.set_backend(backend)
+    database.create_tables()
+
+def bench_whole_range(args, end):
+    """Compare dict rows with the columnar block over the whole dataset."""
+    today = datetime.date.today()
+    start = datetime.date(today.year - args.months // 12 - 1, 1, 1)
+    rows = database.get_expenses_between(start, end)
+    columns = database.get_expenses_columns(start, end)
+    return {
+        'range_memory': {
+            'rows': len(rows),
+            'dict_rows_bytes': database.QueryCache._estimate_size(rows),
+            'columnar_bytes': columns.nbytes,
+        },
+        'range_total_dict_rows': measure(lambda: sum(float(row['amount']) for row in rows), args.repeat),
+        'range_total_columnar': measure(columns.total, args.repeat),
+    }
+
+def synthetic_rules(count, seed=42):
+    """``count`` categorization rules: mostly merchant substrings, some amount bands and regexes."""
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        merchant = rng.choice(MERCHANTS)
+        if i % 10 == 0:
+            rule = {'kind': 'regex', 'pattern': rf"\b{merchant.split()[0]}\s+#{rng.randrange(10)}\d{{2}}\b"}
+        elif i % 10 in (1, 2):
+            low = rng.randrange(200)
+            rule = {'kind': 'contains', 'pattern': merchant, 'min_amount': low, 'max_amount': low + 50}
+        else:
+            rule = {'kind': 'contains', 'pattern': f"{merchant} #{rng.randrange(1000)}"}
+        rule.update(id=i + 1, priority=i, category=rng.choice(CATEGORIES))
+        rules.append(rule)
+    return rules
+
+def bench_rules(args):
+    """Categorization throughput: the compiled matcher alone and the stored-row pass."""
+    rules = synthetic_rules(args.rules)
+    started = time.perf_counter()
+    rule_set = RuleSet(rules)
+    rule_set.match('')
+    compile_ms = (time.perf_counter() - started) * 1000
+    rows = list(synthetic_rows(args.rule_rows, args.months, seed=7))
+    # Unique descriptions, so the per-description memo can't help
+    for i, row in enumerate(rows):
+        row['description'] += f" REF{i}"
+    started = time.perf_counter()
+    changed = rule_set.categorize(rows)
+    elapsed = time.perf_counter() - started
+    results = {
+        'rules_compile': {'rules': len(rules), 'ms': round(compile_ms, 3)},
+        'rules_match': {
+            'descriptions': len(rows),
+            'changed': changed,
+            'seconds': round(elapsed, 3),
+            'descriptions_per_minute': round(len(rows) / elapsed * 60) if elapsed else None,
+        },
+    }
+    for rule in rules:
+        database.add_rule(rule['kind'], rule['pattern'], rule['category'],
+                          rule.get('min_amount'), rule.get('max_amount'), rule['priority'])
+    started = time.perf_counter()
+    applied = database.apply_rules(chunk_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    results['apply_rules'] = {
+        'rows': applied['processed'] if applied else 0,
+        'changed': applied['changed'] if applied else 0,
+        'seconds': round(elapsed, 3),
+        'rows_per_minute': round(applied['processed'] / elapsed * 60) if applied and elapsed else None,
+    }
+    return results
+
+def bench_treeview_fill(year, month, repeat):
+    """Time load_expenses' fetch-and-fill path on a hidden Tk window."""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return {'skipped': f"no display for Tk: {e}"}
+    root.withdraw()
+    try:
+        from app import ExpenseTrackerApp
+        app = ExpenseTrackerApp(root)
+        app.executor.shutdown()
+        start, end = database.month_bounds(year, month)
+
+        def fill():
+            app.show_first_page(app.fetch_first_page(start, end))
+            root.update_idletasks()
+
+        return measure(fill, repeat)
+    finally:
+        root.destroy()
+
+def run_size(args, rows):
+    """Build one synthetic dataset and time every data path against it."""
+    print(f"== {rows} rows ({args.backend})", file=sys.stderr)
+    reset_backend(args, rows)
+    results = {}
+
+    started = time.perf_counter()
+    imported = database.import_transactions(synthetic_rows(rows, args.months), batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    results['bulk_insert'] = {
+        'rows': imported['inserted'] if imported else 0,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed else None,
+    }
+
+    today = datetime.date.today()
+    results['add_transaction'] = measure(
+        lambda: database.add_transaction(12.34, 'Food', today, 'benchmark single insert'),
+        args.repeat * 5
+    )
+
+    # Measure the database, not the in-process result cache
+    database.query_cache.max_bytes = 0
+    year, month = today.year, today.month
+    start, end = database.month_bounds(year, month)
+    results['get_monthly_expenses'] = measure(lambda: database.get_monthly_expenses(year, month), args.repeat)
+    results['get_expenses_by_category'] = measure(lambda: database.get_expenses_by_category(year, month), args.repeat)
+    results['get_expenses_summary'] = measure(lambda: database.get_expenses_summary(start, end), args.repeat)
+    results['get_expenses_page'] = measure(lambda: database.get_expenses_page(start, end, limit=200), args.repeat)
+    results['search_expenses'] = measure(lambda: database.search_expenses('amaz', limit=200), args.repeat)
+    results['get_expenses_columns'] = measure(lambda: database.get_expenses_columns(start, end), args.repeat)
+    results['get_expense_stats'] = measure(lambda: database.get_expense_stats(start, end), args.repeat)
+    if rows <= args.range_limit:
+        results.update(bench_whole_range(args, end))
+    if args.rules:
+        results.update(bench_rules(args))
+    if not args.skip_ui:
+        results['treeview_fill'] = bench_treeview_fill(year, month, args.repeat)
+    results['month_rows'] = len(database.get_monthly_expenses(year, month))
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, baseline_path):
+    """Print median timing ratios against an earlier results file."""
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)
+    for rows, metrics in current['results'].items():
+        for name, value in metrics.items():
+            old = baseline.get('results', {}).get(rows, {}).get(name)
+            if isinstance(value, dict) and isinstance(old, dict) and 'median_ms' in value and 'median_ms' in old:
+                ratio = value['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+                flag = '  <-- slower' if ratio > 1.2 else ''
+                print(f"{rows:>10} {name:<28} {old['median_ms']:>10.3f} -> {value['median_ms']:>10.3f} ms "
+                      f"({ratio:.2f}x){flag}")
+
+def main(argv=None):
+    """Benchmark database.py and the View Expenses fill at several dataset sizes."""
+    parser = argparse.ArgumentParser(description="Expense Tracker benchmarks")
+    parser.add_argument('--rows', default='10000',
+                        help="comma-separated dataset sizes, e.g. 10000,1000000,10000000")
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--mysql-database', default='expense_tracker_bench',
+                        help="scratch MySQL database; its tables are dropped")
+    parser.add_argument('--workdir', default=tempfile.gettempdir(),
+                        help="directory for the SQLite benchmark files")
+    parser.add_argument('--months', type=int, default=36, help="months of history to spread rows over")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--skip-ui', action='store_true', help="do not time the Treeview fill")
+    parser.add_argument('--range-limit', type=int, default=1000000,
+                        help="largest dataset to load whole for the dict/columnar memory comparison")
+    parser.add_argument('--rules', type=int, default=60,
+                        help="categorization rules to benchmark (0 to skip)")
+    parser.add_argument('--rule-rows', type=int, default=1000000,
+                        help="descriptions to run through the compiled rules")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': args.backend,
+        'results': {},
+    }
+    for rows in (int(size) for size in args.rows.split(',')):
+        report['results'][str(rows)] = run_size(args, rows)
+    database.close_pool()
+
+    with open(args.output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+import datetime
+import decimal
+import re
+import sys
+from array import array
+
+import numpy as np
+
+EPOCH = datetime.date(1970, 1, 1)
+_EPOCH_ORDINAL = EPOCH.toordinal()
+CENT = decimal.Decimal('0.01')
+
+def from_cents(cents):
+    """Integer cents to a two-place Decimal amount."""
+    return (decimal.Decimal(int(round(cents))) / 100).quantize(CENT)
+
+# Where the merchant part of a description ends: a '#' or a token with a digit
+_REFERENCE = re.compile(r"#|\S*\d")
+_WORD = re.compile(r"[^\W\d_]+")
+
+def merchant_name(description):
+    """Group key for a description: its words up to the first number or reference code.
+
+    "Amazon #1b" and "AMAZON 2231 SEATTLE" both give "Amazon".
+    """
+    description = description or ''
+    words = _WORD.findall(_REFERENCE.split(description, maxsplit=1)[0]) or _WORD.findall(description)
+    return ' '.join(words).title() or '(No description)'
+
+class ExpenseColumns:
+    """Transactions stored column by column instead of one dict per row.
+
+    ``ids`` are int64, ``days`` are int32 days since 1970-01-01, ``cents``
+    are int64 amounts in cents and ``codes`` index into the ``categories``
+    list (dictionary encoding). Descriptions stay a plain list of strings.
+    Rows keep the order they were read in. Sort orders and lookup indexes
+    are built on first use and kept with the block.
+    """
+
+    __slots__ = ('ids', 'days', 'cents', 'codes', 'categories', 'descriptions',
+                 '_orders', '_positions', '_folded')
+
+    def __init__(self, ids, days, cents, codes, categories, descriptions):
+        self.ids = ids
+        self.days = days
+        self.cents = cents
+        self.codes = codes
+        self.categories = categories
+        self.descriptions = descriptions
+        self._orders = {}
+        self._positions = None
+        self._folded = None
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Build from an iterable of row lists of (id, amount, category, date, description).
+
+        Rows are packed into ``array`` buffers as they arrive, so a large
+        result never exists as Python objects all at once.
+        """
+        ids, days, cents, codes = array('q'), array('i'), array('q'), array('i')
+        lookup = {}
+        descriptions = []
+        for chunk in chunks:
+            for transaction_id, amount, category, date, description in chunk:
+                ids.append(transaction_id)
+                days.append(date.toordinal() - _EPOCH_ORDINAL)
+                cents.append(int(amount * 100))
+                code = lookup.get(category)
+                if code is None:
+                    code = lookup[category] = len(lookup)
+                codes.append(code)
+                descriptions.append(description)
+        return cls(
+            np.frombuffer(ids, dtype=np.int64),
+            np.frombuffer(days, dtype=np.int32),
+            np.frombuffer(cents, dtype=np.int64),
+            np.frombuffer(codes, dtype=np.int32),
+            list(lookup),
+            descriptions
+        )
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from dict rows as returned by a dictionary cursor."""
+        return cls.from_chunks([[
+            (row['id'], row['amount'], row['category'], row['date'], row['description'])
+            for row in rows
+        ]])
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the columns."""
+        return (
+            self.ids.nbytes + self.days.nbytes + self.cents.nbytes + self.codes.nbytes
+            + sys.getsizeof(self.descriptions)
+            + sum(sys.getsizeof(d) for d in self.descriptions if d is not None)
+            + sum(sys.getsizeof(c) for c in self.categories)
+        )
+
+    def total_cents(self):
+        return int(self.cents.sum())
+
+    def total(self):
+        """Sum of all amounts as a Decimal."""
+        return from_cents(self.total_cents())
+
+    def category_totals(self):
+        """Return {category: Decimal total}, summed in integer cents."""
+        totals = np.zeros(len(self.categories), dtype=np.int64)
+        np.add.at(totals, self.codes, self.cents)
+        return {
+            category: from_cents(cents)
+            for category, cents in zip(self.categories, totals)
+        }
+
+    def dates(self):
+        """The dates as a numpy datetime64[D] array."""
+        return self.days.astype('datetime64[D]')
+
+    def select(self, mask):
+        """Return the rows picked by a boolean mask or index array."""
+        indexes = np.flatnonzero(mask) if np.asarray(mask).dtype == bool else np.asarray(mask)
+        return ExpenseColumns(
+            self.ids[indexes],
+            self.days[indexes],
+            self.cents[indexes],
+            self.codes[indexes],
+            self.categories,
+            [self.descriptions[i] for i in indexes]
+        )
+
+    def patched(self, old=None, new=None):
+        """Return a copy with row ``old`` removed and row ``new`` appended.
+
+        Blocks can be shared through the query cache, so they are never
+        changed in place. Appended rows go last; row order is not kept.
+        """
+        result = self.select(self.ids != old['id']) if old is not None else self
+        if new is None:
+            return result
+        categories = result.categories
+        if new['category'] in categories:
+            code = categories.index(new['category'])
+        else:
+            code = len(categories)
+            categories = categories + [new['category']]
+        return ExpenseColumns(
+            np.append(result.ids, np.int64(new['id'])),
+            np.append(result.days, np.int32(new['date'].toordinal() - _EPOCH_ORDINAL)),
+            np.append(result.cents, np.int64(int(decimal.Decimal(str(new['amount'])) * 100))),
+            np.append(result.codes, np.int32(code)),
+            categories,
+            result.descriptions + [new.get('description')]
+        )
+
+    def summary(self, start, end, top=5):
+        """Vectorized statistics for the period start <= date < end.
+
+        Returns count, total, mean, median, p90 and max amounts (Decimal),
+        the daily burn rate (total over the days of the period so far) and
+        the ``top`` merchants by total as (name, total, count) tuples.
+        """
+        count = len(self)
+        today = datetime.date.today()
+        days = max((min(end, today + datetime.timedelta(days=1)) - start).days, 1)
+        if not count:
+            zero = from_cents(0)
+            return {'count': 0, 'total': zero, 'mean': zero, 'median': zero, 'p90': zero,
+                    'max': zero, 'daily_burn': zero, 'top': []}
+        total = self.total_cents()
+        median, p90 = np.percentile(self.cents, [50, 90])
+        
+        names, inverse = np.unique([merchant_name(d) for d in self.descriptions], return_inverse=True)
+        totals = np.zeros(len(names), dtype=np.int64)
+        np.add.at(totals, inverse, self.cents)
+        counts = np.bincount(inverse, minlength=len(names))
+        ranked = np.argsort(-totals, kind='stable')[:top]
+        return {
+            'count': count,
+            'total': from_cents(total),
+            'mean': from_cents(total / count),
+            'median': from_cents(median),
+            'p90': from_cents(p90),
+            'max': from_cents(self.cents.max()),
+            'daily_burn': from_cents(total / days),
+            'top': [(str(names[i]), from_cents(totals[i]), int(counts[i])) for i in ranked],
+        }
+
+    def _sort_key(self, column):
+        if column == 'id':
+            return self.ids
+        if column == 'date':
+            return self.days
+        if column == 'amount':
+            return self.cents
+        if column == 'category':
+            # Rank of each category name, looked up through the codes
+            ranks = np.argsort(np.argsort([c.casefold() for c in self.categories])) if self.categories \
+                else np.zeros(0, dtype=np.int64)
+            return ranks[self.codes]
+        if column == 'description':
+            return np.unique(self.folded_descriptions(), return_inverse=True)[1]
+        raise ValueError(f"Unknown column: {column}")
+
+    def order_by(self, column, descending=False):
+        """Row indexes sorted by 'id', 'date', 'category', 'amount' or 'description'.
+
+        Ties are broken by id. Each column's order is computed once, so
+        sorting again or flipping the direction costs no sort.
+        """
+        order = self._orders.get(column)
+        if order is None:
+            order = self._orders[column] = np.lexsort((self.ids, self._sort_key(column)))
+        return order[::-1] if descending else order
+
+    def folded_descriptions(self):
+        """Casefolded descriptions ('' for none), for sorting and text matching."""
+        if self._folded is None:
+            self._folded = [(d or '').casefold() for d in self.descriptions]
+        return self._folded
+
+    def matching(self, categories=None, min_amount=None, max_amount=None, text=None):
+        """Boolean mask of the rows passing every given filter.
+
+        ``categories`` is a collection of names, the amounts are inclusive
+        bounds and ``text`` must appear in the description (ignoring case).
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if categories:
+            codes = [code for code, name in enumerate(self.categories) if name in categories]
+            mask &= np.isin(self.codes, codes)
+        if min_amount is not None:
+            mask &= self.cents >= int(decimal.Decimal(str(min_amount)) * 100)
+        if max_amount is not None:
+            mask &= self.cents <= int(decimal.Decimal(str(max_amount)) * 100)
+        if text:
+            needle = text.casefold()
+            mask &= np.fromiter((needle in d for d in self.folded_descriptions()), dtype=bool, count=len(self))
+        return mask
+
+    def position(self, transaction_id):
+        """Index of the row with this id, or None."""
+        if self._positions is None:
+            self._positions = {int(value): index for index, value in enumerate(self.ids)}
+        return self._positions.get(int(transaction_id))
+
+    def row(self, index):
+        """Materialize one row as a dict with id, amount, category, date and description."""
+        return {
+            'id': int(self.ids[index]),
+            'amount': from_cents(self.cents[index]),
+            'category': self.categories[self.codes[index]],
+            'date': datetime.date.fromordinal(int(self.days[index]) + _EPOCH_ORDINAL),
+            'description': self.descriptions[index],
+        }
+
+    def rows(self, start=0, stop=None):
+        """Yield rows start..stop as dicts, e.g. to fill one screen of a view."""
+        for index in range(start, len(self) if stop is None else min(stop, len(self))):
+            yield self.row(index)
@@ -1,123 +1,2304 @@
-import mysql.connector
-from mysql.connector import Error
+import csv
+import datetime
+import decimal
+import hashlib
+import importlib.util
 import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
+from diagnostics import recorder
+from rules import RuleSet, validate_rule
+from storage import StorageError as Error, StorageDataError, TRANSACTION_COLUMNS, backend_from_env
 
 # Load environment variables
 load_dotenv()
 
+class PoolTimeoutError(Error):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+class DatabaseUnavailableError(Error):
+    """Raised by apply_queued_writes when no database connection can be opened."""
+
+class ReadOnlyYearError(Error):
+    """Raised when a write would add, change or remove a row of an archived year."""
+
+class PooledConnection:
+    """Proxy around a pooled connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._connection is not None:
+            self._pool.release(self._connection)
+            self._connection = None
+
+    def discard(self):
+        """Close the connection for good instead of handing it back."""
+        if self._connection is not None:
+            self._pool._drop(self._connection)
+            self._connection = None
+
+class ConnectionPool:
+    """A bounded pool of persistent database connections.
+
+    Connections are opened lazily up to ``size`` by calling ``connect``.
+    A checkout blocks for at most ``timeout`` seconds when every connection
+    is in use. Connections that sat idle longer than ``health_check_after``
+    seconds are pinged (and transparently reconnected) before being handed
+    out.
+    """
+
+    def __init__(self, connect, size=5, timeout=10.0, health_check_after=30.0):
+        self.size = size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._open_connection = connect
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open_count = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'opens': 0,
+            'reconnects': 0,
+            'discarded': 0,
+        }
+
+    def _connect(self):
+        with recorder.span('db.connect'):
+            connection = self._open_connection()
+        with self._lock:
+            self._stats['opens'] += 1
+        return connection
+
+    def _reserve_slot(self):
+        """Claim room for a new connection if the pool is not full yet."""
+        with self._lock:
+            if self._open_count < self.size:
+                self._open_count += 1
+                return True
+            return False
+
+    def _drop(self, connection):
+        """Close a connection and give its slot back to the pool."""
+        try:
+            connection.close()
+        except Error:
+            pass
+        with self._lock:
+            self._open_count -= 1
+            self._stats['discarded'] += 1
+
+    def _check_health(self, connection, idle_since):
+        """Make sure an idle connection is still usable, reconnecting if stale."""
+        if time.monotonic() - idle_since < self.health_check_after:
+            return connection
+        try:
+            if not connection.is_connected():
+                connection.reconnect(attempts=2, delay=0)
+                with self._lock:
+                    self._stats['reconnects'] += 1
+            return connection
+        except Error:
+            self._drop(connection)
+            return None
+
+    def acquire(self):
+        """Check out a connection, waiting up to ``timeout`` seconds."""
+        with self._lock:
+            self._stats['checkouts'] += 1
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        started = time.monotonic()
+        try:
+            while True:
+                try:
+                    connection, idle_since = self._idle.get_nowait()
+                except queue.Empty:
+                    if self._reserve_slot():
+                        try:
+                            return PooledConnection(self, self._connect())
+                        except Error:
+                            with self._lock:
+                                self._open_count -= 1
+                            raise
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        with self._lock:
+                            self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.timeout}s"
+                        )
+                    waited = True
+                    try:
+                        # Poll in short slices so a slot freed by _drop is noticed too
+                        connection, idle_since = self._idle.get(timeout=min(remaining, 0.5))
+                    except queue.Empty:
+                        continue
+                connection = self._check_health(connection, idle_since)
+                if connection is not None:
+                    return PooledConnection(self, connection)
+        finally:
+            if waited:
+                with self._lock:
+                    self._stats['waits'] += 1
+                    self._stats['wait_time'] += time.monotonic() - started
+                if recorder.enabled:
+                    recorder.record('db.checkout_wait', time.monotonic() - started)
+
+    def release(self, connection):
+        """Return a connection to the pool, discarding any uncommitted work."""
+        try:
+            if connection.in_transaction:
+                # A lingering read snapshot would hide other clients' writes
+                connection.rollback()
+        except Error:
+            self._drop(connection)
+            return
+        self._idle.put((connection, time.monotonic()))
+
+    def close_all(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._drop(connection)
+
+    def stats(self):
+        """Return a snapshot of the pool counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._open_count
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['open'] - stats['idle']
+        return stats
+
+_backend = None
+_pool = None
+_pool_lock = threading.Lock()
+
+# Bump whenever create_schema gains a table, column or index
+SCHEMA_VERSION = 6
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+def get_backend():
+    """Return the storage backend selected by DB_BACKEND (mysql or sqlite)."""
+    global _backend
+    with _pool_lock:
+        if _backend is None:
+            _backend = backend_from_env()
+        return _backend
+
+def set_backend(backend):
+    """Switch to another storage backend, closing the current pool."""
+    global _backend, _schema_checked
+    close_pool()
+    with _pool_lock:
+        _backend = backend
+    with _schema_lock:
+        _schema_checked = False
+    forget_archived_years()
+    forget_budgets()
+    forget_rules()
+    query_cache.clear()
+
+def get_pool():
+    """Return the shared connection pool, creating it on first use."""
+    global _pool
+    backend = get_backend()
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                backend.connect,
+                size=int(os.getenv('DB_POOL_SIZE', '5')),
+                timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+                health_check_after=float(os.getenv('DB_POOL_HEALTH_CHECK', '30'))
+            )
+        return _pool
+
+def get_pool_stats():
+    """Get checkout, wait and open counters for the connection pool."""
+    return get_pool().stats()
+
+def close_pool():
+    """Close all pooled connections, e.g. on application exit."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
 def create_connection():
-    """Create a database connection to the MySQL database."""
+    """Check out a connection to the configured database from the shared pool.
+
+    Calling close() on the returned connection hands it back to the pool.
+    """
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database=os.getenv('DB_NAME')
-        )
-        return connection
+        return get_pool().acquire()
     except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+        print(f"Error connecting to the database: {e}")
         return None
 
+class QueryCache:
+    """Thread-safe LRU cache for read query results, invalidated per month.
+
+    Every entry records the (year, month) pairs its result depends on, so
+    a write only evicts the entries for the months it touched. The cache is
+    bounded by an approximate memory budget and an optional TTL, which
+    limits staleness from writes made by other processes.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._by_month = {}
+        self._versions = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def _estimate_size(value):
+        if hasattr(value, 'nbytes'):
+            return value.nbytes
+        size = sys.getsizeof(value)
+        rows = value if isinstance(value, list) else [value]
+        for row in rows:
+            if isinstance(row, dict):
+                size += sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+        return size
+
+    def get(self, key):
+        """Return (True, value) on a hit or (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (not self.ttl or time.monotonic() - entry[3] < self.ttl):
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return True, entry[0]
+            if entry is not None:
+                self._remove(key)
+            self._stats['misses'] += 1
+            return False, None
+
+    def snapshot(self, months):
+        """Capture month versions before running a query for put()."""
+        with self._lock:
+            return tuple(self._versions.get(m, 0) for m in months)
+
+    def put(self, key, value, months, snapshot):
+        """Store a result unless one of its months was written meanwhile."""
+        size = self._estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if snapshot != tuple(self._versions.get(m, 0) for m in months):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, months, size, time.monotonic())
+            self._bytes += size
+            for m in months:
+                self._by_month.setdefault(m, set()).add(key)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        value, months, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        for m in months:
+            keys = self._by_month.get(m)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_month[m]
+
+    def invalidate_months(self, months):
+        """Drop every entry that depends on one of the given (year, month) pairs."""
+        with self._lock:
+            for m in set(months):
+                self._versions[m] = self._versions.get(m, 0) + 1
+                for key in list(self._by_month.get(m, ())):
+                    self._remove(key)
+                    self._stats['invalidations'] += 1
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            for m in list(self._by_month):
+                self._versions[m] = self._versions.get(m, 0) + 1
+            self._entries.clear()
+            self._by_month.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+query_cache = QueryCache(
+    max_bytes=int(float(os.getenv('DB_CACHE_MAX_MB', '32')) * 1024 * 1024),
+    ttl=float(os.getenv('DB_CACHE_TTL', '300'))
+)
+
+def get_cache_stats():
+    """Get hit/miss counters and memory use of the query result cache."""
+    return query_cache.stats()
+
+def months_between(start, end):
+    """List the (year, month) pairs overlapping the range start <= date < end."""
+    months = []
+    year, month = start.year, start.month
+    while datetime.date(year, month, 1) < end:
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return tuple(months)
+
+def cached_query(key, months, loader):
+    """Serve a read from query_cache, running loader() on a miss.
+
+    The loader returns None on error; errors are never cached.
+    """
+    if query_cache.max_bytes <= 0:
+        return loader()
+    hit, value = query_cache.get(key)
+    if not hit:
+        snapshot = query_cache.snapshot(months)
+        value = loader()
+        if value is None:
+            return None
+        query_cache.put(key, value, months, snapshot)
+    # Hand out copies so callers cannot mutate the cached result
+    return _copy_result(value)
+
+def _copy_result(value):
+    """Copy the lists, dicts and arrays of a cached result, all the way down.
+
+    Leaves (numbers, Decimals, dates, strings, tuples of those) are
+    immutable and stay shared, as do ExpenseColumns blocks, which are never
+    changed in place.
+    """
+    if isinstance(value, list):
+        return [_copy_result(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy_result(item) for key, item in value.items()}
+    if hasattr(value, 'ndim'):
+        # numpy array
+        return value.copy()
+    return value
+
 def create_database():
     """Create the database if it doesn't exist."""
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
+        get_backend().create_database()
+    except Error as e:
+        print(f"Error creating database: {e}")
+
+def schema_is_current():
+    """True if the database's schema_version marker matches SCHEMA_VERSION."""
+    try:
+        connection = get_pool().acquire()
+    except Error:
+        # e.g. the MySQL database has not been created yet
+        return False
+    try:
         cursor = connection.cursor()
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {os.getenv('DB_NAME')}")
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        row = cursor.fetchone()
         cursor.close()
+        return row is not None and row[0] is not None and row[0] >= SCHEMA_VERSION
+    except Error:
+        return False
+    finally:
         connection.close()
-    except Error as e:
-        print(f"Error creating database: {e}")
+
+def _create_shared_tables(cursor):
+    """Create the tables whose DDL is the same on every backend."""
+    # Idempotency keys of writes replayed from the offline journal
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS applied_writes (
+            write_key CHAR(32) PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Per-category monthly budgets, checked against the rollups
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS budgets (
+            category VARCHAR(50) PRIMARY KEY,
+            amount DECIMAL(12, 2) NOT NULL,
+            warn_percent SMALLINT NOT NULL DEFAULT 80
+        )
+    """)
+    
+    # Years moved out of transactions into archive partitions
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archived_years (
+            year SMALLINT PRIMARY KEY,
+            state VARCHAR(10) NOT NULL,
+            row_count INT NOT NULL DEFAULT 0,
+            total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            archived_at TIMESTAMP NULL
+        )
+    """)
 
 def create_tables():
-    """Create the necessary tables if they don't exist."""
-    create_database()
+    """Create the necessary tables if they don't exist.
+
+    Runs once per process. A current schema_version marker skips the
+    database creation and DDL, so a normal launch costs one query.
+    """
+    global _schema_checked
+    with _schema_lock:
+        if _schema_checked:
+            return
+        if schema_is_current():
+            _schema_checked = True
+            return
+        
+        create_database()
+        connection = create_connection()
+        if connection:
+            try:
+                cursor = connection.cursor()
+                
+                # Tables, indexes and migrations differ per backend
+                connection.backend.create_schema(cursor)
+                
+                cursor.execute("SELECT COUNT(*) FROM monthly_category_totals")
+                if cursor.fetchone()[0] == 0:
+                    # New rollup table next to existing data: backfill it once
+                    cursor.execute(ROLLUP_REBUILD_QUERY.format(source='transactions'))
+                
+                _create_shared_tables(cursor)
+                
+                cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INT NOT NULL)")
+                cursor.execute("DELETE FROM schema_version")
+                cursor.execute("INSERT INTO schema_version (version) VALUES (%s)", (SCHEMA_VERSION,))
+                
+                connection.commit()
+                _schema_checked = True
+            except Error as e:
+                print(f"Error creating tables: {e}")
+            finally:
+                cursor.close()
+                connection.close()
+
+def month_bounds(year, month):
+    """Return the half-open date range [first of month, first of next month)."""
+    start = datetime.date(year, month, 1)
+    if month == 12:
+        return start, datetime.date(year + 1, 1, 1)
+    return start, datetime.date(year, month + 1, 1)
+
+# {source} is the FROM target, see transactions_source()
+ROLLUP_REBUILD_QUERY = """
+    INSERT INTO monthly_category_totals (year, month, category, total, count)
+    SELECT YEAR(date), MONTH(date), category, SUM(amount), COUNT(*)
+    FROM {source}
+    GROUP BY YEAR(date), MONTH(date), category
+"""
+
+# Seconds a process trusts its copy of archived_years before re-reading it;
+# archive_year() waits this long for other processes to notice a new archive
+ARCHIVE_STATE_TTL = float(os.getenv('DB_ARCHIVE_STATE_TTL', '5'))
+_archive_state = None
+_archive_lock = threading.Lock()
+
+def forget_archived_years():
+    """Drop the cached archived_years so the next query re-reads it."""
+    global _archive_state
+    with _archive_lock:
+        _archive_state = None
+
+def _archived_years(cursor):
+    """Return {year: state} for archived years, re-read on ``cursor`` when stale.
+
+    A year is 'archiving' while its rows are being moved (readable from
+    both tables, closed to writes) and 'archived' once they all live in
+    its archive partition.
+    """
+    global _archive_state
+    with _archive_lock:
+        state = _archive_state
+    if state is not None and time.monotonic() - state[0] < ARCHIVE_STATE_TTL:
+        return state[1]
+    cursor.execute("SELECT year, state FROM archived_years")
+    years = {}
+    for row in cursor.fetchall():
+        year, value = (row['year'], row['state']) if isinstance(row, dict) else row
+        years[int(year)] = value
+    with _archive_lock:
+        _archive_state = (time.monotonic(), years)
+    return years
+
+def _check_writable(cursor, date):
+    """Raise ReadOnlyYearError if ``date`` falls in an archived (read-only) year."""
+    if date.year in _archived_years(cursor):
+        raise ReadOnlyYearError(f"Transactions in {date.year} are archived and read-only")
+
+def _check_not_archived(connection, transaction_id):
+    """Raise ReadOnlyYearError if a transaction was already moved to an archive partition.
+
+    Rolls back first, since SQLite attaches the archive files here.
+    """
+    connection.rollback()
+    cursor = connection.cursor()
+    try:
+        for year in sorted(_archived_years(cursor)):
+            archive = connection.backend.open_archive(connection, year)
+            cursor.execute(f"SELECT 1 FROM {archive} WHERE id = %s", (transaction_id,))
+            if cursor.fetchone() is not None:
+                raise ReadOnlyYearError(f"Transactions in {year} are archived and read-only")
+    finally:
+        cursor.close()
+
+def transactions_source(connection, start=None, end=None, archived=None):
+    """FROM target covering the transactions with start <= date < end.
+
+    Live years are in ``transactions``; archived years are read from their
+    own partition, so a month query touches exactly one of them. A range
+    that spans several is read as a UNION ALL aliased ``transactions``.
+    ``start``/``end`` may be None for an open range. Call before the first
+    statement of a transaction (SQLite attaches archive files here).
+    """
+    if archived is None:
+        cursor = connection.cursor()
+        try:
+            archived = _archived_years(cursor)
+        finally:
+            cursor.close()
+    years = sorted(
+        year for year in archived
+        if (start is None or datetime.date(year + 1, 1, 1) > start)
+        and (end is None or datetime.date(year, 1, 1) < end)
+    )
+    if not years:
+        return 'transactions'
+    sources = [connection.backend.open_archive(connection, year) for year in years]
+    if start is None or end is None or any(
+        archived.get(year) != 'archived'
+        for year in range(start.year, (end - datetime.timedelta(days=1)).year + 1)
+    ):
+        sources.insert(0, 'transactions')
+    if len(sources) == 1:
+        return sources[0]
+    union = ' UNION ALL '.join(f"SELECT {TRANSACTION_COLUMNS} FROM {source}" for source in sources)
+    return f"({union}) AS transactions"
+
+def apply_rollup_deltas(cursor, deltas):
+    """Add {(year, month, category): [amount, count]} deltas to the rollup table.
+
+    Runs on the caller's cursor so the rollup changes commit or roll back
+    together with the transaction rows they describe. Returns the budget
+    alerts the change triggers (see check_budgets), to be passed on to
+    invalidate_deltas() once committed.
+    """
+    if not deltas:
+        return []
+    query = cursor.backend.upsert_increment(
+        'monthly_category_totals', ['year', 'month', 'category'], ['total', 'count']
+    )
+    cursor.executemany(query, [(year, month, category, total, count)
+          for (year, month, category), (total, count) in deltas.items()])
+    return check_budgets(cursor, deltas)
+
+def invalidate_deltas(deltas, alerts=None):
+    """Evict cached results for every month a committed write touched.
+
+    Budget ``alerts`` from apply_rollup_deltas() are sent to the budget
+    listeners here, after the commit made them true.
+    """
+    query_cache.invalidate_months((year, month) for year, month, _ in deltas)
+    if alerts:
+        notify_budget_alerts(alerts)
+
+# Seconds a process trusts its copy of the budgets table (set_budget and
+# delete_budget refresh it at once in the process that calls them)
+BUDGET_CACHE_TTL = float(os.getenv('DB_BUDGET_CACHE_TTL', '30'))
+_budget_state = None
+_budget_lock = threading.Lock()
+_budget_listeners = []
+
+def forget_budgets():
+    """Drop the cached budgets so the next write re-reads them."""
+    global _budget_state
+    with _budget_lock:
+        _budget_state = None
+
+def _budgets(cursor):
+    """Return {category: (amount, warn_percent)}, re-read on ``cursor`` when stale."""
+    global _budget_state
+    with _budget_lock:
+        state = _budget_state
+    if state is not None and time.monotonic() - state[0] < BUDGET_CACHE_TTL:
+        return state[1]
+    cursor.execute("SELECT category, amount, warn_percent FROM budgets")
+    budgets = {}
+    for row in cursor.fetchall():
+        if isinstance(row, dict):
+            row = (row['category'], row['amount'], row['warn_percent'])
+        budgets[row[0]] = (decimal.Decimal(str(row[1])), int(row[2]))
+    with _budget_lock:
+        _budget_state = (time.monotonic(), budgets)
+    return budgets
+
+def check_budgets(cursor, deltas):
+    """Return the budget thresholds a write's rollup deltas cross.
+
+    Only categories with a budget are looked at. Their new month total is
+    one primary-key read of the rollup row just updated, and the old total
+    is that minus the delta, so nothing is re-aggregated. An alert is a
+    dict with year, month, category, total, budget, percent and level:
+    'warning' when the total reaches warn_percent of the budget, 'over'
+    when it goes past the budget. Each fires only on the write that
+    crosses the line upward.
+    """
+    budgets = _budgets(cursor)
+    if not budgets:
+        return []
+    alerts = []
+    for (year, month, category), (amount, count) in deltas.items():
+        budget = budgets.get(category)
+        if budget is None or amount <= 0:
+            continue
+        limit, warn_percent = budget
+        cursor.execute(
+            "SELECT total FROM monthly_category_totals WHERE year = %s AND month = %s AND category = %s",
+            (year, month, category)
+        )
+        row = cursor.fetchone()
+        total = decimal.Decimal(str(row['total'] if isinstance(row, dict) else row[0]))
+        before = total - amount
+        if before <= limit < total:
+            level = 'over'
+        elif before < limit * warn_percent / 100 <= total:
+            level = 'warning'
+        else:
+            continue
+        alerts.append({
+            'year': year, 'month': month, 'category': category, 'level': level,
+            'total': total, 'budget': limit,
+            'percent': float(total / limit * 100) if limit else 0.0,
+        })
+    return alerts
+
+def add_budget_listener(callback):
+    """Call ``callback(alerts)`` after each committed write that crosses a budget threshold.
+
+    Callbacks run on the thread that made the write.
+    """
+    _budget_listeners.append(callback)
+
+def remove_budget_listener(callback):
+    if callback in _budget_listeners:
+        _budget_listeners.remove(callback)
+
+def notify_budget_alerts(alerts):
+    """Hand alerts from check_budgets() to every budget listener."""
+    for callback in list(_budget_listeners):
+        try:
+            callback(alerts)
+        except Exception as e:
+            print(f"Error in budget listener: {e}")
+
+# Seconds a process trusts its compiled copy of category_rules (the rule
+# functions below refresh it at once in the process that calls them)
+RULES_CACHE_TTL = float(os.getenv('DB_RULES_CACHE_TTL', '30'))
+_rule_state = None
+_rule_lock = threading.Lock()
+
+def forget_rules():
+    """Drop the compiled rules so the next categorization re-reads them."""
+    global _rule_state
+    with _rule_lock:
+        _rule_state = None
+
+def _rule_set(cursor):
+    """Return the compiled RuleSet, re-read on ``cursor`` when stale."""
+    global _rule_state
+    with _rule_lock:
+        state = _rule_state
+    if state is not None and time.monotonic() - state[0] < RULES_CACHE_TTL:
+        return state[1]
+    cursor.execute(
+        "SELECT id, priority, kind, pattern, min_amount, max_amount, category FROM category_rules"
+    )
+    names = ('id', 'priority', 'kind', 'pattern', 'min_amount', 'max_amount', 'category')
+    rules = [row if isinstance(row, dict) else dict(zip(names, row)) for row in cursor.fetchall()]
+    rule_set = RuleSet(rules)
+    with _rule_lock:
+        _rule_state = (time.monotonic(), rule_set)
+    return rule_set
+
+def add_rollup_delta(deltas, date, category, amount, count):
+    """Accumulate one row's contribution into a deltas dict."""
+    entry = deltas.setdefault((date.year, date.month, category), [decimal.Decimal(0), 0])
+    # The UI hands in floats while stored rows come back as Decimal
+    entry[0] += decimal.Decimal(str(amount))
+    entry[1] += count
+
+def _insert_transaction(cursor, amount, category, date, description, deltas):
+    """Insert one transaction on the caller's cursor; return its id."""
+    _check_writable(cursor, date)
+    query = """
+        INSERT INTO transactions (amount, category, date, description)
+        VALUES (%s, %s, %s, %s)
+    """
+    cursor.execute(query, (amount, category, date, description))
+    add_rollup_delta(deltas, date, category, amount, 1)
+    return cursor.lastrowid
+
+def _update_transaction(cursor, transaction_id, amount, category, date, description, deltas):
+    """Update one transaction on the caller's cursor; False if it does not exist."""
+    _check_writable(cursor, date)
+    cursor.execute(
+        "SELECT amount, category, date FROM transactions WHERE id = %s FOR UPDATE",
+        (transaction_id,)
+    )
+    old = cursor.fetchone()
+    if old is None:
+        return False
+    # A row of a year being archived may already have been copied there
+    _check_writable(cursor, old[2])
+    query = """
+        UPDATE transactions
+        SET amount = %s, category = %s, date = %s, description = %s
+        WHERE id = %s
+    """
+    cursor.execute(query, (amount, category, date, description, transaction_id))
+    add_rollup_delta(deltas, old[2], old[1], -old[0], -1)
+    add_rollup_delta(deltas, date, category, amount, 1)
+    return True
+
+def _delete_transaction(cursor, transaction_id, deltas):
+    """Delete one transaction on the caller's cursor; False if it does not exist."""
+    cursor.execute(
+        "SELECT amount, category, date FROM transactions WHERE id = %s FOR UPDATE",
+        (transaction_id,)
+    )
+    old = cursor.fetchone()
+    if old is None:
+        return False
+    # A row of a year being archived may already have been copied there
+    _check_writable(cursor, old[2])
+    cursor.execute("DELETE FROM transactions WHERE id = %s", (transaction_id,))
+    add_rollup_delta(deltas, old[2], old[1], -old[0], -1)
+    return True
+
+def add_transaction(amount, category, date, description=None):
+    """Add a new transaction to the database."""
     connection = create_connection()
     if connection:
         try:
             cursor = connection.cursor()
-            
-            # Create transactions table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    amount DECIMAL(10, 2) NOT NULL,
-                    category VARCHAR(50) NOT NULL,
-                    date DATE NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
+            deltas = {}
+            transaction_id = _insert_transaction(cursor, amount, category, date, description, deltas)
+            alerts = apply_rollup_deltas(cursor, deltas)
             connection.commit()
+            invalidate_deltas(deltas, alerts)
+            return transaction_id
+        except Error as e:
+            print(f"Error adding transaction: {e}")
+            return None
+        finally:
             cursor.close()
             connection.close()
-        except Error as e:
-            print(f"Error creating tables: {e}")
 
-def add_transaction(amount, category, date, description=None):
-    """Add a new transaction to the database."""
+def add_transactions(rows):
+    """Add several transactions in one database transaction.
+
+    ``rows`` are dicts with amount, category, date and an optional
+    description. Returns the new ids in order, or None on error (then
+    none of the rows were stored). Raises StorageDataError, storing
+    nothing, if the database rejects a row's data, and ReadOnlyYearError if
+    a row falls in an archived year.
+    """
     connection = create_connection()
     if connection:
         try:
             cursor = connection.cursor()
-            query = """
-                INSERT INTO transactions (amount, category, date, description)
-                VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(query, (amount, category, date, description))
+            deltas = {}
+            ids = [
+                _insert_transaction(cursor, row['amount'], row['category'], row['date'],
+                                    row.get('description'), deltas)
+                for row in rows
+            ]
+            alerts = apply_rollup_deltas(cursor, deltas)
             connection.commit()
-            return cursor.lastrowid
+            invalidate_deltas(deltas, alerts)
+            return ids
+        except (ReadOnlyYearError, StorageDataError):
+            connection.rollback()
+            raise
         except Error as e:
-            print(f"Error adding transaction: {e}")
+            connection.rollback()
+            print(f"Error adding transactions: {e}")
             return None
         finally:
             cursor.close()
             connection.close()
+    return None
 
-def get_monthly_expenses(year, month):
-    """Get all transactions for a specific month and year."""
+def get_expenses_between(start, end, categories=None):
+    """Get transactions with start <= date < end, newest first.
+
+    Optionally restrict the result to the given list of categories.
+    """
+    key = ('between', start, end, tuple(categories or ()))
+    loader = lambda: _fetch_expenses_between(start, end, categories)
+    return cached_query(key, months_between(start, end), loader) or []
+
+def _fetch_expenses_between(start, end, categories):
     connection = create_connection()
     if connection:
         try:
+            source = transactions_source(connection, start, end)
             cursor = connection.cursor(dictionary=True)
-            query = """
-                SELECT * FROM transactions
-                WHERE YEAR(date) = %s AND MONTH(date) = %s
-                ORDER BY date DESC
+            query = f"SELECT * FROM {source} WHERE date >= %s AND date < %s"
+            params = [start, end]
+            if categories:
+                query += f" AND category IN ({', '.join(['%s'] * len(categories))})"
+                params.extend(categories)
+            query += " ORDER BY date DESC, id DESC"
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        except Error as e:
+            print(f"Error fetching expenses: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def get_expenses_columns(start, end, categories=None, chunk_size=5000):
+    """Like get_expenses_between, but as a columnar.ExpenseColumns block.
+
+    Rows are read with fetchmany and packed straight into typed arrays
+    (int64 ids and cents, int32 epoch days, dictionary-encoded categories),
+    which takes a fraction of the memory of one dict per row and lets
+    totals be summed with numpy. Returns None on error.
+    """
+    key = ('columns', start, end, tuple(categories or ()))
+    loader = lambda: _fetch_expenses_columns(start, end, categories, chunk_size)
+    return cached_query(key, months_between(start, end), loader)
+
+def _fetch_expenses_columns(start, end, categories, chunk_size):
+    from columnar import ExpenseColumns
+    connection = create_connection()
+    if connection:
+        try:
+            source = transactions_source(connection, start, end)
+            cursor = connection.cursor()
+            query = f"""
+                SELECT id, amount, category, date, description
+                FROM {source} WHERE date >= %s AND date < %s
             """
-            cursor.execute(query, (year, month))
+            params = [start, end]
+            if categories:
+                query += f" AND category IN ({', '.join(['%s'] * len(categories))})"
+                params.extend(categories)
+            query += " ORDER BY date DESC, id DESC"
+            cursor.execute(query, params)
+            chunks = iter(lambda: cursor.fetchmany(chunk_size), [])
+            return ExpenseColumns.from_chunks(chunks)
+        except Error as e:
+            print(f"Error fetching expenses: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def search_expenses(text, limit=50, offset=0):
+    """Full-text search over transaction descriptions in every month.
+
+    Every word of ``text`` must match, as a prefix ("amaz" finds "Amazon").
+    Results come best match first, newest first among equals, and are
+    paginated with ``limit``/``offset``. The search runs on the backend's
+    full-text index (MySQL FULLTEXT, SQLite FTS5) rather than a LIKE scan.
+    """
+    terms = re.findall(r'\w+', text)
+    if not terms:
+        return []
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            query, params = connection.backend.search_query(terms)
+            cursor.execute(query + " LIMIT %s OFFSET %s", params + [limit, offset])
             return cursor.fetchall()
         except Error as e:
-            print(f"Error fetching monthly expenses: {e}")
+            print(f"Error searching expenses: {e}")
             return []
         finally:
             cursor.close()
             connection.close()
+    return []
+
+def get_expense_stats(start, end, top=5):
+    """Count, mean, median, p90, max, daily burn and top merchants for start <= date < end.
+
+    Computed with numpy over the (cached) columnar block for the range, so
+    it costs no extra query when the range was loaded already. Returns
+    None on error.
+    """
+    columns = get_expenses_columns(start, end)
+    return columns.summary(start, end, top) if columns is not None else None
+
+def get_expenses_page(start, end, after=None, before=None, limit=200):
+    """Get one keyset-paginated page of transactions with start <= date < end.
+
+    Pages are ordered newest first by (date, id). Pass the (date, id) key of
+    the last row already seen as ``after`` to get the next page, or the key
+    of the first row seen as ``before`` to get the previous one.
+    """
+    key = ('page', start, end, after, before, limit)
+    loader = lambda: _fetch_expenses_page(start, end, after, before, limit)
+    return cached_query(key, months_between(start, end), loader) or []
+
+def _fetch_expenses_page(start, end, after, before, limit):
+    connection = create_connection()
+    if connection:
+        try:
+            source = transactions_source(connection, start, end)
+            cursor = connection.cursor(dictionary=True)
+            query = f"SELECT * FROM {source} WHERE date >= %s AND date < %s"
+            params = [start, end]
+            order = 'DESC'
+            if after:
+                query += " AND (date < %s OR (date = %s AND id < %s))"
+                params.extend([after[0], after[0], after[1]])
+            elif before:
+                query += " AND (date > %s OR (date = %s AND id > %s))"
+                params.extend([before[0], before[0], before[1]])
+                order = 'ASC'
+            query += f" ORDER BY date {order}, id {order} LIMIT %s"
+            params.append(limit)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            if before:
+                rows.reverse()
+            return rows
+        except Error as e:
+            print(f"Error fetching expenses page: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def get_expenses_summary(start, end):
+    """Get the row count and total amount for start <= date < end."""
+    loader = lambda: _fetch_expenses_summary(start, end)
+    return cached_query(('summary', start, end), months_between(start, end), loader)
+
+def _fetch_expenses_summary(start, end):
+    connection = create_connection()
+    if connection:
+        try:
+            source = transactions_source(connection, start, end)
+            cursor = connection.cursor(dictionary=True)
+            query = f"""
+                SELECT COUNT(*) as count, COALESCE(SUM(amount), 0) as total
+                FROM {source}
+                WHERE date >= %s AND date < %s
+            """
+            cursor.execute(query, (start, end))
+            summary = cursor.fetchone()
+            # COALESCE(SUM(amount), 0) can come back as a plain 0
+            summary['total'] = decimal.Decimal(summary['total'])
+            return summary
+        except Error as e:
+            print(f"Error fetching expenses summary: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def get_monthly_expenses(year, month):
+    """Get all transactions for a specific month and year."""
+    start, end = month_bounds(year, month)
+    return get_expenses_between(start, end)
 
 def get_expenses_by_category(year, month):
     """Get total expenses by category for a specific month and year."""
+    loader = lambda: _fetch_expenses_by_category(year, month)
+    return cached_query(('by_category', year, month), ((year, month),), loader) or []
+
+def _fetch_expenses_by_category(year, month):
     connection = create_connection()
     if connection:
         try:
             cursor = connection.cursor(dictionary=True)
+            # Read the maintained rollup: one row per category, no scan
             query = """
-                SELECT category, SUM(amount) as total
-                FROM transactions
-                WHERE YEAR(date) = %s AND MONTH(date) = %s
-                GROUP BY category
+                SELECT category, total
+                FROM monthly_category_totals
+                WHERE year = %s AND month = %s AND count > 0
             """
             cursor.execute(query, (year, month))
             return cursor.fetchall()
         except Error as e:
             print(f"Error fetching expenses by category: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def get_category_matrix(start_year, start_month, end_year, end_month):
+    """Get a (month x category) matrix of totals for an inclusive month span.
+
+    Returns a dict with ``months`` (list of (year, month) pairs),
+    ``categories`` (sorted list) and ``totals`` (float64 array of shape
+    (len(months), len(categories))), or None on error. The whole span is
+    read from the rollup table in one query.
+    """
+    months = months_between(
+        datetime.date(start_year, start_month, 1),
+        month_bounds(end_year, end_month)[1]
+    )
+    loader = lambda: _fetch_category_matrix(months)
+    return cached_query(('matrix', months[0], months[-1]), months, loader)
+
+def _fetch_category_matrix(months):
+    import numpy as np
+    (start_year, start_month), (end_year, end_month) = months[0], months[-1]
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            query = """
+                SELECT year, month, category, total
+                FROM monthly_category_totals
+                WHERE (year > %s OR (year = %s AND month >= %s))
+                  AND (year < %s OR (year = %s AND month <= %s))
+                  AND count > 0
+            """
+            cursor.execute(query, (start_year, start_year, start_month,
+                                   end_year, end_year, end_month))
+            rows = cursor.fetchall()
+        except Error as e:
+            print(f"Error fetching category matrix: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+        
+        if not rows:
+            return {'months': list(months), 'categories': [], 'totals': np.zeros((len(months), 0))}
+        years, month_numbers, categories, totals = zip(*rows)
+        row_index = (np.array(years) - start_year) * 12 + np.array(month_numbers) - start_month
+        labels, column_index = np.unique(np.array(categories), return_inverse=True)
+        matrix = np.zeros((len(months), len(labels)))
+        np.add.at(matrix, (row_index, column_index), np.array(totals, dtype=float))
+        return {'months': list(months), 'categories': labels.tolist(), 'totals': matrix}
+    return None
+
+def get_budgets():
+    """Get every budget as a dict with category, amount and warn_percent."""
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT category, amount, warn_percent FROM budgets ORDER BY category")
+            return cursor.fetchall()
+        except Error as e:
+            print(f"Error fetching budgets: {e}")
             return []
         finally:
             cursor.close()
             connection.close()
+    return []
+
+def set_budget(category, amount, warn_percent=80):
+    """Set a category's monthly budget and its warning threshold (percent of the budget).
+
+    Returns True on success.
+    """
+    amount = decimal.Decimal(str(amount)).quantize(decimal.Decimal('0.01'))
+    if amount <= 0:
+        raise ValueError("A budget must be positive")
+    if not 1 <= int(warn_percent) <= 100:
+        raise ValueError("The warning threshold must be between 1 and 100 percent")
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            cursor.execute("DELETE FROM budgets WHERE category = %s", (category,))
+            cursor.execute(
+                "INSERT INTO budgets (category, amount, warn_percent) VALUES (%s, %s, %s)",
+                (category, amount, int(warn_percent))
+            )
+            connection.commit()
+            forget_budgets()
+            return True
+        except Error as e:
+            connection.rollback()
+            print(f"Error setting budget: {e}")
+            return False
+        finally:
+            cursor.close()
+            connection.close()
+    return False
+
+def delete_budget(category):
+    """Remove a category's budget. Returns True on success."""
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            cursor.execute("DELETE FROM budgets WHERE category = %s", (category,))
+            connection.commit()
+            forget_budgets()
+            return True
+        except Error as e:
+            print(f"Error deleting budget: {e}")
+            return False
+        finally:
+            cursor.close()
+            connection.close()
+    return False
+
+def get_budget_status(year, month):
+    """Get each budget's use in one month, read from the maintained rollup totals.
+
+    Returns dicts with category, budget, warn_percent, spent and percent,
+    ordered by category, or None on error.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT b.category, b.amount AS budget, b.warn_percent, COALESCE(t.total, 0) AS spent
+                FROM budgets b
+                LEFT JOIN monthly_category_totals t
+                    ON t.category = b.category AND t.year = %s AND t.month = %s
+                ORDER BY b.category
+            """, (year, month))
+            rows = cursor.fetchall()
+            for row in rows:
+                row['spent'] = decimal.Decimal(str(row['spent'])).quantize(decimal.Decimal('0.01'))
+                row['percent'] = float(row['spent'] / row['budget'] * 100) if row['budget'] else 0.0
+            return rows
+        except Error as e:
+            print(f"Error fetching budget status: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def get_rules():
+    """Get every categorization rule in the order they are tried, or None on error."""
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT id, priority, kind, pattern, min_amount, max_amount, category
+                FROM category_rules ORDER BY priority, id
+            """)
+            return cursor.fetchall()
+        except Error as e:
+            print(f"Error fetching rules: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def add_rule(kind, pattern, category, min_amount=None, max_amount=None, priority=None):
+    """Add a categorization rule; return its id, or None on error.
+
+    ``kind`` is 'contains' (a case-insensitive substring) or 'regex'. The
+    amount bounds are inclusive and either may be None. Without a
+    ``priority`` the rule is tried after every existing one.
+    """
+    pattern = (pattern or '').strip() or None
+    min_amount, max_amount = validate_rule(kind, pattern, min_amount, max_amount)
+    if not category:
+        raise ValueError("A rule needs a category")
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            if priority is None:
+                cursor.execute("SELECT COALESCE(MAX(priority), 0) + 1 FROM category_rules")
+                priority = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO category_rules (priority, kind, pattern, min_amount, max_amount, category)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (int(priority), kind, pattern, min_amount, max_amount, category))
+            rule_id = cursor.lastrowid
+            connection.commit()
+            forget_rules()
+            return rule_id
+        except Error as e:
+            connection.rollback()
+            print(f"Error adding rule: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def delete_rule(rule_id):
+    """Remove a categorization rule. Returns True on success."""
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            cursor.execute("DELETE FROM category_rules WHERE id = %s", (rule_id,))
+            connection.commit()
+            forget_rules()
+            return True
+        except Error as e:
+            print(f"Error deleting rule: {e}")
+            return False
+        finally:
+            cursor.close()
+            connection.close()
+    return False
+
+def get_rule_set():
+    """Return the compiled rules; a connection is only used when the cached copy is stale.
+
+    Returns None on error.
+    """
+    with _rule_lock:
+        state = _rule_state
+    if state is not None and time.monotonic() - state[0] < RULES_CACHE_TTL:
+        return state[1]
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            return _rule_set(cursor)
+        except Error as e:
+            print(f"Error loading rules: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def suggest_category(description, amount=None):
+    """Category the rules give a new expense, or None when none matches."""
+    rule_set = get_rule_set()
+    if not rule_set:
+        return None
+    if amount is not None:
+        amount = decimal.Decimal(str(amount))
+    return rule_set.category_for(description, amount)
+
+def update_transaction(transaction_id, amount, category, date, description=None):
+    """Update an existing transaction. Returns True on success.
+
+    Raises ReadOnlyYearError if the row or its new date is in an archived year.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            deltas = {}
+            if not _update_transaction(cursor, transaction_id, amount, category, date, description, deltas):
+                _check_not_archived(connection, transaction_id)
+                return False
+            alerts = apply_rollup_deltas(cursor, deltas)
+            connection.commit()
+            invalidate_deltas(deltas, alerts)
+            return True
+        except ReadOnlyYearError:
+            connection.rollback()
+            raise
+        except Error as e:
+            print(f"Error updating transaction: {e}")
+            return False
+        finally:
+            cursor.close()
+            connection.close()
+    return False
+
+def delete_transaction(transaction_id):
+    """Delete a transaction by id. Returns True on success.
+
+    Raises ReadOnlyYearError if the row is in an archived year.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            deltas = {}
+            if not _delete_transaction(cursor, transaction_id, deltas):
+                _check_not_archived(connection, transaction_id)
+                return False
+            alerts = apply_rollup_deltas(cursor, deltas)
+            connection.commit()
+            invalidate_deltas(deltas, alerts)
+            return True
+        except ReadOnlyYearError:
+            connection.rollback()
+            raise
+        except Error as e:
+            print(f"Error deleting transaction: {e}")
+            return False
+        finally:
+            cursor.close()
+            connection.close()
+    return False
+
+# What apply_queued_writes raises for a bad entry, rather than for a busy or
+# unreachable database: replaying that entry again cannot succeed
+QUEUED_WRITE_DATA_ERRORS = (
+    ReadOnlyYearError, StorageDataError, ValueError, KeyError, decimal.InvalidOperation
+)
+
+def apply_queued_writes(entries):
+    """Apply writes from the offline journal in one transaction.
+
+    ``entries`` are journal dicts with a unique ``key``, an ``op`` of
+    'add', 'update' or 'delete' and the write's fields (amounts and dates
+    as strings). Keys are recorded in applied_writes in the same
+    transaction, so an entry replayed after a crash or a lost commit
+    acknowledgement is skipped instead of applied twice. Returns
+    {key: result}: the new id for adds, True/False for updates and deletes,
+    None for keys applied earlier. Raises DatabaseUnavailableError if no
+    connection can be opened and StorageError if a write fails, in which
+    case none of the entries were applied; errors caused by an entry itself
+    are those in QUEUED_WRITE_DATA_ERRORS.
+    """
+    # The app may have started offline, before the tables could be checked
+    create_tables()
+    try:
+        connection = get_pool().acquire()
+    except Error as e:
+        raise DatabaseUnavailableError(str(e)) from e
+    try:
+        cursor = connection.cursor()
+        keys = [entry['key'] for entry in entries]
+        cursor.execute(
+            f"SELECT write_key FROM applied_writes WHERE write_key IN ({', '.join(['%s'] * len(keys))})",
+            keys
+        )
+        seen = {key for (key,) in cursor.fetchall()}
+        results = {}
+        deltas = {}
+        for entry in entries:
+            if entry['key'] in seen:
+                results[entry['key']] = None
+                continue
+            op = entry['op']
+            if op == 'delete':
+                result = _delete_transaction(cursor, entry['id'], deltas)
+            elif op in ('add', 'update'):
+                amount = decimal.Decimal(entry['amount'])
+                date = datetime.date.fromisoformat(entry['date'])
+                if op == 'add':
+                    result = _insert_transaction(
+                        cursor, amount, entry['category'], date, entry.get('description'), deltas
+                    )
+                else:
+                    result = _update_transaction(
+                        cursor, entry['id'], amount, entry['category'], date, entry.get('description'), deltas
+                    )
+            else:
+                raise ValueError(f"Unknown queued write: {op}")
+            results[entry['key']] = result
+            seen.add(entry['key'])
+        new_keys = [(key,) for key in keys if results.get(key) is not None]
+        if new_keys:
+            cursor.executemany("INSERT INTO applied_writes (write_key) VALUES (%s)", new_keys)
+        alerts = apply_rollup_deltas(cursor, deltas)
+        connection.commit()
+        invalidate_deltas(deltas, alerts)
+        return results
+    except (Error, ValueError, KeyError, decimal.InvalidOperation):
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+def _chunks(items, size):
+    """Split a list into lists of at most ``size`` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _lock_transactions(cursor, ids, chunk_size):
+    """Read and lock complete rows for a list of ids, chunk by chunk."""
+    rows = []
+    for chunk in _chunks(list(ids), chunk_size):
+        cursor.execute(
+            "SELECT id, amount, category, date, description, created_at, import_hash "
+            f"FROM transactions WHERE id IN ({', '.join(['%s'] * len(chunk))}) FOR UPDATE",
+            chunk
+        )
+        rows.extend(cursor.fetchall())
+    return rows
+
+def update_transactions(ids, category=None, days=0, chunk_size=500):
+    """Recategorize and/or move the dates of many transactions at once.
+
+    ``category`` replaces every row's category and ``days`` shifts every
+    date by that many days. Each chunk of ``chunk_size`` ids is changed
+    with a single UPDATE ... WHERE id IN (...), and all chunks commit in one
+    transaction together with the rollups. Returns the rows as they were
+    before the change (for restore_transactions), or None on error.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            old_rows = _lock_transactions(cursor, ids, chunk_size)
+            assignments, params = [], []
+            if category:
+                assignments.append("category = %s")
+                params.append(category)
+            if days:
+                expression, param = cursor.backend.shift_date('date', days)
+                assignments.append(f"date = {expression}")
+                params.append(param)
+            if not assignments or not old_rows:
+                return []
+            for row in old_rows:
+                _check_writable(cursor, row['date'])
+                _check_writable(cursor, row['date'] + datetime.timedelta(days=days))
+            
+            for chunk in _chunks([row['id'] for row in old_rows], chunk_size):
+                cursor.execute(
+                    f"UPDATE transactions SET {', '.join(assignments)} "
+                    f"WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                    params + chunk
+                )
+            deltas = {}
+            for row in old_rows:
+                add_rollup_delta(deltas, row['date'], row['category'], -row['amount'], -1)
+                add_rollup_delta(deltas, row['date'] + datetime.timedelta(days=days),
+                                 category or row['category'], row['amount'], 1)
+            alerts = apply_rollup_deltas(cursor, deltas)
+            connection.commit()
+            invalidate_deltas(deltas, alerts)
+            return old_rows
+        except Error as e:
+            connection.rollback()
+            print(f"Error updating transactions: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def delete_transactions(ids, chunk_size=500):
+    """Delete many transactions in one transaction, ``chunk_size`` ids per statement.
+
+    Returns the deleted rows (for restore_transactions), or None on error.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            old_rows = _lock_transactions(cursor, ids, chunk_size)
+            for row in old_rows:
+                _check_writable(cursor, row['date'])
+            for chunk in _chunks([row['id'] for row in old_rows], chunk_size):
+                cursor.execute(
+                    f"DELETE FROM transactions WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                    chunk
+                )
+            deltas = {}
+            for row in old_rows:
+                add_rollup_delta(deltas, row['date'], row['category'], -row['amount'], -1)
+            alerts = apply_rollup_deltas(cursor, deltas)
+            connection.commit()
+            invalidate_deltas(deltas, alerts)
+            return old_rows
+        except Error as e:
+            connection.rollback()
+            print(f"Error deleting transactions: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def restore_transactions(rows, chunk_size=500):
+    """Put rows returned by update_transactions/delete_transactions back.
+
+    Rows that still exist are replaced and deleted ones are re-inserted
+    with their original ids, all in one transaction. Returns True on success.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=True)
+            for row in rows:
+                _check_writable(cursor, row['date'])
+            current = _lock_transactions(cursor, [row['id'] for row in rows], chunk_size)
+            for row in current:
+                _check_writable(cursor, row['date'])
+            for chunk in _chunks([row['id'] for row in current], chunk_size):
+                cursor.execute(
+                    f"DELETE FROM transactions WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                    chunk
+                )
+            cursor.executemany(
+                """
+                INSERT INTO transactions (id, amount, category, date, description, created_at, import_hash)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """,
+                [
+                    (row['id'], row['amount'], row['category'], row['date'],
+                     row['description'], row['created_at'], row['import_hash'])
+                    for row in rows
+                ]
+            )
+            deltas = {}
+            for row in current:
+                add_rollup_delta(deltas, row['date'], row['category'], -row['amount'], -1)
+            for row in rows:
+                add_rollup_delta(deltas, row['date'], row['category'], row['amount'], 1)
+            alerts = apply_rollup_deltas(cursor, deltas)
+            connection.commit()
+            invalidate_deltas(deltas, alerts)
+            return True
+        except Error as e:
+            connection.rollback()
+            print(f"Error restoring transactions: {e}")
+            return False
+        finally:
+            cursor.close()
+            connection.close()
+    return False
+
+# Category of imported rows the file doesn't categorize; rules may replace it
+DEFAULT_CATEGORY = 'Other'
+
+# Column names accepted (case-insensitively) in imported CSV files
+CSV_COLUMNS = {
+    'date': ('date', 'transaction date', 'posted date', 'posting date'),
+    'amount': ('amount', 'debit', 'value'),
+    'category': ('category',),
+    'description': ('description', 'memo', 'payee', 'name', 'details'),
+}
+
+def _parse_import_date(value, date_format=None):
+    value = value.strip()
+    formats = (date_format,) if date_format else ('%Y-%m-%d', '%m/%d/%Y', '%d.%m.%Y', '%Y%m%d')
+    for fmt in formats:
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value!r}")
+
+def _parse_import_amount(value):
+    cleaned = value.strip().replace('$', '').replace(',', '')
+    return decimal.Decimal(cleaned).quantize(decimal.Decimal('0.01'))
+
+def _import_row(amount, signed, **fields):
+    """Row dict for an imported amount; expenses are stored as positive amounts.
+
+    In a ``signed`` statement debits are negative, and positive rows are
+    credits (refunds, salary): they are flagged so the importer counts them
+    instead of storing them as expenses.
+    """
+    row = dict(fields, amount=abs(amount))
+    if signed and amount > 0:
+        row['credit'] = True
+    return row
+
+def _has_negative_amounts(path, column):
+    """True if a CSV column holds a negative amount, i.e. the file is a signed statement."""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        for record in csv.DictReader(handle):
+            if (record.get(column) or '').strip().startswith('-'):
+                return True
+    return False
+
+def _with_import_hashes(rows):
+    """Attach a content hash to each row so re-imports can skip it.
+
+    Identical rows within one file (two coffees on the same day) are told
+    apart by their occurrence number, so they are still imported once each.
+    """
+    seen = {}
+    for row in rows:
+        if row.get('import_hash'):
+            yield row
+            continue
+        key = hashlib.sha256(
+            f"{row['date']}|{row['amount']}|{row['category']}|{row['description'] or ''}".encode('utf-8')
+        ).digest()
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        row['import_hash'] = hashlib.sha256(key + str(occurrence).encode('ascii')).hexdigest()
+        yield row
+
+def iter_csv_transactions(path, default_category=DEFAULT_CATEGORY, date_format=None):
+    """Stream transactions from a CSV bank export, one dict per row.
+
+    A file with any negative amount is read as a bank statement (debits
+    negative, credits flagged); otherwise every row is an expense, as in
+    this app's own exports.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        reader = csv.DictReader(handle)
+        lookup = {name.strip().lower(): name for name in reader.fieldnames or []}
+        columns = {}
+        for field, aliases in CSV_COLUMNS.items():
+            columns[field] = next((lookup[a] for a in aliases if a in lookup), None)
+        if columns['date'] is None or columns['amount'] is None:
+            raise ValueError("CSV file needs at least a date and an amount column")
+        signed = _has_negative_amounts(path, columns['amount'])
+
+        def rows():
+            for record in reader:
+                amount = record.get(columns['amount']) or ''
+                if not amount.strip():
+                    continue
+                category = record.get(columns['category']) if columns['category'] else None
+                description = record.get(columns['description']) if columns['description'] else None
+                yield _import_row(
+                    _parse_import_amount(amount), signed,
+                    category=(category or '').strip() or default_category,
+                    date=_parse_import_date(record[columns['date']], date_format),
+                    description=(description or '').strip() or None,
+                )
+
+        yield from _with_import_hashes(rows())
+
+def iter_ofx_transactions(path, default_category=DEFAULT_CATEGORY):
+    """Stream transactions from an OFX (1.x SGML or 2.x XML) statement.
+
+    OFX amounts are signed: debits are negative, credits are flagged.
+    """
+    def rows():
+        record = None
+        with open(path, encoding='utf-8', errors='replace') as handle:
+            for line in handle:
+                # SGML OFX may put several tags on one line; split on tag starts
+                for chunk in line.replace('<', '\n<').splitlines():
+                    chunk = chunk.strip()
+                    if not chunk.startswith('<'):
+                        continue
+                    tag, _, value = chunk[1:].partition('>')
+                    tag = tag.upper()
+                    if tag == 'STMTTRN':
+                        record = {}
+                    elif tag == '/STMTTRN' and record is not None:
+                        if 'DTPOSTED' in record and 'TRNAMT' in record:
+                            description = record.get('NAME') or record.get('MEMO')
+                            row = _import_row(
+                                _parse_import_amount(record['TRNAMT']), True,
+                                category=default_category,
+                                date=_parse_import_date(record['DTPOSTED'][:8], '%Y%m%d'),
+                                description=description or None,
+                            )
+                            if record.get('FITID'):
+                                # The bank's own transaction id is a stable dedup key
+                                row['import_hash'] = hashlib.sha256(
+                                    f"ofx|{record['FITID']}".encode('utf-8')
+                                ).hexdigest()
+                            yield row
+                        record = None
+                    elif record is not None and not tag.startswith('/'):
+                        record[tag] = value.strip()
+
+    yield from _with_import_hashes(rows())
+
+def iter_import_file(path, **kwargs):
+    """Stream transactions from a CSV or OFX file, picked by extension."""
+    if path.lower().endswith(('.ofx', '.qfx')):
+        return iter_ofx_transactions(path, **kwargs)
+    return iter_csv_transactions(path, **kwargs)
+
+def _insert_import_batch(cursor, batch, touched=None, alerts=None):
+    """Insert the rows of one batch that are not stored yet; return how many.
+
+    Months written to are added to the ``touched`` dict for cache
+    invalidation, and budget alerts to the ``alerts`` list.
+    """
+    hashes = [row['import_hash'] for row in batch if row.get('import_hash')]
+    existing = set()
+    if hashes:
+        cursor.execute(
+            f"SELECT import_hash FROM transactions WHERE import_hash IN ({', '.join(['%s'] * len(hashes))})",
+            hashes
+        )
+        existing = {stored for (stored,) in cursor.fetchall()}
+    new_rows = []
+    deltas = {}
+    for row in batch:
+        _check_writable(cursor, row['date'])
+        key = row.get('import_hash')
+        if key:
+            if key in existing:
+                continue
+            existing.add(key)
+        new_rows.append((
+            row['amount'], row['category'], row['date'], row.get('description'), key
+        ))
+        add_rollup_delta(deltas, row['date'], row['category'], row['amount'], 1)
+    if new_rows:
+        cursor.executemany("""
+            INSERT INTO transactions (amount, category, date, description, import_hash)
+            VALUES (%s, %s, %s, %s, %s)
+        """, new_rows)
+        batch_alerts = apply_rollup_deltas(cursor, deltas)
+        if touched is not None:
+            touched.update(deltas)
+        if alerts is not None:
+            alerts.extend(batch_alerts)
+    return len(new_rows)
+
+def import_transactions(rows, batch_size=1000, progress=None, categorize=(DEFAULT_CATEGORY,)):
+    """Bulk-insert transactions from an iterable of row dicts.
+
+    Rows are written in multi-row batches inside a single transaction.
+    Rows whose import_hash is already stored are skipped, so re-running an
+    interrupted import never inserts a row twice. Rows flagged as credits
+    are counted but not stored. Each batch whose rows have a category in
+    ``categorize`` is run through the categorization rules first (None
+    keeps every category as given); the import hashes are computed before
+    that, so changed rules don't defeat the dedup. ``progress`` is called
+    as progress(processed, inserted) after every batch. Returns a dict with
+    processed/inserted/skipped (duplicates) and credits counts, or None if
+    the import failed.
+    """
+    connection = create_connection()
+    if connection:
+        processed = inserted = credits = 0
+        touched = {}
+        alerts = []
+        try:
+            cursor = connection.cursor()
+            rule_set = _rule_set(cursor) if categorize is not None else None
+            batch = []
+            for row in rows:
+                if row.get('credit'):
+                    credits += 1
+                    processed += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    if rule_set:
+                        rule_set.categorize(batch, categorize)
+                    inserted += _insert_import_batch(cursor, batch, touched, alerts)
+                    processed += len(batch)
+                    batch = []
+                    if progress:
+                        progress(processed, inserted)
+            if batch:
+                if rule_set:
+                    rule_set.categorize(batch, categorize)
+                inserted += _insert_import_batch(cursor, batch, touched, alerts)
+                processed += len(batch)
+                if progress:
+                    progress(processed, inserted)
+            connection.commit()
+            invalidate_deltas(touched, alerts)
+            return {
+                'processed': processed,
+                'inserted': inserted,
+                'skipped': processed - inserted - credits,
+                'credits': credits,
+            }
+        except (Error, ValueError, decimal.InvalidOperation) as e:
+            connection.rollback()
+            print(f"Error importing transactions: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def apply_rules(only=None, chunk_size=5000, progress=None):
+    """Recategorize stored transactions with the current rules.
+
+    ``only`` limits the pass to rows whose category is in it (e.g.
+    (DEFAULT_CATEGORY,)); None reconsiders every row. Rows are read in id
+    order ``chunk_size`` at a time and locked; each chunk's changes are one
+    UPDATE ... WHERE id IN (...) per new category, committed together with
+    the rollups, so the pass runs online and can be interrupted. Archived
+    years are read-only and left alone. ``progress(processed, changed)``
+    is called after every chunk. Returns a dict with processed/changed
+    counts, or None on error.
+    """
+    only = list(only) if only is not None else None
+    connection = create_connection()
+    if connection:
+        processed = changed = 0
+        try:
+            cursor = connection.cursor(dictionary=True)
+            rule_set = _rule_set(cursor)
+            archived = _archived_years(cursor)
+            connection.commit()
+            if not rule_set or only == []:
+                return {'processed': 0, 'changed': 0}
+            condition, params = "", []
+            if only is not None:
+                condition = f"AND category IN ({', '.join(['%s'] * len(only))}) "
+                params = only
+            last_id = 0
+            while True:
+                cursor.execute(
+                    "SELECT id, amount, category, date, description FROM transactions "
+                    f"WHERE id > %s {condition}ORDER BY id LIMIT %s FOR UPDATE",
+                    [last_id] + params + [chunk_size]
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                processed += len(rows)
+                rows = [row for row in rows if row['date'].year not in archived]
+                old_categories = [row['category'] for row in rows]
+                rule_set.categorize(rows)
+                by_category = {}
+                deltas = {}
+                for row, old_category in zip(rows, old_categories):
+                    if row['category'] != old_category:
+                        by_category.setdefault(row['category'], []).append(row['id'])
+                        add_rollup_delta(deltas, row['date'], old_category, -row['amount'], -1)
+                        add_rollup_delta(deltas, row['date'], row['category'], row['amount'], 1)
+                for category, ids in by_category.items():
+                    cursor.execute(
+                        f"UPDATE transactions SET category = %s WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                        [category] + ids
+                    )
+                    changed += len(ids)
+                alerts = apply_rollup_deltas(cursor, deltas)
+                connection.commit()
+                invalidate_deltas(deltas, alerts)
+                if progress:
+                    progress(processed, changed)
+            return {'processed': processed, 'changed': changed}
+        except Error as e:
+            connection.rollback()
+            print(f"Error applying rules: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+EXPORT_COLUMNS = ['id', 'date', 'category', 'amount', 'description']
+
+def parquet_available():
+    """True if pyarrow is installed, so exports can be written as Parquet."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+class _CSVExportWriter:
+    """Writes export chunks as CSV rows the CSV importer can read back."""
+
+    def __init__(self, path):
+        self._handle = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._handle)
+        self._writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self._writer.writerows(
+            (transaction_id, date.isoformat(), category, amount, description or '')
+            for transaction_id, date, category, amount, description in rows
+        )
+
+    def close(self):
+        self._handle.close()
+
+class _ParquetExportWriter:
+    """Writes every export chunk as one Parquet row group."""
+
+    def __init__(self, path):
+        import pyarrow
+        import pyarrow.parquet
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([
+            ('id', pyarrow.int64()),
+            ('date', pyarrow.date32()),
+            ('category', pyarrow.string()),
+            ('amount', pyarrow.decimal128(12, 2)),
+            ('description', pyarrow.string()),
+        ])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        arrays = [
+            self._pyarrow.array(column, type=field.type)
+            for column, field in zip(zip(*rows), self._schema)
+        ]
+        self._writer.write_table(self._pyarrow.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+def export_transactions(path, start=None, end=None, categories=None, chunk_size=5000,
+                        progress=None, cancel=None):
+    """Stream transactions with start <= date < end to a CSV or Parquet file.
+
+    The format follows the extension (.parquet/.pq, otherwise CSV). Rows
+    are read through an unbuffered cursor, so MySQL streams them from the
+    server, and written ``chunk_size`` at a time; memory stays flat however
+    large the range is. ``start``, ``end`` and ``categories`` are optional
+    filters. ``progress(written, total)`` is called after every chunk, and
+    setting the ``cancel`` threading.Event stops the export before the next
+    one. The file is written under a temporary name and only renamed into
+    place once complete. Returns {'rows', 'total', 'cancelled'}, or None if
+    the export failed.
+    """
+    parquet = path.lower().endswith(('.parquet', '.pq'))
+    if parquet and not parquet_available():
+        raise ValueError("Parquet export needs the pyarrow package")
+    
+    conditions, params = [], []
+    if start:
+        conditions.append("date >= %s")
+        params.append(start)
+    if end:
+        conditions.append("date < %s")
+        params.append(end)
+    if categories:
+        conditions.append(f"category IN ({', '.join(['%s'] * len(categories))})")
+        params.extend(categories)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    connection = create_connection()
+    if connection:
+        partial = path + '.part'
+        cursor = writer = None
+        written = 0
+        cancelled = finished = False
+        try:
+            source = transactions_source(connection, start, end)
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM {source}{where}", params)
+            total = cursor.fetchone()[0]
+            cursor.close()
+            
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(
+                f"SELECT id, date, category, amount, description FROM {source}{where} "
+                "ORDER BY date, id",
+                params
+            )
+            writer = _ParquetExportWriter(partial) if parquet else _CSVExportWriter(partial)
+            while True:
+                if cancel is not None and cancel.is_set():
+                    cancelled = True
+                    break
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    finished = True
+                    break
+                writer.write(rows)
+                written += len(rows)
+                if progress:
+                    progress(written, total)
+            writer.close()
+            writer = None
+            if not cancelled:
+                os.replace(partial, path)
+            return {'rows': written, 'total': total, 'cancelled': cancelled}
+        except (Error, OSError) as e:
+            print(f"Error exporting transactions: {e}")
+            return None
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+            if cursor is not None:
+                cursor.close()
+            if finished:
+                connection.close()
+            else:
+                # An abandoned MySQL stream would have to be read to the end
+                # before the connection could be reused
+                connection.discard()
+    return None
+
+def verify_category_totals(repair=False):
+    """Recompute the monthly category rollups from the transactions, archives included.
+
+    Returns a list of drifted (year, month, category) entries with their
+    expected and stored totals and counts, or None on error. With
+    ``repair=True`` the rollup table is rebuilt from scratch as well.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            source = transactions_source(connection)
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT YEAR(date) as year, MONTH(date) as month, category,
+                       SUM(amount) as total, COUNT(*) as count
+                FROM {source}
+                GROUP BY YEAR(date), MONTH(date), category
+            """)
+            expected = {(r['year'], r['month'], r['category']): r for r in cursor.fetchall()}
+            cursor.execute("SELECT year, month, category, total, count FROM monthly_category_totals")
+            stored = {(r['year'], r['month'], r['category']): r for r in cursor.fetchall()}
+            
+            drift = []
+            for key in sorted(set(expected) | set(stored)):
+                want = expected.get(key, {'total': 0, 'count': 0})
+                have = stored.get(key, {'total': 0, 'count': 0})
+                if want['total'] != have['total'] or want['count'] != have['count']:
+                    drift.append({
+                        'year': key[0], 'month': key[1], 'category': key[2],
+                        'expected_total': want['total'], 'stored_total': have['total'],
+                        'expected_count': want['count'], 'stored_count': have['count'],
+                    })
+            
+            if repair:
+                cursor.execute("DELETE FROM monthly_category_totals")
+                cursor.execute(ROLLUP_REBUILD_QUERY.format(source=source))
+                connection.commit()
+                query_cache.clear()
+            return drift
+        except Error as e:
+            print(f"Error verifying category totals: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+def _move_to_archive(connection, cursor, archive, start, end, chunk_size, progress, moved=0):
+    """Move live rows with start <= date < end into ``archive``, one committed chunk at a time."""
+    while True:
+        cursor.execute(
+            "SELECT id FROM transactions WHERE date >= %s AND date < %s ORDER BY id LIMIT %s",
+            (start, end, chunk_size)
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return moved
+        marks = ', '.join(['%s'] * len(ids))
+        cursor.execute(
+            f"INSERT INTO {archive} ({TRANSACTION_COLUMNS}) "
+            f"SELECT {TRANSACTION_COLUMNS} FROM transactions WHERE id IN ({marks})",
+            ids
+        )
+        cursor.execute(f"DELETE FROM transactions WHERE id IN ({marks})", ids)
+        connection.commit()
+        moved += len(ids)
+        if progress:
+            progress(moved)
+
+def archive_year(year, chunk_size=5000, progress=None):
+    """Move a past year's transactions into its compressed, read-only archive partition.
+
+    Runs online: rows move ``chunk_size`` at a time, each chunk copied and
+    deleted in one committed transaction, and reads of the year cover both
+    tables until the move is complete. The year is refused to writers from
+    the start. Once reads are switched to the archive, the move waits
+    ARCHIVE_STATE_TTL seconds for other processes to notice and then picks
+    up any row they wrote meanwhile. Totals don't change, so the rollups
+    are left alone. An interrupted run can simply be repeated.
+    ``progress(moved)`` is called after every chunk. Returns the number of
+    rows moved, or None on error.
+    """
+    if year >= datetime.date.today().year:
+        raise ValueError("Only past years can be archived")
+    start, end = datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+    connection = create_connection()
+    if connection:
+        cursor = None
+        try:
+            archive = connection.backend.create_archive(connection, year)
+            cursor = connection.cursor()
+            cursor.execute("SELECT state FROM archived_years WHERE year = %s", (year,))
+            row = cursor.fetchone()
+            state = row[0] if row else None
+            if state is None:
+                cursor.execute("INSERT INTO archived_years (year, state) VALUES (%s, 'archiving')", (year,))
+                connection.commit()
+                forget_archived_years()
+            
+            # Rows a crashed run copied without deleting them (SQLite commits
+            # the two files separately)
+            cursor.execute(
+                f"DELETE FROM transactions WHERE date >= %s AND date < %s "
+                f"AND id IN (SELECT id FROM {archive})",
+                (start, end)
+            )
+            connection.commit()
+            moved = _move_to_archive(connection, cursor, archive, start, end, chunk_size, progress)
+            
+            if state != 'archived':
+                cursor.execute("UPDATE archived_years SET state = 'archived' WHERE year = %s", (year,))
+                connection.commit()
+                forget_archived_years()
+                time.sleep(ARCHIVE_STATE_TTL)
+                moved = _move_to_archive(connection, cursor, archive, start, end, chunk_size, progress, moved)
+            
+            cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM {archive}")
+            count, total = cursor.fetchone()
+            cursor.execute(
+                "UPDATE archived_years SET row_count = %s, total = %s, archived_at = %s WHERE year = %s",
+                (count, total, datetime.datetime.now().replace(microsecond=0), year)
+            )
+            connection.commit()
+            cursor.close()
+            cursor = None
+            connection.backend.close_archive(connection, year)
+            return moved
+        except Error as e:
+            connection.rollback()
+            print(f"Error archiving {year}: {e}")
+            return None
+        finally:
+            if cursor is not None:
+                cursor.close()
+            connection.close()
+    return None
+
+def get_partitions():
+    """Return one entry per year with its state, row count and total, oldest first.
+
+    The state is 'live' (in the transactions table), 'archiving' or
+    'archived'. Returns None on error.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                SELECT YEAR(date), COUNT(*), COALESCE(SUM(amount), 0)
+                FROM transactions GROUP BY YEAR(date)
+            """)
+            years = {
+                int(year): {'year': int(year), 'state': 'live', 'rows': count, 'total': total}
+                for year, count, total in cursor.fetchall()
+            }
+            cursor.execute("SELECT year, state, row_count, total FROM archived_years")
+            for year, state, count, total in cursor.fetchall():
+                entry = years.setdefault(int(year), {'year': int(year), 'state': state, 'rows': 0, 'total': 0})
+                entry['state'] = state
+                if state == 'archived':
+                    entry['rows'], entry['total'] = count, total
+            return [years[year] for year in sorted(years)]
+        except Error as e:
+            print(f"Error listing partitions: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+    return None
+
+# Settings tables migrate_storage copies whole, with the columns to copy
+MIGRATED_TABLES = {
+    'budgets': ('category', 'amount', 'warn_percent'),
+    # Ids are kept: rules of equal priority apply in id order
+    'category_rules': ('id', 'priority', 'kind', 'pattern', 'min_amount', 'max_amount', 'category'),
+}
+
+def _copy_table(read, write, table, columns):
+    """Replace a small table's rows on the target with the source's."""
+    try:
+        read.execute(f"SELECT {', '.join(columns)} FROM {table}")
+        rows = read.fetchall()
+    except Error:
+        # A source database from before the table existed
+        rows = []
+    write.execute(f"DELETE FROM {table}")
+    if rows:
+        write.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+            rows
+        )
+
+def migrate_storage(source, target, batch_size=5000, progress=None):
+    """Copy every transaction and the settings tables from one storage backend to another.
+
+    Rows keep their ids and are copied in id order, one committed batch at
+    a time, so an interrupted migration can simply be re-run: rows already
+    present on the target are skipped. Archived years are read from their
+    partitions and land in the target's live table. The target's rollups
+    are rebuilt at the end, and the MIGRATED_TABLES (budgets and
+    categorization rules) replace the target's. Returns the number of transactions copied, or None on error.
+    """
+    source_connection = target_connection = None
+    try:
+        source_connection = source.connect()
+        target_connection = target.connect()
+        target.create_database()
+        read = source_connection.cursor()
+        write = target_connection.cursor()
+        target.create_schema(write)
+        _create_shared_tables(write)
+        target_connection.commit()
+        
+        try:
+            read.execute("SELECT year, state FROM archived_years")
+            archived = {int(year): state for year, state in read.fetchall()}
+        except Error:
+            # A source database from before archiving existed
+            archived = {}
+        rows_from = transactions_source(source_connection, archived=archived)
+        
+        write.execute("SELECT COALESCE(MAX(id), 0) FROM transactions")
+        last_id = write.fetchone()[0]
+        copied = 0
+        while True:
+            read.execute(f"""
+                SELECT id, amount, category, date, description, created_at, import_hash
+                FROM {rows_from} WHERE id > %s ORDER BY id LIMIT %s
+            """, (last_id, batch_size))
+            rows = read.fetchall()
+            if not rows:
+                break
+            write.executemany("""
+                INSERT INTO transactions
+                    (id, amount, category, date, description, created_at, import_hash)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+            target_connection.commit()
+            source_connection.rollback()
+            last_id = rows[-1][0]
+            copied += len(rows)
+            if progress:
+                progress(copied)
+        
+        write.execute("DELETE FROM monthly_category_totals")
+        write.execute(ROLLUP_REBUILD_QUERY.format(source='transactions'))
+        for table, columns in MIGRATED_TABLES.items():
+            _copy_table(read, write, table, columns)
+        target_connection.commit()
+        source_connection.rollback()
+        return copied
+    except Error as e:
+        print(f"Error migrating storage: {e}")
+        return None
+    finally:
+        for connection in (source_connection, target_connection):
+            if connection is not None:
+                connection.close()
@@ -0,0 +1,126 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger('expense_tracker.diagnostics')
+
+class Recorder:
+    """Collects timing spans (query, connection open, UI repaint...).
+
+    Recording is off unless enabled, and the hot paths only check the
+    ``enabled`` flag before taking timestamps, so the disabled cost is one
+    attribute lookup. Each span name keeps its most recent ``window``
+    durations for percentile estimates; spans slower than ``slow_ms`` are
+    kept as samples (with their SQL, if any) and logged as JSON lines.
+    With ``log_all`` every span is logged at DEBUG level as well.
+    """
+
+    def __init__(self, enabled=False, window=2048, slow_ms=100.0, max_samples=100, log_all=False):
+        self.enabled = enabled
+        self.window = window
+        self.slow_ms = slow_ms
+        self.log_all = log_all
+        self._durations = {}
+        self._counts = {}
+        self._slow = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, sql=None):
+        """Store one finished span."""
+        ms = seconds * 1000
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.window)
+            durations.append(ms)
+            self._counts[name] = self._counts.get(name, 0) + 1
+            if ms >= self.slow_ms:
+                sample = {
+                    'span': name,
+                    'ms': round(ms, 3),
+                    'sql': ' '.join(sql.split()) if sql else None,
+                    'thread': threading.current_thread().name,
+                    'at': time.strftime('%H:%M:%S'),
+                }
+                self._slow.append(sample)
+            else:
+                sample = None
+        if sample is not None:
+            logger.warning(json.dumps(sample))
+        elif self.log_all:
+            logger.debug(json.dumps({'span': name, 'ms': round(ms, 3), 'sql': ' '.join(sql.split()) if sql else None}))
+
+    @contextmanager
+    def span(self, name, sql=None):
+        """Time the body of a with-block as one span (no-op when disabled)."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, sql)
+
+    def summary(self):
+        """Return {span: {count, p50, p95, p99, max}} in milliseconds."""
+        with self._lock:
+            snapshot = {name: sorted(values) for name, values in self._durations.items()}
+            counts = dict(self._counts)
+        result = {}
+        for name, values in sorted(snapshot.items()):
+            if not values:
+                continue
+            last = len(values) - 1
+            result[name] = {
+                'count': counts[name],
+                'p50': values[round(last * 0.50)],
+                'p95': values[round(last * 0.95)],
+                'p99': values[round(last * 0.99)],
+                'max': values[-1],
+            }
+        return result
+
+    def slow_samples(self):
+        """Return the most recent slow spans, newest first."""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+            self._slow.clear()
+
+recorder = Recorder(
+    enabled=os.getenv('EXPENSE_TRACKER_DIAGNOSTICS', '').lower() in ('1', 'true', 'yes'),
+    slow_ms=float(os.getenv('EXPENSE_TRACKER_SLOW_MS', '100')),
+    log_all=bool(os.getenv('EXPENSE_TRACKER_DIAGNOSTICS_LOG'))
+)
+
+if recorder.log_all:
+    # Structured span log: one JSON object per line
+    _handler = logging.FileHandler(os.getenv('EXPENSE_TRACKER_DIAGNOSTICS_LOG'))
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.DEBUG)
+
+def timed(name):
+    """Decorator recording each call of the wrapped function as a span."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
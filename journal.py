@@ -0,0 +1,243 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+class WriteJournal:
+    """Append-only file of writes waiting to reach the database.
+
+    Every write is one JSON line with a unique idempotency ``key``. Appends
+    are group-committed: a background thread fsyncs whatever was written
+    during the last ``fsync_interval`` in one go, and append() returns once
+    its line is on disk. Replayed keys are recorded with ``done`` lines; the
+    file is truncated whenever nothing is left pending.
+    """
+
+    def __init__(self, path, fsync_interval=0.01):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._written = 0
+        self._synced = 0
+        self._closed = False
+        # Set exactly while entries are pending (changed under the lock)
+        self.has_pending = threading.Event()
+        valid_end = self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+        if not self._pending:
+            self._file.truncate(0)
+        else:
+            # Cut off a torn last line so the next append starts a line of its own
+            self._file.truncate(valid_end)
+            self.has_pending.set()
+        self._flusher = threading.Thread(target=self._flush_loop, name='journal-fsync', daemon=True)
+        self._flusher.start()
+
+    def _load(self):
+        """Rebuild the pending writes from an existing journal file.
+
+        Returns the byte offset just past the last complete line.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        valid_end = 0
+        with open(self.path, 'rb') as handle:
+            for line in handle:
+                if not line.endswith(b'\n'):
+                    # A torn last line from a crash mid-append; its append()
+                    # never returned
+                    break
+                valid_end += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if 'done' in record:
+                    for key in record['done']:
+                        self._pending.pop(key, None)
+                else:
+                    self._pending[record['key']] = record
+        return valid_end
+
+    def _write(self, record):
+        # Caller holds the lock
+        self._file.write(json.dumps(record) + '\n')
+        self._written += 1
+        self._changed.notify_all()
+        return self._written
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while self._synced == self._written and not self._closed:
+                    self._changed.wait()
+                if self._closed:
+                    return
+            # Let concurrent appends join this fsync
+            time.sleep(self.fsync_interval)
+            with self._lock:
+                if self._closed:
+                    return
+                self._file.flush()
+                target = self._written
+            os.fsync(self._file.fileno())
+            with self._lock:
+                self._synced = max(self._synced, target)
+                self._changed.notify_all()
+
+    def append(self, op, **fields):
+        """Durably queue one write; return its journal entry."""
+        entry = {'key': uuid.uuid4().hex, 'op': op, 'queued_at': time.time(), **fields}
+        with self._lock:
+            if self._closed:
+                raise ValueError("The write journal is closed")
+            sequence = self._write(entry)
+            self._pending[entry['key']] = entry
+            self.has_pending.set()
+            while self._synced < sequence and not self._closed:
+                self._changed.wait()
+        return entry
+
+    def pending(self, limit=None):
+        """Return up to ``limit`` pending entries, oldest first."""
+        with self._lock:
+            entries = list(self._pending.values())
+        return entries if limit is None else entries[:limit]
+
+    def mark_done(self, keys):
+        """Record entries as applied (or given up on) and drop them."""
+        with self._lock:
+            if self._closed:
+                return
+            for key in keys:
+                self._pending.pop(key, None)
+            if self._pending:
+                # Not fsynced: a lost done line only means a skipped replay
+                self._write({'done': list(keys)})
+            else:
+                self._file.flush()
+                self._file.truncate(0)
+                self.has_pending.clear()
+
+    def stats(self):
+        """Return the queue depth and the age of the oldest pending write."""
+        with self._lock:
+            depth = len(self._pending)
+            oldest = next(iter(self._pending.values()))['queued_at'] if depth else None
+        return {'depth': depth, 'lag': time.time() - oldest if oldest is not None else 0.0}
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._closed = True
+            self._changed.notify_all()
+        self._flusher.join()
+        self._file.close()
+
+class Replayer:
+    """Background thread draining a WriteJournal into the database.
+
+    ``apply_batch(entries)`` must apply a list of entries atomically and
+    return {key: result}. Failures are retried with exponential backoff
+    (with jitter) up to ``max_backoff`` seconds. ``permanent`` lists the
+    errors an entry itself causes (constraint or data errors): a batch
+    failing with one is retried one entry at a time, and an entry that keeps
+    failing on its own with one is rejected after ``max_attempts``. Any
+    other error (unreachable database, lock wait timeout, deadlock) is
+    retried until it clears. Callbacks run on the replayer thread.
+    """
+
+    def __init__(self, journal, apply_batch, batch_size=100, permanent=(), max_attempts=5,
+                 min_backoff=0.5, max_backoff=60.0, on_applied=None, on_rejected=None):
+        self.journal = journal
+        self.apply_batch = apply_batch
+        self.batch_size = batch_size
+        self.permanent = permanent
+        self.max_attempts = max_attempts
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.on_applied = on_applied
+        self.on_rejected = on_rejected
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._attempts = {}
+        self._stats = {'applied': 0, 'rejected': 0, 'failures': 0, 'last_error': None, 'retry_at': None}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='journal-replay', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.journal.has_pending.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        """Journal depth and lag plus replay counters."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(self.journal.stats())
+        return stats
+
+    def _run(self):
+        backoff = 0.0
+        isolate = False
+        while not self._stop.is_set():
+            self.journal.has_pending.wait()
+            if self._stop.is_set():
+                return
+            batch = self.journal.pending(1 if isolate else self.batch_size)
+            if not batch:
+                continue
+            try:
+                results = self.apply_batch(batch)
+            except Exception as e:
+                backoff = min(max(backoff * 2, self.min_backoff), self.max_backoff)
+                with self._lock:
+                    self._stats['failures'] += 1
+                    self._stats['last_error'] = str(e)
+                    self._stats['retry_at'] = time.time() + backoff
+                if isinstance(e, self.permanent):
+                    if len(batch) > 1:
+                        # Find the entry at fault by retrying one at a time
+                        isolate = True
+                    elif self._give_up(batch[0], e):
+                        backoff = 0.0
+                        continue
+                self._stop.wait(backoff * random.uniform(0.8, 1.2))
+                continue
+            backoff = 0.0
+            isolate = False
+            self.journal.mark_done([entry['key'] for entry in batch])
+            with self._lock:
+                self._stats['applied'] += len(batch)
+                self._stats['last_error'] = None
+                self._stats['retry_at'] = None
+                for entry in batch:
+                    self._attempts.pop(entry['key'], None)
+            if self.on_applied:
+                self.on_applied(batch, results)
+
+    def _give_up(self, entry, error):
+        """Count a failure of one isolated entry; reject it after max_attempts."""
+        with self._lock:
+            attempts = self._attempts[entry['key']] = self._attempts.get(entry['key'], 0) + 1
+            if attempts < self.max_attempts:
+                return False
+            self._attempts.pop(entry['key'], None)
+            self._stats['rejected'] += 1
+        self.journal.mark_done([entry['key']])
+        if self.on_rejected:
+            self.on_rejected(entry, error)
+        return True
@@ -0,0 +1,168 @@
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import database
+from benchmark import CATEGORIES, MERCHANTS
+from storage import SQLiteBackend
+
+# Share of each request type in the mixed workload
+WORKLOAD = [('insert', 0.5), ('list', 0.3), ('aggregate', 0.15), ('update', 0.05)]
+
+class Client:
+    """One keep-alive connection issuing requests from one thread."""
+
+    def __init__(self, host, port, rng):
+        self.connection = http.client.HTTPConnection(host, port, timeout=30)
+        self.rng = rng
+        self.ids = []
+
+    def request(self, method, path, body=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        try:
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            raise
+        return response.status, json.loads(data) if data else None
+
+    def random_row(self):
+        return {
+            'amount': str(round(self.rng.lognormvariate(3, 1), 2) or 0.01),
+            'category': self.rng.choice(CATEGORIES),
+            'date': (datetime.date.today() - datetime.timedelta(days=self.rng.randrange(365))).isoformat(),
+            'description': f"{self.rng.choice(MERCHANTS)} #{self.rng.randrange(10000)}",
+        }
+
+    def run(self, kind):
+        """Issue one request of the given kind; return True on a 2xx answer."""
+        today = datetime.date.today()
+        if kind == 'insert':
+            status, body = self.request('POST', '/transactions', self.random_row())
+            if status == 201:
+                self.ids.append(body['id'])
+        elif kind == 'list':
+            start = today - datetime.timedelta(days=self.rng.randrange(30, 365))
+            status, _ = self.request(
+                'GET', f"/transactions?start={start}&end={today + datetime.timedelta(days=1)}&limit=50"
+            )
+        elif kind == 'aggregate':
+            month = today - datetime.timedelta(days=self.rng.randrange(365))
+            status, _ = self.request('GET', f"/aggregates/categories?year={month.year}&month={month.month}")
+        elif self.ids:
+            status, _ = self.request('PUT', f"/transactions/{self.rng.choice(self.ids)}", self.random_row())
+        else:
+            return self.run('insert')
+        return 200 <= status < 300
+
+def worker(host, port, seed, deadline, results, lock):
+    rng = random.Random(seed)
+    kinds, weights = zip(*WORKLOAD)
+    client = Client(host, port, rng)
+    latencies = {kind: [] for kind in kinds}
+    errors = 0
+    while time.monotonic() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        started = time.perf_counter()
+        try:
+            ok = client.run(kind)
+        except (OSError, http.client.HTTPException):
+            ok = False
+            client = Client(host, port, rng)
+        latencies[kind].append((time.perf_counter() - started) * 1000)
+        errors += not ok
+    client.connection.close()
+    with lock:
+        for kind, values in latencies.items():
+            results['latencies'].setdefault(kind, []).extend(values)
+        results['errors'] += errors
+
+def percentiles(values):
+    values = sorted(values)
+    last = len(values) - 1
+    return {
+        'count': len(values),
+        'p50_ms': round(values[round(last * 0.50)], 3),
+        'p95_ms': round(values[round(last * 0.95)], 3),
+        'p99_ms': round(values[round(last * 0.99)], 3),
+        'max_ms': round(values[-1], 3),
+    }
+
+def start_local_server(workers):
+    """Serve a scratch SQLite database in this process; return (server, url)."""
+    import server
+    path = os.path.join(tempfile.mkdtemp(prefix='expense-loadtest-'), 'loadtest.db')
+    database.set_backend(SQLiteBackend(path))
+    database.create_tables()
+    api = server.APIServer(('127.0.0.1', 0), workers=workers)
+    threading.Thread(target=api.serve_forever, name='http-accept', daemon=True).start()
+    return api, f"http://127.0.0.1:{api.server_address[1]}"
+
+def main(argv=None):
+    """Drive the HTTP API with concurrent keep-alive clients and report latency."""
+    parser = argparse.ArgumentParser(description="Expense Tracker API load test")
+    parser.add_argument('--url', help="server to test (default: start one on a scratch SQLite database)")
+    parser.add_argument('--clients', type=int, default=50, help="concurrent client connections")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds to run")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    local = None
+    url = args.url
+    if url is None:
+        local, url = start_local_server(workers=max(args.clients * 2, 16))
+    parts = urlsplit(url)
+
+    results = {'latencies': {}, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, args=(parts.hostname, parts.port or 80, args.seed + i,
+                                              deadline, results, lock))
+        for i in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    every = [value for values in results['latencies'].values() for value in values]
+    report = {
+        'url': url,
+        'clients': args.clients,
+        'seconds': round(elapsed, 3),
+        'requests': len(every),
+        'errors': results['errors'],
+        'requests_per_second': round(len(every) / elapsed, 1),
+        'all': percentiles(every) if every else None,
+        'by_kind': {kind: percentiles(values) for kind, values in results['latencies'].items() if values},
+    }
+    if local is not None:
+        report['inserts'] = local.batcher.stats()
+        report['pool'] = database.get_pool_stats()
+        local.shutdown()
+        local.server_close()
+        database.close_pool()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+    return 1 if results['errors'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
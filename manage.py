@@ -0,0 +1,168 @@
+import argparse
+import sys
+from database import (
+    add_rule, apply_rules, archive_year, create_tables, delete_rule, get_partitions, get_rules,
+    migrate_storage, verify_category_totals
+)
+from storage import SQLiteBackend, backend_from_env
+
+def verify_rollups(args):
+    """Compare the monthly category rollups with the raw transactions."""
+    drift = verify_category_totals(repair=args.repair)
+    if drift is None:
+        return 1
+    for entry in drift:
+        print(
+            f"{entry['year']}-{entry['month']:02d} {entry['category']}: "
+            f"stored {entry['stored_total']} ({entry['stored_count']} rows), "
+            f"expected {entry['expected_total']} ({entry['expected_count']} rows)"
+        )
+    print(f"{len(drift)} drifted rollup entries" + (" repaired" if args.repair and drift else ""))
+    return 0 if args.repair or not drift else 2
+
+def build_backend(name, path):
+    """Backend for a migration endpoint; MySQL settings come from .env."""
+    if name == 'sqlite':
+        return SQLiteBackend(path)
+    return backend_from_env(name)
+
+def migrate(args):
+    """Copy all transactions between the MySQL and SQLite backends."""
+    source = build_backend(args.source, args.sqlite_path)
+    target = build_backend(args.target, args.sqlite_path)
+    copied = migrate_storage(
+        source, target,
+        batch_size=args.batch_size,
+        progress=lambda count: print(f"Copied {count} rows...", end='\r')
+    )
+    if copied is None:
+        return 1
+    print(f"Copied {copied} transactions from {args.source} to {args.target}")
+    return 0
+
+def list_partitions(args):
+    """Show each year's partition: live, archiving or archived."""
+    partitions = get_partitions()
+    if partitions is None:
+        return 1
+    for entry in partitions:
+        print(f"{entry['year']}  {entry['state']:<9}  {entry['rows']:>10} rows  {entry['total']:>14}")
+    return 0
+
+def archive(args):
+    """Move one past year into its compressed, read-only archive partition."""
+    try:
+        moved = archive_year(
+            args.year,
+            chunk_size=args.chunk_size,
+            progress=lambda count: print(f"Moved {count} rows...", end='\r')
+        )
+    except ValueError as e:
+        print(e)
+        return 1
+    if moved is None:
+        return 1
+    print(f"Archived {args.year}: moved {moved} transactions")
+    return 0
+
+def list_rules(args):
+    """Show the categorization rules in the order they are tried."""
+    rules = get_rules()
+    if rules is None:
+        return 1
+    for rule in rules:
+        low, high = rule['min_amount'], rule['max_amount']
+        amounts = '' if low is None and high is None else f"  amount {low or 0}..{high if high is not None else ''}"
+        pattern = f"{rule['kind']} {rule['pattern']!r}" if rule['pattern'] else 'any description'
+        print(f"#{rule['id']:<5} {rule['priority']:>5}  {pattern}{amounts}  -> {rule['category']}")
+    return 0
+
+def new_rule(args):
+    """Add a categorization rule."""
+    try:
+        rule_id = add_rule(args.kind, args.pattern, args.category, args.min_amount, args.max_amount,
+                           args.priority)
+    except ValueError as e:
+        print(e)
+        return 1
+    if rule_id is None:
+        return 1
+    print(f"Added rule #{rule_id}")
+    return 0
+
+def remove_rule(args):
+    """Remove a categorization rule by id."""
+    return 0 if delete_rule(args.id) else 1
+
+def recategorize(args):
+    """Run the current rules over the stored transactions."""
+    result = apply_rules(
+        only=args.only,
+        chunk_size=args.chunk_size,
+        progress=lambda processed, changed: print(f"Checked {processed} rows, {changed} changed...", end='\r')
+    )
+    if result is None:
+        return 1
+    print(f"Checked {result['processed']} transactions, recategorized {result['changed']}")
+    return 0
+
+def main(argv=None):
+    """Command-line maintenance tasks for the expense tracker database."""
+    parser = argparse.ArgumentParser(description="Expense Tracker maintenance commands")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    verify = subparsers.add_parser('verify-rollups', help="check monthly category totals for drift")
+    verify.set_defaults(func=verify_rollups, repair=False)
+    
+    rebuild = subparsers.add_parser('rebuild-rollups', help="recompute monthly category totals")
+    rebuild.set_defaults(func=verify_rollups, repair=True)
+    
+    migrate_parser = subparsers.add_parser('migrate-storage', help="copy data between backends")
+    migrate_parser.add_argument('--from', dest='source', choices=['mysql', 'sqlite'], required=True)
+    migrate_parser.add_argument('--to', dest='target', choices=['mysql', 'sqlite'], required=True)
+    migrate_parser.add_argument('--sqlite-path', default='expense_tracker.db')
+    migrate_parser.add_argument('--batch-size', type=int, default=5000)
+    migrate_parser.set_defaults(func=migrate, needs_tables=False)
+    
+    partitions = subparsers.add_parser('partitions', help="list yearly partitions and archives")
+    partitions.set_defaults(func=list_partitions)
+    
+    archive_parser = subparsers.add_parser('archive-year', help="move a past year into a read-only archive")
+    archive_parser.add_argument('year', type=int)
+    archive_parser.add_argument('--chunk-size', type=int, default=5000)
+    archive_parser.set_defaults(func=archive)
+    
+    rules = subparsers.add_parser('rules', help="list categorization rules")
+    rules.set_defaults(func=list_rules)
+    
+    add_rule_parser = subparsers.add_parser('add-rule', help="add a categorization rule")
+    add_rule_parser.add_argument('category')
+    add_rule_parser.add_argument('--contains', dest='pattern', help="substring of the description")
+    add_rule_parser.add_argument('--regex', help="regular expression searched in the description")
+    add_rule_parser.add_argument('--min-amount')
+    add_rule_parser.add_argument('--max-amount')
+    add_rule_parser.add_argument('--priority', type=int, help="lower runs first (default: after all others)")
+    add_rule_parser.set_defaults(func=new_rule)
+    
+    delete_rule_parser = subparsers.add_parser('delete-rule', help="remove a categorization rule")
+    delete_rule_parser.add_argument('id', type=int)
+    delete_rule_parser.set_defaults(func=remove_rule)
+    
+    apply_parser = subparsers.add_parser('apply-rules', help="recategorize stored transactions by the rules")
+    apply_parser.add_argument('--only', action='append', metavar='CATEGORY',
+                              help="only reconsider rows in this category (repeatable)")
+    apply_parser.add_argument('--chunk-size', type=int, default=5000)
+    apply_parser.set_defaults(func=recategorize)
+    
+    args = parser.parse_args(argv)
+    if args.command == 'add-rule':
+        if args.pattern is not None and args.regex is not None:
+            parser.error("use either --contains or --regex")
+        args.kind = 'regex' if args.regex is not None else 'contains'
+        args.pattern = args.regex if args.regex is not None else args.pattern
+    if getattr(args, 'needs_tables', True):
+        create_tables()
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import bisect
+import decimal
+import re
+
+# How a rule's pattern is matched against a description (case-insensitively)
+RULE_KINDS = ('contains', 'regex')
+
+# Merging renumbers capturing groups, so these could point at the wrong text
+_UNMERGEABLE = re.compile(r"\\[1-9]|\(\?P[<=]")
+
+def _alternative(index, pattern):
+    """Regex alternative for one regex rule, named after its index."""
+    return f"(?P<_r{index}>{pattern})"
+
+def _trie_pattern(words):
+    """One regex matching any of the lowercase ``words`` (index, word) pairs.
+
+    The words are factored into a trie, so the regex engine tests each
+    shared prefix once instead of once per word. Returns the pattern and
+    {group name: indexes}: each word end is an empty group, and a match
+    ending there means every word ending on the way matched too, so its
+    entry lists all their indexes in ascending order.
+    """
+    trie = {}
+    for index, word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node.setdefault('', []).append(index)
+    paths = {}
+
+    def build(node, above):
+        ending = above
+        if '' in node:
+            ending = sorted(above + node[''])
+        # Longer words first, so a match runs to the deepest word end
+        alternatives = [re.escape(char) + build(child, ending) for char, child in node.items() if char]
+        if '' in node:
+            name = f"_w{len(paths)}"
+            paths[name] = ending
+            alternatives.append(f"(?P<{name}>)")
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return '(?:' + '|'.join(alternatives) + ')'
+
+    return build(trie, []), paths
+
+def validate_rule(kind, pattern, min_amount=None, max_amount=None):
+    """Raise ValueError unless the rule can be compiled into a RuleSet.
+
+    Returns the amount bounds as Decimals (or None).
+    """
+    if kind not in RULE_KINDS:
+        raise ValueError(f"Unknown rule kind {kind!r}; use one of {', '.join(RULE_KINDS)}")
+    bounds = []
+    for value in (min_amount, max_amount):
+        if value is None or value == '':
+            bounds.append(None)
+            continue
+        try:
+            value = decimal.Decimal(str(value)).quantize(decimal.Decimal('0.01'))
+        except decimal.InvalidOperation:
+            raise ValueError(f"Invalid amount: {value!r}")
+        if not value.is_finite() or value < 0:
+            raise ValueError("Rule amounts must be zero or more")
+        bounds.append(value)
+    if not pattern and bounds == [None, None]:
+        raise ValueError("A rule needs a pattern, an amount range or both")
+    if bounds[0] is not None and bounds[1] is not None and bounds[0] > bounds[1]:
+        raise ValueError("The minimum amount is above the maximum")
+    if pattern and kind == 'regex':
+        if _UNMERGEABLE.search(pattern):
+            raise ValueError("Named groups and backreferences are not supported in rule patterns")
+        try:
+            re.compile(pattern, re.IGNORECASE)
+            # Inline flags that only work at the start of a pattern fail here
+            re.compile(f"x|{_alternative(0, pattern)}", re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+    return bounds[0], bounds[1]
+
+class RuleSet:
+    """Categorization rules compiled into one combined matcher.
+
+    ``rules`` are dicts with kind, pattern, min_amount, max_amount and
+    category (plus the priority and id they are ordered by). A rule
+    matches when its pattern occurs in the description and the amount
+    lies within [min_amount, max_amount]; either condition may be left
+    out. The first matching rule wins.
+
+    Substring patterns are merged into one regex over the lowercased
+    description, factored as a trie of the words (the job an Aho-Corasick
+    automaton would do, run inside the regex engine). Regex patterns are
+    merged into a second, case-insensitive one of alternatives in rule
+    order, so at any position it reports the first rule that matches
+    there. Both are swept left to right in one pass, keeping the best rule
+    seen. Amount ranges are resolved first: two bisections over the sorted
+    bounds name the amount's segment, which fixes the rules eligible for
+    it; regex rules are compiled once per distinct eligible set, on first
+    use.
+    """
+
+    def __init__(self, rules):
+        rules = sorted(rules, key=lambda rule: (rule.get('priority', 0), rule.get('id') or 0))
+        self.rules = rules
+        self.categories = [rule['category'] for rule in rules]
+        self._bounds = [
+            validate_rule(rule['kind'], rule['pattern'], rule.get('min_amount'), rule.get('max_amount'))
+            for rule in rules
+        ]
+        words = [
+            (index, rule['pattern'].lower())
+            for index, rule in enumerate(rules) if rule['pattern'] and rule['kind'] == 'contains'
+        ]
+        self._words = None
+        self._paths = {}
+        if words:
+            pattern, self._paths = _trie_pattern(words)
+            self._words = re.compile(pattern).search
+        self._lows = sorted(low for low, _ in self._bounds if low is not None)
+        self._highs = sorted(high for _, high in self._bounds if high is not None)
+        self._first_bounded = next(
+            (index for index, bounds in enumerate(self._bounds) if bounds != (None, None)), len(rules)
+        )
+        self._index_of = {f"_r{index}": index for index in range(len(rules))}
+        self._segments = {}
+        self._regexes = {}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def _eligible(self, index, amount):
+        low, high = self._bounds[index]
+        if low is None and high is None:
+            return True
+        return amount is not None and (low is None or amount >= low) and (high is None or amount <= high)
+
+    def _segment(self, amount):
+        """(first eligible pattern-less rule, regex search over the eligible regex rules) for an amount."""
+        if amount is None:
+            key = None
+        else:
+            key = (bisect.bisect_right(self._lows, amount), bisect.bisect_left(self._highs, amount))
+        segment = self._segments.get(key)
+        if segment is None:
+            anywhere = next(
+                (index for index, rule in enumerate(self.rules)
+                 if not rule['pattern'] and self._eligible(index, amount)),
+                None
+            )
+            # Only a rule ranked above the first pattern-less one can beat it
+            indexes = tuple(
+                index for index, rule in enumerate(self.rules[:anywhere])
+                if rule['pattern'] and rule['kind'] == 'regex' and self._eligible(index, amount)
+            )
+            if indexes not in self._regexes:
+                self._regexes[indexes] = re.compile('|'.join(
+                    _alternative(index, self.rules[index]['pattern']) for index in indexes
+                ), re.IGNORECASE).search if indexes else None
+            segment = self._segments[key] = (anywhere, self._regexes[indexes])
+        return segment
+
+    def match(self, description, amount=None):
+        """Index of the first rule matching a description and amount, or None.
+
+        With ``amount`` None, rules with an amount range never match.
+        """
+        best, regex = self._segment(amount)
+        text = description or ''
+        if self._words is not None:
+            lowered = text.lower()
+            position = 0
+            while best != 0:
+                found = self._words(lowered, position)
+                if found is None:
+                    break
+                for index in self._paths[found.lastgroup]:
+                    if best is not None and index >= best:
+                        break
+                    if self._eligible(index, amount):
+                        best = index
+                        break
+                position = found.start() + 1
+        if regex is not None:
+            position = 0
+            while best != 0:
+                found = regex(text, position)
+                if found is None:
+                    break
+                index = self._index_of[found.lastgroup]
+                if best is None or index < best:
+                    best = index
+                position = found.start() + 1
+        return best
+
+    def category_for(self, description, amount=None):
+        """Category of the first matching rule, or None."""
+        index = self.match(description, amount)
+        return None if index is None else self.categories[index]
+
+    def categorize(self, rows, only=None):
+        """Set the category of each matching row dict in place; return how many changed.
+
+        ``only`` limits the rows considered to those whose category is in
+        it (e.g. the importer's default category). Results are remembered
+        per description where the amount can't matter, which pays off on
+        bank exports full of repeated merchant names.
+        """
+        changed = 0
+        seen = {}
+        for row in rows:
+            if only is not None and row['category'] not in only:
+                continue
+            description = row.get('description') or ''
+            index = seen.get(description, -1)
+            if index == -1:
+                amount = row.get('amount')
+                if amount is not None and not isinstance(amount, decimal.Decimal):
+                    amount = decimal.Decimal(str(amount))
+                index = self.match(description, amount)
+                # The amount can't change the outcome unless an amount-bounded
+                # rule ranks above the winner
+                if self._first_bounded == len(self.rules) or (index is not None and index < self._first_bounded):
+                    seen[description] = index
+            if index is not None and row['category'] != self.categories[index]:
+                row['category'] = self.categories[index]
+                changed += 1
+        return changed
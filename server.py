@@ -0,0 +1,354 @@
+import argparse
+import datetime
+import decimal
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import database
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+class InsertBatcher:
+    """Coalesce single inserts from many request threads into group commits.
+
+    Requests queue their row and wait on a future. One writer thread takes
+    everything queued (up to ``max_batch`` rows, waiting at most
+    ``max_delay`` seconds for more) and stores it with one
+    database.add_transactions() call, so concurrent clients share commits.
+    If the database rejects a row, the batch is retried one row at a time so
+    only that row's request fails; if the database can't be reached, every
+    request of the batch fails at once.
+    """
+
+    def __init__(self, write_batch=database.add_transactions, max_batch=500, max_delay=0.002):
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._stats = {'batches': 0, 'rows': 0}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='insert-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        """Queue one row; the future resolves to its new id (None on failure).
+
+        Errors raised for the row alone (StorageDataError,
+        ReadOnlyYearError) are set on the future.
+        """
+        future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['average_batch'] = stats['rows'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self):
+        while True:
+            self._write(self._collect())
+
+    def _write(self, batch):
+        try:
+            ids = self.write_batch([row for row, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # A row was rejected and the batch rolled back as a whole;
+            # store the rows one at a time so only the bad one fails
+            for item in batch:
+                self._write([item])
+            return
+        if ids is None:
+            # No connection or a failed commit: row-by-row retries would
+            # only keep the writer from the next batch
+            for _, future in batch:
+                future.set_result(None)
+            return
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['rows'] += len(batch)
+        for (_, future), transaction_id in zip(batch, ids):
+            future.set_result(transaction_id)
+
+def to_json(value):
+    """json.dumps default for Decimal, dates and numpy values."""
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def parse_date(value, name):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a date as YYYY-MM-DD")
+
+def parse_month(value, name):
+    try:
+        year, month = value.split('-')
+        return int(year), int(month)
+    except (AttributeError, ValueError):
+        raise ValueError(f"'{name}' must be a month as YYYY-MM")
+
+def parse_transaction(body):
+    """Validate one transaction object from a request body."""
+    if not isinstance(body, dict):
+        raise ValueError("A transaction must be a JSON object")
+    try:
+        amount = decimal.Decimal(str(body.get('amount')))
+    except decimal.InvalidOperation:
+        raise ValueError("'amount' must be a number")
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError("'amount' must be positive")
+    category = body.get('category')
+    if not isinstance(category, str) or not category.strip() or len(category) > 50:
+        raise ValueError("'category' must be a non-empty string of at most 50 characters")
+    description = body.get('description')
+    if description is not None and not isinstance(description, str):
+        raise ValueError("'description' must be a string")
+    return {
+        'amount': amount.quantize(decimal.Decimal('0.01')),
+        'category': category.strip(),
+        'date': parse_date(body.get('date'), 'date'),
+        'description': description or None,
+    }
+
+class APIHandler(BaseHTTPRequestHandler):
+    """JSON API over the database.py functions.
+
+    GET    /health
+    GET    /transactions?start=&end=[&after=DATE,ID][&limit=]   keyset pages
+    GET    /transactions?q=words[&limit=][&offset=]             full-text search
+    POST   /transactions                  one object, or a list stored at once
+    PUT    /transactions/<id>
+    DELETE /transactions/<id>
+    GET    /aggregates/categories?year=&month=
+    GET    /aggregates/stats?start=&end=
+    GET    /aggregates/trend?start=YYYY-MM&end=YYYY-MM
+    """
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ExpenseTrackerAPI/1.0'
+    # Idle keep-alive connections give their worker thread back after this
+    timeout = 15
+    # Headers and body go out in separate writes; don't let Nagle hold the body
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split('/') if part]
+        try:
+            status, payload = self.route(method, parts, query)
+        except (ValueError, database.StorageDataError) as e:
+            status, payload = 400, {'error': str(e)}
+        except database.ReadOnlyYearError as e:
+            status, payload = 409, {'error': str(e)}
+        except Exception as e:
+            status, payload = 500, {'error': str(e)}
+        self.send_json(status, payload)
+
+    def route(self, method, parts, query):
+        if parts == ['health'] and method == 'GET':
+            return 200, {
+                'pool': database.get_pool_stats(),
+                'cache': database.get_cache_stats(),
+                'inserts': self.server.batcher.stats(),
+            }
+        if parts == ['transactions']:
+            if method == 'GET':
+                return self.list_transactions(query)
+            if method == 'POST':
+                return self.add_transactions(self.read_body())
+        if len(parts) == 2 and parts[0] == 'transactions' and parts[1].isdigit():
+            transaction_id = int(parts[1])
+            if method == 'PUT':
+                row = parse_transaction(self.read_body())
+                if database.update_transaction(transaction_id, row['amount'], row['category'],
+                                               row['date'], row['description']):
+                    return 200, dict(row, id=transaction_id)
+                return 404, {'error': f"No transaction {transaction_id}"}
+            if method == 'DELETE':
+                if database.delete_transaction(transaction_id):
+                    return 204, None
+                return 404, {'error': f"No transaction {transaction_id}"}
+        if len(parts) == 2 and parts[0] == 'aggregates' and method == 'GET':
+            return self.aggregate(parts[1], query)
+        return 404, {'error': f"No route for {method} {self.path}"}
+
+    def list_transactions(self, query):
+        limit = int(query.get('limit', 200))
+        if limit < 1:
+            raise ValueError("'limit' must be at least 1")
+        limit = min(limit, 1000)
+        if 'q' in query:
+            offset = int(query.get('offset', 0))
+            if offset < 0:
+                raise ValueError("'offset' must not be negative")
+            return 200, {'transactions': database.search_expenses(query['q'], limit, offset)}
+        start = parse_date(query.get('start'), 'start')
+        end = parse_date(query.get('end'), 'end')
+        after = None
+        if 'after' in query:
+            date, _, transaction_id = query['after'].partition(',')
+            after = (parse_date(date, 'after'), int(transaction_id))
+        rows = database.get_expenses_page(start, end, after=after, limit=limit)
+        next_key = f"{rows[-1]['date'].isoformat()},{rows[-1]['id']}" if len(rows) == limit else None
+        return 200, {'transactions': rows, 'next': next_key}
+
+    def add_transactions(self, body):
+        if isinstance(body, list):
+            # A client batch is already a batch: store it directly
+            rows = [parse_transaction(item) for item in body]
+            ids = database.add_transactions(rows) if rows else []
+            if ids is None:
+                return 503, {'error': "The transactions could not be stored"}
+            return 201, {'ids': ids}
+        row = parse_transaction(body)
+        transaction_id = self.server.batcher.submit(row).result()
+        if transaction_id is None:
+            return 503, {'error': "The transaction could not be stored"}
+        return 201, dict(row, id=transaction_id)
+
+    def aggregate(self, name, query):
+        if name == 'categories':
+            year, month = int(query.get('year', 0)), int(query.get('month', 0))
+            if not 1 <= month <= 12:
+                raise ValueError("'year' and 'month' are required")
+            return 200, {'categories': database.get_expenses_by_category(year, month)}
+        if name == 'stats':
+            start = parse_date(query.get('start'), 'start')
+            end = parse_date(query.get('end'), 'end')
+            stats = database.get_expense_stats(start, end, int(query.get('top', 5)))
+            if stats is None:
+                return 503, {'error': "Statistics are unavailable"}
+            stats['top'] = [
+                {'merchant': name, 'total': total, 'count': count} for name, total, count in stats['top']
+            ]
+            return 200, stats
+        if name == 'trend':
+            start = parse_month(query.get('start'), 'start')
+            end = parse_month(query.get('end'), 'end')
+            matrix = database.get_category_matrix(*start, *end)
+            if matrix is None:
+                return 503, {'error': "The trend is unavailable"}
+            return 200, matrix
+        return 404, {'error': f"No aggregate named {name}"}
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        try:
+            return json.loads(self.rfile.read(length) or b'null')
+        except ValueError:
+            raise ValueError("The request body must be JSON")
+
+    def send_json(self, status, payload):
+        body = b'' if payload is None else json.dumps(payload, default=to_json).encode('utf-8')
+        self.send_response(status)
+        if payload is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class APIServer(HTTPServer):
+    """HTTPServer that serves connections on a bounded pool of worker threads.
+
+    All workers share database.py's connection pool and one InsertBatcher.
+    """
+
+    request_queue_size = 1024
+    allow_reuse_address = True
+
+    def __init__(self, address, workers=256, verbose=False):
+        super().__init__(address, APIHandler)
+        self.verbose = verbose
+        self.batcher = InsertBatcher()
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http-worker')
+
+    def process_request(self, request, client_address):
+        self._workers.submit(self._serve, request, client_address)
+
+    def _serve(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._workers.shutdown(wait=False)
+
+def main(argv=None):
+    """Run the headless JSON API server."""
+    parser = argparse.ArgumentParser(description="Expense Tracker HTTP API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=256,
+                        help="request worker threads (size DB_POOL_SIZE to match the load)")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+
+    database.create_tables()
+    server = APIServer((args.host, args.port), workers=args.workers, verbose=args.verbose)
+    print(f"Serving the Expense Tracker API on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        database.close_pool()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
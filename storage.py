@@ -0,0 +1,656 @@
+import datetime
+import decimal
+import functools
+import os
+import sqlite3
+import time
+from urllib.request import pathname2url
+from diagnostics import recorder
+
+CENT = decimal.Decimal('0.01')
+
+class StorageError(Exception):
+    """Raised for any failure reported by the underlying database driver."""
+
+class StorageDataError(StorageError):
+    """Raised when the database rejects the data itself (a constraint or value
+    error), as opposed to a lock timeout or lost connection; running the same
+    write again cannot succeed."""
+
+def _storage_error(backend, error):
+    """Wrap a driver exception, keeping data errors distinguishable."""
+    kind = StorageDataError if isinstance(error, backend.data_errors) else StorageError
+    return kind(str(error))
+
+class Cursor:
+    """Driver cursor wrapper speaking the shared ``%s``-placeholder SQL dialect.
+
+    Rows come back as tuples, or as dicts keyed by column name when the
+    cursor was opened with ``dictionary=True``. Driver exceptions are
+    re-raised as StorageError.
+    """
+
+    def __init__(self, backend, cursor, dictionary=False):
+        self._backend = backend
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @property
+    def backend(self):
+        return self._backend
+
+    def execute(self, query, params=()):
+        started = time.perf_counter() if recorder.enabled else None
+        try:
+            self._backend.before_execute(self._cursor, query)
+            self._cursor.execute(self._backend.translate(query), tuple(params or ()))
+        except self._backend.native_errors as e:
+            raise _storage_error(self._backend, e) from e
+        finally:
+            if started is not None:
+                recorder.record('db.query', time.perf_counter() - started, query)
+
+    def executemany(self, query, seq_of_params):
+        started = time.perf_counter() if recorder.enabled else None
+        try:
+            self._cursor.executemany(self._backend.translate(query), seq_of_params)
+        except self._backend.native_errors as e:
+            raise _storage_error(self._backend, e) from e
+        finally:
+            if started is not None:
+                recorder.record('db.executemany', time.perf_counter() - started, query)
+
+    def _convert(self, rows):
+        rows = self._backend.convert_rows(rows)
+        if self._dictionary and rows:
+            names = [column[0] for column in self._cursor.description]
+            return [dict(zip(names, row)) for row in rows]
+        return rows
+
+    def _fetch(self, method, *args):
+        # Driver fetch plus type/dict conversion, timed as one span
+        started = time.perf_counter() if recorder.enabled else None
+        try:
+            return method(*args)
+        except self._backend.native_errors as e:
+            raise StorageError(str(e)) from e
+        finally:
+            if started is not None:
+                recorder.record('db.fetch', time.perf_counter() - started)
+
+    def fetchone(self):
+        row = self._fetch(self._cursor.fetchone)
+        return None if row is None else self._convert([row])[0]
+
+    def fetchmany(self, size):
+        return self._fetch(lambda: self._convert(self._cursor.fetchmany(size)))
+
+    def fetchall(self):
+        return self._fetch(lambda: self._convert(self._cursor.fetchall()))
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        try:
+            self._cursor.close()
+        except self._backend.native_errors:
+            pass
+
+class Connection:
+    """Driver connection wrapper with a uniform interface across backends."""
+
+    def __init__(self, backend, connection):
+        self.backend = backend
+        self._connection = connection
+        # Archive partitions opened on this connection: {year: writable}
+        self.archives = {}
+
+    def cursor(self, dictionary=False, **kwargs):
+        try:
+            return Cursor(self.backend, self.backend.native_cursor(self._connection, **kwargs), dictionary)
+        except self.backend.native_errors as e:
+            raise StorageError(str(e)) from e
+
+    def commit(self):
+        try:
+            self._connection.commit()
+        except self.backend.native_errors as e:
+            raise _storage_error(self.backend, e) from e
+
+    def rollback(self):
+        try:
+            self._connection.rollback()
+        except self.backend.native_errors as e:
+            raise StorageError(str(e)) from e
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def is_connected(self):
+        return self.backend.is_connected(self._connection)
+
+    def reconnect(self, attempts=1, delay=0):
+        try:
+            self._connection = self.backend.reconnect(self._connection, attempts, delay)
+            self.archives.clear()
+        except self.backend.native_errors as e:
+            raise StorageError(str(e)) from e
+
+    def close(self):
+        try:
+            self._connection.close()
+        except self.backend.native_errors as e:
+            raise StorageError(str(e)) from e
+
+# (index name, columns, unique). idx_transactions_date serves the month list
+# (the primary key is appended, so it is effectively (date, id)); the
+# composite index covers the per-category SUM without touching the table rows.
+TRANSACTION_INDEXES = [
+    ('idx_transactions_date', 'date', False),
+    ('idx_transactions_date_category', 'date, category, amount', False),
+    ('uq_transactions_import_hash', 'import_hash', True),
+]
+
+# Every transactions column, in table order; archive partitions have the same
+TRANSACTION_COLUMNS = 'id, amount, category, date, description, created_at, import_hash'
+
+class MySQLBackend:
+    """MySQL server storage through mysql-connector-python."""
+
+    name = 'mysql'
+
+    def __init__(self, host=None, user=None, password=None, database=None):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+
+    @property
+    def driver(self):
+        # Imported on first use so SQLite-only installs never load it
+        import mysql.connector
+        return mysql.connector
+
+    @property
+    def native_errors(self):
+        return (self.driver.Error,)
+
+    @property
+    def data_errors(self):
+        return (self.driver.IntegrityError, self.driver.DataError)
+
+    def connect(self):
+        try:
+            return Connection(self, self.driver.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database
+            ))
+        except self.native_errors as e:
+            raise StorageError(str(e)) from e
+
+    def native_cursor(self, connection, **kwargs):
+        return connection.cursor(**kwargs)
+
+    def before_execute(self, cursor, query):
+        """Nothing to do: SELECT ... FOR UPDATE locks the rows itself."""
+
+    def translate(self, query):
+        return query
+
+    def convert_rows(self, rows):
+        return rows
+
+    def is_connected(self, connection):
+        return connection.is_connected()
+
+    def reconnect(self, connection, attempts, delay):
+        connection.reconnect(attempts=attempts, delay=delay)
+        return connection
+
+    def upsert_increment(self, table, key_columns, value_columns):
+        """SQL inserting a row, or adding its values to an existing one."""
+        columns = key_columns + value_columns
+        updates = ', '.join(f"{c} = {c} + VALUES({c})" for c in value_columns)
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON DUPLICATE KEY UPDATE {updates}"
+        )
+
+    def create_database(self):
+        """Create the database if it doesn't exist."""
+        try:
+            connection = self.driver.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password
+            )
+            cursor = connection.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+            cursor.close()
+            connection.close()
+        except self.native_errors as e:
+            raise StorageError(str(e)) from e
+
+    def create_schema(self, cursor):
+        """Create or migrate the tables on a cursor of this backend."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                amount DECIMAL(10, 2) NOT NULL,
+                category VARCHAR(50) NOT NULL,
+                date DATE NOT NULL,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                import_hash CHAR(64) NULL
+            )
+        """)
+
+        # Migrations: dedup key for bulk imports and secondary indexes
+        # for the date-range query paths
+        self.ensure_column(cursor, 'transactions', 'import_hash', 'CHAR(64) NULL')
+        for name, columns, unique in TRANSACTION_INDEXES:
+            self.ensure_index(cursor, 'transactions', name, columns, unique)
+        self.ensure_index(cursor, 'transactions', 'ft_transactions_description', 'description',
+                          fulltext=True)
+
+        # Per-month, per-category running totals maintained by every write
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS monthly_category_totals (
+                year SMALLINT NOT NULL,
+                month TINYINT NOT NULL,
+                category VARCHAR(50) NOT NULL,
+                total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+                count INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (year, month, category)
+            )
+        """)
+
+        # Auto-categorization rules, applied in (priority, id) order
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS category_rules (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                priority INT NOT NULL DEFAULT 0,
+                kind VARCHAR(10) NOT NULL,
+                pattern VARCHAR(255) NULL,
+                min_amount DECIMAL(12, 2) NULL,
+                max_amount DECIMAL(12, 2) NULL,
+                category VARCHAR(50) NOT NULL
+            )
+        """)
+
+    def ensure_column(self, cursor, table, name, definition):
+        """Add a column to an existing table unless it is already there."""
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, name))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+    def ensure_index(self, cursor, table, name, columns, unique=False, fulltext=False):
+        """Add an index to an existing table unless it is already there."""
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, name))
+        if cursor.fetchone()[0] == 0:
+            if fulltext:
+                # InnoDB builds FULLTEXT indexes in place but needs to block writes
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({columns}), ALGORITHM=INPLACE, LOCK=SHARED"
+                )
+                return
+            kind = 'UNIQUE INDEX' if unique else 'INDEX'
+            # In-place DDL keeps the table readable and writable while it builds
+            cursor.execute(
+                f"ALTER TABLE {table} ADD {kind} {name} ({columns}), ALGORITHM=INPLACE, LOCK=NONE"
+            )
+
+    def shift_date(self, column, days):
+        """SQL expression (and its parameter) moving a DATE column by whole days."""
+        return f"DATE_ADD({column}, INTERVAL %s DAY)", days
+
+    def search_query(self, terms):
+        """SQL and params ranking transactions whose description has every term as a prefix."""
+        expression = ' '.join(f"+{term}*" for term in terms)
+        match = "MATCH(description) AGAINST (%s IN BOOLEAN MODE)"
+        return (
+            f"SELECT id, amount, category, date, description FROM transactions "
+            f"WHERE {match} ORDER BY {match} DESC, date DESC, id DESC",
+            [expression, expression]
+        )
+
+    def archive_table(self, year):
+        """Name of the table holding one archived year."""
+        return f"transactions_archive_{int(year)}"
+
+    def open_archive(self, connection, year, writable=False):
+        """Make a year's archive readable on a connection; return its table name."""
+        return self.archive_table(year)
+
+    def create_archive(self, connection, year):
+        """Create an empty archive partition for one year and open it for writing.
+
+        Archives are compressed InnoDB tables, so rows move into them in
+        the same transaction that deletes them from ``transactions``.
+        """
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.archive_table(year)} (
+                    id INT PRIMARY KEY,
+                    amount DECIMAL(10, 2) NOT NULL,
+                    category VARCHAR(50) NOT NULL,
+                    date DATE NOT NULL,
+                    description TEXT,
+                    created_at TIMESTAMP NULL,
+                    import_hash CHAR(64) NULL,
+                    INDEX idx_archive_date (date)
+                ) ENGINE=InnoDB ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8
+            """)
+        finally:
+            cursor.close()
+        return self.archive_table(year)
+
+    def close_archive(self, connection, year):
+        """Nothing to do: compressed pages are written as rows arrive."""
+
+def _convert_decimal(value):
+    return decimal.Decimal(value.decode('ascii')).quantize(CENT)
+
+sqlite3.register_adapter(decimal.Decimal, str)
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DATE', lambda value: datetime.date.fromisoformat(value.decode('ascii')))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.datetime.fromisoformat(value.decode('ascii')))
+sqlite3.register_converter('DECIMAL', _convert_decimal)
+
+@functools.lru_cache(maxsize=1024)
+def _sqlite_dialect(query):
+    # Memoized per query string; bounded, as callers build some queries dynamically
+    return query.replace('%s', '?').replace(' FOR UPDATE', '')
+
+class SQLiteBackend:
+    """Embedded single-file storage through the standard sqlite3 module.
+
+    Connections run in WAL mode so readers never block the writer, and
+    sqlite3's per-connection statement cache keeps every query prepared.
+    Amounts are stored as REAL and handed back as Decimal rounded to cents,
+    matching what the MySQL DECIMAL columns return.
+    """
+
+    name = 'sqlite'
+    native_errors = (sqlite3.Error,)
+    # "database is locked" is an OperationalError, so it stays retryable
+    data_errors = (sqlite3.IntegrityError, sqlite3.DataError)
+
+    def __init__(self, path='expense_tracker.db'):
+        self.path = path
+
+    def connect(self):
+        try:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=30,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                # Lets ATTACH open archive files read-only (file:...?mode=ro);
+                # plain paths are still plain paths
+                uri=True,
+                check_same_thread=False,
+                cached_statements=256
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            # Date helpers used by the shared rollup queries
+            connection.create_function('YEAR', 1, lambda d: int(d[:4]) if d else None, deterministic=True)
+            connection.create_function('MONTH', 1, lambda d: int(d[5:7]) if d else None, deterministic=True)
+            return Connection(self, connection)
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+
+    def native_cursor(self, connection, **kwargs):
+        # mysql-only options such as buffered= have no meaning here
+        return connection.cursor()
+
+    def before_execute(self, cursor, query):
+        """Take the database write lock before a locking read.
+
+        sqlite3 only opens a transaction before DML, so the rows read by a
+        SELECT ... FOR UPDATE could still change before the write that
+        follows. BEGIN IMMEDIATE makes the read and the write one
+        serialized transaction, waiting up to the busy timeout for it.
+        """
+        if ' FOR UPDATE' in query and not cursor.connection.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+
+    def translate(self, query):
+        """Rewrite shared SQL into SQLite's dialect."""
+        return _sqlite_dialect(query)
+
+    def convert_rows(self, rows):
+        # Aggregates over REAL columns come back as float; hand out cents
+        return [
+            tuple(decimal.Decimal(repr(v)).quantize(CENT) if type(v) is float else v for v in row)
+            for row in rows
+        ]
+
+    def is_connected(self, connection):
+        try:
+            connection.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reconnect(self, connection, attempts, delay):
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+        return self.connect()._connection
+
+    def upsert_increment(self, table, key_columns, value_columns):
+        """SQL inserting a row, or adding its values to an existing one."""
+        columns = key_columns + value_columns
+        updates = ', '.join(f"{c} = {c} + excluded.{c}" for c in value_columns)
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}"
+        )
+
+    def create_database(self):
+        """The database file is created by the first connection."""
+
+    def create_schema(self, cursor):
+        """Create or migrate the tables on a cursor of this backend."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                amount DECIMAL(10, 2) NOT NULL,
+                category VARCHAR(50) NOT NULL,
+                date DATE NOT NULL,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                import_hash CHAR(64) NULL
+            )
+        """)
+        for name, columns, unique in TRANSACTION_INDEXES:
+            kind = 'UNIQUE INDEX' if unique else 'INDEX'
+            cursor.execute(f"CREATE {kind} IF NOT EXISTS {name} ON transactions ({columns})")
+
+        # Per-month, per-category running totals maintained by every write
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS monthly_category_totals (
+                year SMALLINT NOT NULL,
+                month TINYINT NOT NULL,
+                category VARCHAR(50) NOT NULL,
+                total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+                count INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (year, month, category)
+            ) WITHOUT ROWID
+        """)
+
+        # Auto-categorization rules, applied in (priority, id) order
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS category_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                priority INT NOT NULL DEFAULT 0,
+                kind VARCHAR(10) NOT NULL,
+                pattern VARCHAR(255) NULL,
+                min_amount DECIMAL(12, 2) NULL,
+                max_amount DECIMAL(12, 2) NULL,
+                category VARCHAR(50) NOT NULL
+            )
+        """)
+
+        # FTS5 index over descriptions, kept in sync by triggers; the
+        # prefix indexes make "amaz*" style queries cheap
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'transactions_fts'")
+        fts_exists = cursor.fetchone()[0] > 0
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+                description, content='transactions', content_rowid='id', prefix='2 3 4'
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+                INSERT INTO transactions_fts (rowid, description) VALUES (new.id, new.description);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+                INSERT INTO transactions_fts (transactions_fts, rowid, description)
+                VALUES ('delete', old.id, old.description);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description ON transactions BEGIN
+                INSERT INTO transactions_fts (transactions_fts, rowid, description)
+                VALUES ('delete', old.id, old.description);
+                INSERT INTO transactions_fts (rowid, description) VALUES (new.id, new.description);
+            END
+        """)
+        if not fts_exists:
+            # Index the rows that were stored before the search table existed
+            cursor.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+    def shift_date(self, column, days):
+        """SQL expression (and its parameter) moving a DATE column by whole days."""
+        return f"date({column}, %s)", f"{days:+d} days"
+
+    def search_query(self, terms):
+        """SQL and params ranking transactions whose description has every term as a prefix."""
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        return (
+            "SELECT t.id, t.amount, t.category, t.date, t.description "
+            "FROM transactions_fts JOIN transactions t ON t.id = transactions_fts.rowid "
+            "WHERE transactions_fts MATCH %s "
+            "ORDER BY bm25(transactions_fts), t.date DESC, t.id DESC",
+            [expression]
+        )
+
+    def archive_path(self, year):
+        """File next to the main database holding one archived year."""
+        root, extension = os.path.splitext(self.path)
+        return f"{root}.{int(year)}{extension or '.db'}"
+
+    def archive_table(self, year):
+        return f"archive_{int(year)}.transactions"
+
+    def open_archive(self, connection, year, writable=False):
+        """Attach a year's archive file to a connection; return its table name.
+
+        Archives are attached read-only unless ``writable`` is set. ATTACH
+        cannot run inside a transaction, so call this before the first
+        statement of one.
+        """
+        year = int(year)
+        if connection.archives.get(year) not in (None, writable):
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"DETACH DATABASE archive_{year}")
+            finally:
+                cursor.close()
+            del connection.archives[year]
+        if year not in connection.archives:
+            uri = 'file:' + pathname2url(os.path.abspath(self.archive_path(year)))
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"ATTACH DATABASE %s AS archive_{year}",
+                               (uri if writable else uri + '?mode=ro',))
+            finally:
+                cursor.close()
+            connection.archives[year] = writable
+        return self.archive_table(year)
+
+    def create_archive(self, connection, year):
+        """Create an empty archive file for one year and attach it for writing."""
+        table = self.open_archive(connection, year, writable=True)
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY,
+                    amount DECIMAL(10, 2) NOT NULL,
+                    category VARCHAR(50) NOT NULL,
+                    date DATE NOT NULL,
+                    description TEXT,
+                    created_at TIMESTAMP,
+                    import_hash CHAR(64) NULL
+                )
+            """)
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS archive_{int(year)}.idx_archive_date "
+                           "ON transactions (date)")
+            connection.commit()
+        finally:
+            cursor.close()
+        return table
+
+    def close_archive(self, connection, year):
+        """Detach a finished archive and compact its file.
+
+        SQLite has no page compression, so VACUUM (dropping the free pages
+        left by the chunked copy) is as small as the file gets.
+        """
+        year = int(year)
+        if year in connection.archives:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"DETACH DATABASE archive_{year}")
+            finally:
+                cursor.close()
+            del connection.archives[year]
+        try:
+            archive = sqlite3.connect(self.archive_path(year))
+            archive.execute("VACUUM")
+            archive.close()
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+
+def backend_from_env(name=None):
+    """Build the storage backend selected by DB_BACKEND (default: mysql)."""
+    name = (name or os.getenv('DB_BACKEND') or 'mysql').lower()
+    if name == 'sqlite':
+        return SQLiteBackend(os.getenv('DB_PATH', 'expense_tracker.db'))
+    if name == 'mysql':
+        return MySQLBackend(
+            host=os.getenv('DB_HOST'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            database=os.getenv('DB_NAME')
+        )
+    raise ValueError(f"Unknown DB_BACKEND: {name}")
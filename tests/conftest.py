@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from storage import SQLiteBackend
+
+@pytest.fixture
+def db(tmp_path):
+    """The database module switched to a fresh SQLite file."""
+    database.set_backend(SQLiteBackend(str(tmp_path / 'expense_tracker.db')))
+    database.create_tables()
+    yield database
+    database.set_backend(None)
@@ -0,0 +1,20 @@
+import ast
+import os
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+def test_every_widget_command_is_a_method_of_the_app():
+    # Parsed rather than imported: building the app needs a display
+    with open(APP, encoding='utf-8') as handle:
+        tree = ast.parse(handle.read())
+    app = next(node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == 'ExpenseTrackerApp')
+    methods = {node.name for node in app.body if isinstance(node, ast.FunctionDef)}
+    commands = {
+        keyword.value.attr
+        for node in ast.walk(app) if isinstance(node, ast.Call)
+        for keyword in node.keywords
+        if keyword.arg == 'command' and isinstance(keyword.value, ast.Attribute)
+        and isinstance(keyword.value.value, ast.Name) and keyword.value.value.id == 'self'
+    }
+    assert commands
+    assert commands <= methods, sorted(commands - methods)
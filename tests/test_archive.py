@@ -0,0 +1,65 @@
+import datetime
+import decimal
+
+import pytest
+
+def by_category(db, year, month):
+    return {row['category']: row['total'] for row in db.get_expenses_by_category(year, month)}
+
+@pytest.fixture
+def archive_db(db, monkeypatch):
+    # Other processes don't exist here; don't wait for them
+    monkeypatch.setattr(db, 'ARCHIVE_STATE_TTL', 0)
+    return db
+
+def test_archived_year_stays_readable(archive_db):
+    db = archive_db
+    db.add_transaction(decimal.Decimal('5.00'), 'Food', datetime.date(2024, 3, 1), 'old')
+    db.add_transaction(decimal.Decimal('7.00'), 'Food', datetime.date(2024, 3, 9), 'old')
+    db.add_transaction(decimal.Decimal('1.00'), 'Food', datetime.date(2025, 3, 1), 'live')
+    assert db.archive_year(2024, chunk_size=1) == 2
+
+    assert len(db.get_monthly_expenses(2024, 3)) == 2
+    assert by_category(db, 2024, 3) == {'Food': decimal.Decimal('12.00')}
+    partitions = {entry['year']: entry for entry in db.get_partitions()}
+    assert partitions[2024]['state'] == 'archived' and partitions[2024]['rows'] == 2
+    assert partitions[2025]['state'] == 'live'
+    assert db.verify_category_totals() == []
+    # Repeating the run moves nothing
+    assert db.archive_year(2024) == 0
+
+def test_archived_rows_are_read_only(archive_db):
+    db = archive_db
+    old = db.add_transaction(decimal.Decimal('5.00'), 'Food', datetime.date(2024, 6, 1), 'old')
+    live = db.add_transaction(decimal.Decimal('3.00'), 'Food', datetime.date(2025, 6, 1), 'live')
+    db.archive_year(2024)
+
+    with pytest.raises(db.ReadOnlyYearError):
+        db.update_transaction(old, decimal.Decimal('6.00'), 'Food', datetime.date(2024, 6, 1))
+    with pytest.raises(db.ReadOnlyYearError):
+        db.delete_transaction(old)
+    with pytest.raises(db.ReadOnlyYearError):
+        db.update_transaction(live, decimal.Decimal('3.00'), 'Food', datetime.date(2024, 6, 2))
+    with pytest.raises(db.ReadOnlyYearError):
+        db.add_transactions([{'amount': decimal.Decimal('1.00'), 'category': 'Food', 'date': datetime.date(2024, 1, 1)}])
+    assert by_category(db, 2024, 6) == {'Food': decimal.Decimal('5.00')}
+    assert db.verify_category_totals() == []
+
+def test_rows_of_a_year_being_archived_are_closed_to_writes(archive_db):
+    db = archive_db
+    ids = [db.add_transaction(decimal.Decimal('2.00'), 'Food', datetime.date(2024, 1, day), 'old') for day in (1, 2)]
+    attempts = []
+
+    def write_during_move(moved):
+        # The first chunk moved one row; the other one is still live
+        if moved == 1:
+            with pytest.raises(db.ReadOnlyYearError):
+                db.update_transaction(ids[1], decimal.Decimal('9.00'), 'Food', datetime.date(2025, 1, 2))
+            # The batch operations report errors with None
+            assert db.delete_transactions([ids[1]]) is None
+            attempts.append(moved)
+
+    assert db.archive_year(2024, chunk_size=1, progress=write_during_move) == 2
+    assert attempts == [1]
+    assert by_category(db, 2024, 1) == {'Food': decimal.Decimal('4.00')}
+    assert db.verify_category_totals() == []
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from background import BackgroundExecutor
+
+class FakeRoot:
+    """Records after() callbacks instead of running a Tk main loop."""
+
+    def after(self, delay, callback):
+        return 'after'
+
+    def after_cancel(self, after_id):
+        pass
+
+@pytest.fixture
+def executor():
+    executor = BackgroundExecutor(FakeRoot(), max_workers=2)
+    yield executor
+    executor.shutdown()
+
+def drain(executor, until, timeout=2.0):
+    # Stand in for Tk's event loop: poll the result queue until done
+    deadline = time.monotonic() + timeout
+    while not until() and time.monotonic() < deadline:
+        executor._poll()
+        time.sleep(0.005)
+    assert until()
+
+def test_result_is_delivered_on_the_polling_thread(executor):
+    results = []
+    executor.submit(
+        lambda: threading.current_thread().name,
+        on_success=lambda worker: results.append((worker, threading.current_thread()))
+    )
+    drain(executor, lambda: results)
+    worker, delivered_on = results[0]
+    assert worker.startswith('db-worker')
+    assert delivered_on is threading.current_thread()
+    assert not executor.busy
+
+def test_errors_go_to_on_error(executor):
+    errors = []
+    executor.submit(lambda: 1 / 0, on_error=errors.append)
+    drain(executor, lambda: errors)
+    assert isinstance(errors[0], ZeroDivisionError)
+
+def test_newer_request_with_the_same_key_supersedes_the_older(executor):
+    release = threading.Event()
+    results = []
+    executor.submit(lambda: release.wait() and 'old', key='month', on_success=results.append)
+    executor.submit(lambda: 'new', key='month', on_success=results.append)
+    release.set()
+    drain(executor, lambda: not executor.busy)
+    time.sleep(0.05)
+    executor._poll()
+    assert results == ['new']
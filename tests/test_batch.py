@@ -0,0 +1,40 @@
+import datetime
+import decimal
+
+def by_category(db, year, month):
+    return {row['category']: row['total'] for row in db.get_expenses_by_category(year, month)}
+
+def _fill(db):
+    march = datetime.date(2026, 3, 30)
+    return [
+        db.add_transaction(decimal.Decimal(amount), category, march, 'batch')
+        for amount, category in [('10.00', 'Food'), ('5.00', 'Food'), ('7.00', 'Bills')]
+    ]
+
+def test_batch_update_and_undo_keep_rollups_exact(db):
+    ids = _fill(db)
+    # Small chunks so the UPDATE is split across statements
+    old_rows = db.update_transactions(ids[:2], category='Bills', days=3, chunk_size=1)
+    assert len(old_rows) == 2
+    assert by_category(db, 2026, 3) == {'Bills': decimal.Decimal('7.00')}
+    assert by_category(db, 2026, 4) == {'Bills': decimal.Decimal('15.00')}
+    assert db.verify_category_totals() == []
+
+    assert db.restore_transactions(old_rows)
+    assert by_category(db, 2026, 3) == {'Food': decimal.Decimal('15.00'), 'Bills': decimal.Decimal('7.00')}
+    assert by_category(db, 2026, 4) == {}
+    assert db.verify_category_totals() == []
+
+def test_batch_delete_and_undo(db):
+    ids = _fill(db)
+    deleted = db.delete_transactions(ids, chunk_size=2)
+    assert sorted(row['id'] for row in deleted) == sorted(ids)
+    assert by_category(db, 2026, 3) == {}
+    assert db.restore_transactions(deleted)
+    assert sorted(row['id'] for row in db.get_monthly_expenses(2026, 3)) == sorted(ids)
+    assert db.verify_category_totals() == []
+
+def test_update_without_changes_is_a_no_op(db):
+    ids = _fill(db)
+    assert db.update_transactions(ids) == []
+    assert db.verify_category_totals() == []
@@ -0,0 +1,24 @@
+import json
+
+import benchmark
+import database
+
+def test_synthetic_rows_are_reproducible():
+    first = list(benchmark.synthetic_rows(50, 12, seed=3))
+    assert first == list(benchmark.synthetic_rows(50, 12, seed=3))
+    assert len({row['import_hash'] for row in first}) == 50
+
+def test_small_sqlite_run_writes_a_report(tmp_path, capsys):
+    output = tmp_path / 'results.json'
+    try:
+        status = benchmark.main([
+            '--rows', '300', '--repeat', '1', '--skip-ui', '--rules', '20', '--rule-rows', '500',
+            '--workdir', str(tmp_path), '--output', str(output)
+        ])
+    finally:
+        database.set_backend(None)
+    assert status == 0
+    report = json.loads(output.read_text())
+    assert report['backend'] == 'sqlite'
+    assert list(report['results']) == ['300']
+    assert report['results']['300']['apply_rules']['rows'] == 300 + 5
@@ -0,0 +1,47 @@
+import datetime
+import decimal
+
+import database
+from storage import SQLiteBackend
+
+def test_alerts_fire_once_per_threshold(db):
+    alerts = []
+    db.add_budget_listener(alerts.extend)
+    try:
+        assert db.set_budget('Food', '100.00', warn_percent=80)
+        day = datetime.date(2026, 8, 3)
+        db.add_transaction(decimal.Decimal('50.00'), 'Food', day, 'groceries')
+        assert alerts == []
+        db.add_transaction(decimal.Decimal('35.00'), 'Food', day, 'groceries')
+        assert [alert['level'] for alert in alerts] == ['warning']
+        db.add_transaction(decimal.Decimal('5.00'), 'Food', day, 'snack')
+        assert len(alerts) == 1
+        db.add_transaction(decimal.Decimal('20.00'), 'Food', day, 'dinner')
+        assert [alert['level'] for alert in alerts] == ['warning', 'over']
+        # Other categories and other months have no budget line to cross
+        db.add_transaction(decimal.Decimal('500.00'), 'Bills', day, 'rent')
+        assert len(alerts) == 2
+    finally:
+        db.remove_budget_listener(alerts.extend)
+
+def test_budget_status_reads_the_rollups(db):
+    db.set_budget('Food', 200)
+    db.add_transaction(decimal.Decimal('50.00'), 'Food', datetime.date(2026, 8, 1), 'groceries')
+    [status] = db.get_budget_status(2026, 8)
+    assert status['category'] == 'Food'
+    assert status['spent'] == decimal.Decimal('50.00')
+    assert status['budget'] == decimal.Decimal('200.00')
+
+def test_migration_copies_budgets(db, tmp_path):
+    db.set_budget('Travel', '300.00', warn_percent=90)
+    db.add_transaction(decimal.Decimal('10.00'), 'Travel', datetime.date(2026, 8, 1), 'bus')
+    source = database.get_backend()
+    target = SQLiteBackend(str(tmp_path / 'copy.db'))
+    assert database.migrate_storage(source, target) == 1
+    # Re-running the migration doesn't duplicate anything
+    assert database.migrate_storage(source, target) == 0
+
+    database.set_backend(target)
+    database.create_tables()
+    assert database.get_budgets() == [{'category': 'Travel', 'amount': decimal.Decimal('300.00'), 'warn_percent': 90}]
+    assert database.verify_category_totals() == []
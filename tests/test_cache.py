@@ -0,0 +1,53 @@
+import pytest
+
+import database
+from database import QueryCache
+
+def test_invalidation_only_drops_entries_of_the_written_month():
+    cache = QueryCache()
+    cache.put('march', [1], [(2026, 3)], cache.snapshot([(2026, 3)]))
+    cache.put('spring', [2], [(2026, 3), (2026, 4)], cache.snapshot([(2026, 3), (2026, 4)]))
+    cache.put('april', [3], [(2026, 4)], cache.snapshot([(2026, 4)]))
+    cache.invalidate_months([(2026, 3)])
+    assert cache.get('march') == (False, None)
+    assert cache.get('spring') == (False, None)
+    assert cache.get('april') == (True, [3])
+
+def test_result_read_before_a_write_is_not_stored():
+    cache = QueryCache()
+    snapshot = cache.snapshot([(2026, 3)])
+    cache.invalidate_months([(2026, 3)])
+    cache.put('march', [1], [(2026, 3)], snapshot)
+    assert cache.get('march') == (False, None)
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = QueryCache()
+    for key in ('a', 'b'):
+        cache.put(key, [key], [(2026, 1)], cache.snapshot([(2026, 1)]))
+    cache.get('a')
+    cache.max_bytes = cache.stats()['bytes']
+    cache.put('c', ['c'], [(2026, 1)], cache.snapshot([(2026, 1)]))
+    assert cache.get('b') == (False, None)
+    assert cache.get('a')[0] and cache.get('c')[0]
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(database, 'query_cache', QueryCache())
+
+def test_cached_rows_cannot_be_changed_by_callers(fresh_cache):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return [{'id': 1, 'amount': 5}]
+
+    first = database.cached_query('rows', [(2026, 3)], loader)
+    first[0]['amount'] = 0
+    first.append({'id': 2})
+    assert database.cached_query('rows', [(2026, 3)], loader) == [{'id': 1, 'amount': 5}]
+    assert len(loads) == 1
+
+def test_errors_are_not_cached(fresh_cache):
+    results = iter([None, [1]])
+    assert database.cached_query('rows', [(2026, 3)], lambda: next(results)) is None
+    assert database.cached_query('rows', [(2026, 3)], lambda: next(results)) == [1]
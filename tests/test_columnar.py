@@ -0,0 +1,82 @@
+import datetime
+import decimal
+
+import numpy as np
+
+from columnar import ExpenseColumns
+
+ROWS = [
+    {'id': 1, 'amount': decimal.Decimal('12.10'), 'category': 'Food', 'date': datetime.date(2026, 1, 2), 'description': 'Lunch'},
+    {'id': 2, 'amount': decimal.Decimal('0.20'), 'category': 'Bills', 'date': datetime.date(2026, 1, 3), 'description': None},
+    {'id': 3, 'amount': decimal.Decimal('7.70'), 'category': 'Food', 'date': datetime.date(2026, 1, 4), 'description': 'Dinner'},
+]
+
+def test_rows_round_trip():
+    block = ExpenseColumns.from_rows(ROWS)
+    assert len(block) == 3
+    assert list(block.rows()) == ROWS
+
+def test_totals_are_exact_decimals():
+    block = ExpenseColumns.from_rows(ROWS)
+    assert block.total() == decimal.Decimal('20.00')
+    assert block.category_totals() == {'Food': decimal.Decimal('19.80'), 'Bills': decimal.Decimal('0.20')}
+
+def test_select_leaves_the_block_alone():
+    block = ExpenseColumns.from_rows(ROWS)
+    food = block.select(block.codes == block.categories.index('Food'))
+    assert [row['id'] for row in food.rows()] == [1, 3]
+    assert len(block) == 3
+    assert block.dates()[0] == np.datetime64('2026-01-02')
+
+def test_columns_from_the_database(db):
+    for row in ROWS:
+        db.add_transaction(row['amount'], row['category'], row['date'], row['description'])
+    block = db.get_expenses_columns(datetime.date(2026, 1, 1), datetime.date(2026, 2, 1))
+    assert block.total() == decimal.Decimal('20.00')
+    assert sorted(row['description'] or '' for row in block.rows()) == ['', 'Dinner', 'Lunch']
+
+def test_merchant_name_stops_at_reference_codes():
+    from columnar import merchant_name
+    assert merchant_name('Amazon #1b') == 'Amazon'
+    assert merchant_name('AMAZON 2231 SEATTLE') == 'Amazon'
+    assert merchant_name('Uber trip') == 'Uber Trip'
+    assert merchant_name('') == '(No description)'
+
+def test_summary_statistics():
+    block = ExpenseColumns.from_rows(ROWS + [dict(ROWS[0], id=4, description='Lunch #2')])
+    stats = block.summary(datetime.date(2026, 1, 1), datetime.date(2026, 1, 11))
+    assert stats['count'] == 4
+    assert stats['total'] == decimal.Decimal('32.10')
+    assert stats['max'] == decimal.Decimal('12.10')
+    assert stats['daily_burn'] == decimal.Decimal('3.21')
+    assert stats['top'][0] == ('Lunch', decimal.Decimal('24.20'), 2)
+
+def test_patched_returns_a_new_block():
+    block = ExpenseColumns.from_rows(ROWS)
+    new = {'id': 9, 'amount': decimal.Decimal('1.00'), 'category': 'Travel', 'date': datetime.date(2026, 1, 5), 'description': 'Bus'}
+    patched = block.patched(old=ROWS[1], new=new)
+    assert sorted(row['id'] for row in patched.rows()) == [1, 3, 9]
+    assert patched.category_totals()['Travel'] == decimal.Decimal('1.00')
+    assert list(block.rows()) == ROWS
+
+def test_expense_stats_from_the_database(db):
+    for row in ROWS:
+        db.add_transaction(row['amount'], row['category'], row['date'], row['description'])
+    stats = db.get_expense_stats(datetime.date(2026, 1, 1), datetime.date(2026, 2, 1))
+    assert stats['count'] == 3
+    assert stats['total'] == decimal.Decimal('20.00')
+
+def test_order_by_breaks_ties_by_id():
+    block = ExpenseColumns.from_rows(ROWS + [dict(ROWS[1], id=4, amount=decimal.Decimal('12.10'), category='bills')])
+    assert [int(block.ids[i]) for i in block.order_by('amount')] == [2, 3, 1, 4]
+    assert [int(block.ids[i]) for i in block.order_by('amount', descending=True)] == [4, 1, 3, 2]
+    # Category names sort ignoring case
+    assert [block.row(i)['category'] for i in block.order_by('category')] == ['Bills', 'bills', 'Food', 'Food']
+    assert [int(block.ids[i]) for i in block.order_by('description')] == [2, 4, 3, 1]
+
+def test_matching_filters_in_memory():
+    block = ExpenseColumns.from_rows(ROWS)
+    assert block.matching(categories={'Food'}).tolist() == [True, False, True]
+    assert block.matching(min_amount='0.20', max_amount=10).tolist() == [False, True, True]
+    assert block.matching(text='DIN').tolist() == [False, False, True]
+    assert block.position(3) == 2 and block.position(99) is None
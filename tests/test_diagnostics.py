@@ -0,0 +1,25 @@
+from diagnostics import Recorder
+
+def test_percentiles_and_slow_samples():
+    recorder = Recorder(enabled=True, slow_ms=50)
+    for ms in range(1, 101):
+        recorder.record('db.query', ms / 1000, "SELECT  *\n FROM t")
+    summary = recorder.summary()['db.query']
+    assert summary['count'] == 100
+    assert summary['p50'] == 51 and summary['max'] == 100
+    slow = recorder.slow_samples()
+    assert len(slow) == 51 and slow[0]['ms'] == 100
+    assert slow[0]['sql'] == "SELECT * FROM t"
+
+def test_disabled_span_records_nothing():
+    recorder = Recorder(enabled=False)
+    with recorder.span('ui.fill'):
+        pass
+    assert recorder.summary() == {}
+
+def test_window_keeps_the_latest_durations():
+    recorder = Recorder(enabled=True, window=3, slow_ms=1e9)
+    for ms in (500, 1, 2, 3):
+        recorder.record('x', ms / 1000)
+    assert recorder.summary()['x']['max'] == 3
+    assert recorder.summary()['x']['count'] == 4
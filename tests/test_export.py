@@ -0,0 +1,40 @@
+import csv
+import datetime
+import decimal
+import threading
+
+def _fill(db, count):
+    day = datetime.date(2026, 3, 1)
+    for i in range(count):
+        db.add_transaction(decimal.Decimal('1.25'), 'Food' if i % 2 else 'Bills', day + datetime.timedelta(days=i % 28), f"row {i}")
+
+def test_csv_export_streams_every_row(db, tmp_path):
+    _fill(db, 25)
+    path = str(tmp_path / 'out.csv')
+    seen = []
+    result = db.export_transactions(path, chunk_size=10, progress=lambda written, total: seen.append((written, total)))
+    assert result == {'rows': 25, 'total': 25, 'cancelled': False}
+    assert seen == [(10, 25), (20, 25), (25, 25)]
+    with open(path, newline='') as handle:
+        rows = list(csv.DictReader(handle))
+    assert len(rows) == 25
+    assert [row['date'] for row in rows] == sorted(row['date'] for row in rows)
+    assert sum(decimal.Decimal(row['amount']) for row in rows) == decimal.Decimal('31.25')
+
+def test_export_filters_by_category(db, tmp_path):
+    _fill(db, 10)
+    path = str(tmp_path / 'food.csv')
+    result = db.export_transactions(path, categories=['Food'])
+    assert result['rows'] == 5
+    with open(path, newline='') as handle:
+        assert {row['category'] for row in csv.DictReader(handle)} == {'Food'}
+
+def test_cancelled_export_leaves_no_file(db, tmp_path):
+    _fill(db, 30)
+    path = tmp_path / 'cancelled.csv'
+    cancel = threading.Event()
+    result = db.export_transactions(str(path), chunk_size=10, progress=lambda *_: cancel.set(), cancel=cancel)
+    assert result == {'rows': 10, 'total': 30, 'cancelled': True}
+    assert list(tmp_path.glob('cancelled.csv*')) == []
+    # The abandoned connection was dropped, not pooled; the database still works
+    assert db.get_expenses_summary(datetime.date(2026, 3, 1), datetime.date(2026, 4, 1))['count'] == 30
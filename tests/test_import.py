@@ -0,0 +1,53 @@
+import datetime
+import decimal
+
+from database import iter_csv_transactions, iter_import_file, iter_ofx_transactions
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+def test_signed_statement_flags_credits_instead_of_flipping_them(tmp_path):
+    path = write(tmp_path, 'bank.csv', (
+        "Date,Amount,Description\n"
+        "2026-01-05,-12.00,Amazon\n"
+        "2026-01-06,250.00,Salary\n"
+    ))
+    debit, credit = iter_csv_transactions(path)
+    assert debit['amount'] == decimal.Decimal('12.00') and 'credit' not in debit
+    assert credit['credit'] is True
+
+def test_unsigned_expense_list_is_imported_as_is(tmp_path):
+    path = write(tmp_path, 'export.csv', (
+        "date,category,amount,description\n"
+        '01/05/2026,Food,"$1,234.50",Lunch\n'
+    ))
+    (row,) = iter_csv_transactions(path)
+    assert row['amount'] == decimal.Decimal('1234.50')
+    assert row['category'] == 'Food'
+    assert row['date'] == datetime.date(2026, 1, 5)
+    assert 'credit' not in row
+
+def test_identical_rows_get_distinct_import_hashes(tmp_path):
+    path = write(tmp_path, 'twice.csv', (
+        "Date,Amount,Description\n"
+        "2026-01-05,-3.50,Coffee\n"
+        "2026-01-05,-3.50,Coffee\n"
+    ))
+    first, second = iter_csv_transactions(path)
+    assert first['import_hash'] != second['import_hash']
+    assert [row['import_hash'] for row in iter_csv_transactions(path)] == [
+        first['import_hash'], second['import_hash']
+    ]
+
+def test_ofx_statement(tmp_path):
+    path = write(tmp_path, 'statement.ofx', (
+        "<OFX><STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20260110<TRNAMT>-20.00<FITID>1<NAME>Shop</STMTTRN>\n"
+        "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20260111<TRNAMT>15.00<FITID>2<NAME>Refund</STMTTRN></OFX>\n"
+    ))
+    debit, credit = iter_import_file(path)
+    assert debit['amount'] == decimal.Decimal('20.00') and debit['description'] == 'Shop'
+    assert debit['date'] == datetime.date(2026, 1, 10)
+    assert credit['credit'] is True
+    assert list(iter_ofx_transactions(path))[0]['import_hash'] == debit['import_hash']
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+from journal import Replayer, WriteJournal
+from storage import StorageDataError, StorageError
+
+def test_pending_writes_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'writes.journal')
+    journal = WriteJournal(path)
+    first = journal.append('add', amount='1.00')
+    second = journal.append('add', amount='2.00')
+    journal.mark_done([first['key']])
+    journal.close()
+
+    journal = WriteJournal(path)
+    assert [entry['key'] for entry in journal.pending()] == [second['key']]
+    assert journal.has_pending.is_set()
+    journal.mark_done([second['key']])
+    journal.close()
+    assert WriteJournal(path).pending() == []
+
+def test_torn_last_line_is_cut_before_the_next_append(tmp_path):
+    path = tmp_path / 'writes.journal'
+    journal = WriteJournal(str(path))
+    kept = journal.append('delete', id=1)
+    journal.close()
+    # A crash in the middle of the next append
+    with open(path, 'a') as handle:
+        handle.write('{"key": "torn", "op": "ad')
+
+    journal = WriteJournal(str(path))
+    assert [entry['key'] for entry in journal.pending()] == [kept['key']]
+    added = journal.append('delete', id=2)
+    journal.close()
+
+    journal = WriteJournal(str(path))
+    assert [entry['key'] for entry in journal.pending()] == [kept['key'], added['key']]
+    journal.close()
+    assert 'torn' not in path.read_text()
+
+def _replay(journal, apply_batch, **kwargs):
+    replayer = Replayer(journal, apply_batch, min_backoff=0.001, max_backoff=0.002, **kwargs)
+    done = threading.Event()
+    replayer.on_applied = lambda entries, results: None if journal.pending() else done.set()
+    replayer.on_rejected = lambda entry, error: None if journal.pending() else done.set()
+    replayer.start()
+    assert done.wait(5)
+    replayer.stop()
+    return replayer.stats()
+
+def test_transient_errors_are_retried_not_rejected(tmp_path):
+    journal = WriteJournal(str(tmp_path / 'writes.journal'))
+    entry = journal.append('add', amount='1.00')
+    failures = iter([StorageError("database is locked")] * 12)
+
+    def apply_batch(entries):
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        return {item['key']: 1 for item in entries}
+
+    stats = _replay(journal, apply_batch, permanent=(StorageDataError,), max_attempts=2)
+    assert stats['applied'] == 1 and stats['rejected'] == 0
+    assert stats['failures'] == 12
+    assert journal.pending() == []
+    journal.close()
+
+def test_bad_entry_is_isolated_and_rejected(tmp_path):
+    journal = WriteJournal(str(tmp_path / 'writes.journal'))
+    good = journal.append('add', amount='1.00')
+    bad = journal.append('add', amount='oops')
+    applied = []
+
+    def apply_batch(entries):
+        if any(entry['amount'] == 'oops' for entry in entries):
+            raise StorageDataError("Data truncated for column 'amount'")
+        applied.extend(entry['key'] for entry in entries)
+        return {entry['key']: 1 for entry in entries}
+
+    stats = _replay(journal, apply_batch, permanent=(StorageDataError,), max_attempts=2)
+    assert applied == [good['key']]
+    assert stats['rejected'] == 1
+    assert bad['key'] not in {entry['key'] for entry in journal.pending()}
+    journal.close()
+
+def test_queued_writes_apply_once(db):
+    entry = {'key': 'k1', 'op': 'add', 'amount': '3.50', 'category': 'Food', 'date': '2026-06-01'}
+    results = db.apply_queued_writes([entry])
+    assert isinstance(results['k1'], int)
+    # A replay after a lost acknowledgement is skipped
+    assert db.apply_queued_writes([entry]) == {'k1': None}
+    assert len(db.get_monthly_expenses(2026, 6)) == 1
+    assert db.verify_category_totals() == []
+
+def test_constraint_errors_are_data_errors(db):
+    entry = {'key': 'k2', 'op': 'add', 'amount': '1.00', 'category': None, 'date': '2026-06-01'}
+    with pytest.raises(db.QUEUED_WRITE_DATA_ERRORS):
+        db.apply_queued_writes([entry])
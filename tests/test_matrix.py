@@ -0,0 +1,16 @@
+import datetime
+import decimal
+
+def test_matrix_spans_months_without_data(db):
+    db.add_transaction(decimal.Decimal('10.00'), 'Food', datetime.date(2025, 12, 5), None)
+    db.add_transaction(decimal.Decimal('4.00'), 'Food', datetime.date(2026, 2, 1), None)
+    db.add_transaction(decimal.Decimal('7.50'), 'Bills', datetime.date(2026, 2, 3), None)
+    matrix = db.get_category_matrix(2025, 12, 2026, 2)
+    assert matrix['months'] == [(2025, 12), (2026, 1), (2026, 2)]
+    assert matrix['categories'] == ['Bills', 'Food']
+    assert matrix['totals'].tolist() == [[0.0, 10.0], [0.0, 0.0], [7.5, 4.0]]
+
+def test_cached_matrix_cannot_be_changed_by_callers(db):
+    db.add_transaction(decimal.Decimal('10.00'), 'Food', datetime.date(2026, 1, 5), None)
+    db.get_category_matrix(2026, 1, 2026, 1)['totals'][0, 0] = -1
+    assert db.get_category_matrix(2026, 1, 2026, 1)['totals'].tolist() == [[10.0]]
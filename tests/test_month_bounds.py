@@ -0,0 +1,9 @@
+import datetime
+
+from database import month_bounds
+
+def test_month_bounds_are_half_open():
+    assert month_bounds(2024, 2) == (datetime.date(2024, 2, 1), datetime.date(2024, 3, 1))
+
+def test_december_ends_on_the_first_of_next_year():
+    assert month_bounds(2023, 12) == (datetime.date(2023, 12, 1), datetime.date(2024, 1, 1))
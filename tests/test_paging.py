@@ -0,0 +1,26 @@
+import datetime
+import decimal
+
+def test_keyset_pages_cover_the_range_once(db):
+    day = datetime.date(2026, 3, 1)
+    ids = [db.add_transaction(decimal.Decimal('1.00'), 'Food', day + datetime.timedelta(days=i % 4), f"row {i}")
+           for i in range(10)]
+    start, end = db.month_bounds(2026, 3)
+    pages = [db.get_expenses_page(start, end, limit=4)]
+    while len(pages[-1]) == 4:
+        last = pages[-1][-1]
+        pages.append(db.get_expenses_page(start, end, after=(last['date'], last['id']), limit=4))
+    seen = [row['id'] for page in pages for row in page]
+    assert sorted(seen) == sorted(ids)
+    keys = [(row['date'], row['id']) for page in pages for row in page]
+    assert keys == sorted(keys, reverse=True)
+    first = pages[1][0]
+    assert db.get_expenses_page(start, end, before=(first['date'], first['id']), limit=4) == pages[0]
+
+def test_summary_total_is_a_decimal(db):
+    start, end = db.month_bounds(2026, 3)
+    assert db.get_expenses_summary(start, end) == {'count': 0, 'total': decimal.Decimal('0')}
+    db.add_transaction(decimal.Decimal('2.50'), 'Food', start, None)
+    summary = db.get_expenses_summary(start, end)
+    assert summary['count'] == 1
+    assert isinstance(summary['total'], decimal.Decimal) and summary['total'] == decimal.Decimal('2.50')
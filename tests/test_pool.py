@@ -0,0 +1,51 @@
+import pytest
+
+import database
+from storage import SQLiteBackend, StorageError
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteBackend(str(tmp_path / 'pool.db'))
+
+def test_connections_are_reused(backend):
+    pool = database.ConnectionPool(backend.connect, size=2, timeout=0.1)
+    pool.acquire().close()
+    pool.acquire().close()
+    stats = pool.stats()
+    assert stats['opens'] == 1 and stats['checkouts'] == 2 and stats['in_use'] == 0
+
+def test_checkout_times_out_when_every_connection_is_in_use(backend):
+    pool = database.ConnectionPool(backend.connect, size=1, timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(database.PoolTimeoutError):
+        pool.acquire()
+    held.close()
+    assert pool.stats()['timeouts'] == 1
+    pool.acquire().close()
+
+def test_release_rolls_back_uncommitted_work(backend):
+    pool = database.ConnectionPool(backend.connect, size=1, timeout=0.1)
+    connection = pool.acquire()
+    cursor = connection.cursor()
+    cursor.execute("CREATE TABLE t (x INT)")
+    connection.commit()
+    cursor.execute("INSERT INTO t VALUES (1)")
+    cursor.close()
+    connection.close()
+    connection = pool.acquire()
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM t")
+    assert cursor.fetchone() == (0,)
+    connection.close()
+
+class BrokenSchema(SQLiteBackend):
+    def create_schema(self, cursor):
+        raise StorageError("DDL failed")
+
+def test_create_tables_returns_its_connection_on_error(tmp_path):
+    database.set_backend(BrokenSchema(str(tmp_path / 'broken.db')))
+    try:
+        database.create_tables()
+        assert database.get_pool_stats()['in_use'] == 0
+    finally:
+        database.set_backend(None)
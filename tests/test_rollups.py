@@ -0,0 +1,26 @@
+import datetime
+import decimal
+
+def by_category(db, year, month):
+    return {row['category']: row['total'] for row in db.get_expenses_by_category(year, month)}
+
+def test_rollups_follow_updates_and_deletes(db):
+    march, april = datetime.date(2026, 3, 10), datetime.date(2026, 4, 2)
+    lunch = db.add_transaction(decimal.Decimal('12.00'), 'Food', march, 'lunch')
+    taxi = db.add_transaction(decimal.Decimal('30.00'), 'Transport', march, 'taxi')
+    db.add_transaction(decimal.Decimal('8.00'), 'Food', march, 'snack')
+    assert by_category(db, 2026, 3) == {'Food': decimal.Decimal('20.00'), 'Transport': decimal.Decimal('30.00')}
+
+    # New amount, category and month in one update
+    assert db.update_transaction(lunch, decimal.Decimal('15.00'), 'Transport', april, 'lunch')
+    assert db.delete_transaction(taxi)
+    assert by_category(db, 2026, 3) == {'Food': decimal.Decimal('8.00')}
+    assert by_category(db, 2026, 4) == {'Transport': decimal.Decimal('15.00')}
+    assert db.verify_category_totals() == []
+
+def test_import_updates_rollups(db, tmp_path):
+    path = tmp_path / 'bank.csv'
+    path.write_text("Date,Amount,Description\n2026-03-01,-4.00,Coffee\n2026-03-02,-6.00,Coffee\n")
+    assert db.import_transactions(db.iter_import_file(str(path)))['inserted'] == 2
+    assert by_category(db, 2026, 3) == {'Other': decimal.Decimal('10.00')}
+    assert db.verify_category_totals() == []
@@ -0,0 +1,119 @@
+import datetime
+import decimal
+import random
+import re
+
+import pytest
+
+import database
+from rules import RuleSet, validate_rule
+from storage import SQLiteBackend
+
+def rule(id, priority, category, pattern=None, kind='contains', min_amount=None, max_amount=None):
+    return {'id': id, 'priority': priority, 'kind': kind, 'pattern': pattern,
+            'min_amount': min_amount, 'max_amount': max_amount, 'category': category}
+
+def test_first_rule_by_priority_then_id_wins():
+    rules = RuleSet([
+        rule(1, 5, 'Shopping', 'amazon'),
+        rule(2, 1, 'Books', 'amazon books'),
+        rule(3, 1, 'Kindle', 'kindle'),
+        rule(4, 0, 'Big', min_amount=100),
+        rule(5, 5, 'Later', 'amazon'),
+    ])
+    # A longer, lower-ranked substring doesn't beat a higher-ranked one, and vice versa
+    assert rules.category_for('AMAZON BOOKS order', decimal.Decimal('10')) == 'Books'
+    assert rules.category_for('amazon kindle books', decimal.Decimal('10')) == 'Kindle'
+    assert rules.category_for('Amazon fresh', decimal.Decimal('10')) == 'Shopping'
+    assert rules.category_for('Amazon fresh', decimal.Decimal('150')) == 'Big'
+    # Without an amount, amount-bounded rules never match
+    assert rules.category_for('Amazon fresh') == 'Shopping'
+    assert rules.category_for('bakery', decimal.Decimal('5')) is None
+
+def test_regex_and_substring_rules_share_one_order():
+    rules = RuleSet([
+        rule(1, 2, 'Coffee', r'^(starbucks|costa)\b', kind='regex', max_amount=20),
+        rule(2, 1, 'Travel', 'costa rica'),
+        rule(3, 3, 'Food', 'costa'),
+    ])
+    assert rules.category_for('Costa Rica flights', decimal.Decimal('5')) == 'Travel'
+    assert rules.category_for('Costa coffee', decimal.Decimal('5')) == 'Coffee'
+    assert rules.category_for('Costa coffee', decimal.Decimal('25')) == 'Food'
+
+def _naive(rules, description, amount):
+    ordered = sorted(rules, key=lambda r: (r['priority'], r['id']))
+    for index, r in enumerate(ordered):
+        low, high = validate_rule(r['kind'], r['pattern'], r['min_amount'], r['max_amount'])
+        if (low is not None or high is not None) and (
+                amount is None or (low is not None and amount < low) or (high is not None and amount > high)):
+            continue
+        if r['pattern'] is None:
+            return index
+        if r['kind'] == 'contains' and r['pattern'].lower() in description.lower():
+            return index
+        if r['kind'] == 'regex' and re.search(r['pattern'], description, re.IGNORECASE):
+            return index
+    return None
+
+def test_matches_a_rule_by_rule_scan():
+    rng = random.Random(5)
+    words = ['uber', 'uber eats', 'ub', 'shell', 'shell oil', 'amazon', 'amaz', 'netflix', 'eats']
+    rules = []
+    for i in range(40):
+        low = rng.choice([None, None, 0, 10, 50])
+        high = rng.choice([None, None, 20, 60, 200])
+        if low is not None and high is not None and low > high:
+            low, high = high, low
+        kind = rng.choice(['contains', 'contains', 'regex'])
+        pattern = rng.choice(words) if kind == 'contains' else rf"\b{rng.choice(words)}\b"
+        if rng.random() < 0.1 and (low is not None or high is not None):
+            pattern = None
+        rules.append(rule(rng.randrange(1000), rng.randrange(5), f"C{i}", pattern, kind, low, high))
+    rule_set = RuleSet(rules)
+    for _ in range(500):
+        description = ' '.join(rng.choice(words + ['store', '#12', 'Paris']) for _ in range(3)).upper()
+        amount = rng.choice([None, decimal.Decimal(rng.randrange(0, 30000)) / 100])
+        assert rule_set.match(description, amount) == _naive(rules, description, amount), (description, amount)
+
+def test_invalid_rules_are_refused():
+    with pytest.raises(ValueError):
+        validate_rule('contains', None)
+    with pytest.raises(ValueError):
+        validate_rule('regex', r'(?P<x>a)')
+    with pytest.raises(ValueError):
+        validate_rule('contains', 'x', min_amount=5, max_amount=1)
+
+def by_category(db, year, month):
+    return {row['category']: row['total'] for row in db.get_expenses_by_category(year, month)}
+
+def test_imports_and_stored_rows_are_categorized(db, tmp_path):
+    db.add_rule('contains', 'uber trip', 'Transport')
+    db.add_rule('contains', 'uber', 'Food', priority=100)
+    day = datetime.date(2026, 9, 1)
+    db.add_transaction(decimal.Decimal('9.00'), 'Other', day, 'UBER TRIP 123')
+    db.add_transaction(decimal.Decimal('4.00'), 'Bills', day, 'Uber eats')
+    path = tmp_path / 'bank.csv'
+    path.write_text("Date,Amount,Description\n2026-09-02,-12.00,Uber trip to airport\n")
+    assert db.import_transactions(db.iter_import_file(str(path)))['inserted'] == 1
+
+    assert db.suggest_category('uber eats', 10) == 'Food'
+    assert db.apply_rules(only=['Other'], chunk_size=1) == {'processed': 1, 'changed': 1}
+    assert by_category(db, 2026, 9) == {'Transport': decimal.Decimal('21.00'), 'Bills': decimal.Decimal('4.00')}
+    assert db.apply_rules()['changed'] == 1
+    assert by_category(db, 2026, 9) == {'Transport': decimal.Decimal('21.00'), 'Food': decimal.Decimal('4.00')}
+    assert db.verify_category_totals() == []
+
+def test_migration_copies_rules(db, tmp_path):
+    db.add_rule('regex', r'^costa\b', 'Coffee', max_amount=20)
+    db.add_rule('contains', 'costa', 'Food')
+    source = database.get_backend()
+    target = SQLiteBackend(str(tmp_path / 'copy.db'))
+    assert database.migrate_storage(source, target) == 0
+
+    database.set_backend(target)
+    database.create_tables()
+    copied = database.get_rules()
+    assert [(r['kind'], r['pattern'], r['category']) for r in copied] == [
+        ('regex', r'^costa\b', 'Coffee'), ('contains', 'costa', 'Food')
+    ]
+    assert database.suggest_category('Costa coffee', 5) == 'Coffee'
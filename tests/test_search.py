@@ -0,0 +1,29 @@
+import datetime
+import decimal
+
+def test_prefix_search_needs_every_term(db):
+    day = datetime.date(2026, 5, 1)
+    db.add_transaction(decimal.Decimal('9.99'), 'Shopping', day, 'Amazon order books')
+    db.add_transaction(decimal.Decimal('4.50'), 'Food', day, 'Amazon fresh')
+    db.add_transaction(decimal.Decimal('3.00'), 'Food', day, 'Corner bakery')
+    assert {row['description'] for row in db.search_expenses('amaz')} == {'Amazon order books', 'Amazon fresh'}
+    assert [row['description'] for row in db.search_expenses('amaz boo')] == ['Amazon order books']
+    assert db.search_expenses('   ') == []
+
+def test_search_follows_updates_and_deletes(db):
+    day = datetime.date(2026, 5, 2)
+    db.add_transaction(decimal.Decimal('2.00'), 'Food', day, 'Coffee shop')
+    row = db.search_expenses('coffee')[0]
+    db.update_transaction(row['id'], row['amount'], row['category'], row['date'], 'Tea house')
+    assert db.search_expenses('coffee') == []
+    assert [found['id'] for found in db.search_expenses('tea')] == [row['id']]
+    db.delete_transaction(row['id'])
+    assert db.search_expenses('tea') == []
+
+def test_search_pages(db):
+    for i in range(5):
+        db.add_transaction(decimal.Decimal('1.00'), 'Food', datetime.date(2026, 5, 1 + i), f"Lunch {i}")
+    first = db.search_expenses('lunch', limit=3)
+    second = db.search_expenses('lunch', limit=3, offset=3)
+    assert len(first) == 3 and len(second) == 2
+    assert not {row['id'] for row in first} & {row['id'] for row in second}
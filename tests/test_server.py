@@ -0,0 +1,93 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+
+import pytest
+
+import database
+from server import APIServer, InsertBatcher
+from storage import StorageDataError
+
+def _batch(rows):
+    return [(row, Future()) for row in rows]
+
+def test_rejected_row_only_fails_its_own_request():
+    calls = []
+
+    def write_batch(rows):
+        calls.append(len(rows))
+        if any(row == 'bad' for row in rows):
+            raise StorageDataError("Data too long for column 'category'")
+        return [f"id-{row}" for row in rows]
+
+    batch = _batch(['a', 'bad', 'b'])
+    InsertBatcher(write_batch)._write(batch)
+    assert calls == [3, 1, 1, 1]
+    assert batch[0][1].result() == 'id-a' and batch[2][1].result() == 'id-b'
+    with pytest.raises(StorageDataError):
+        batch[1][1].result()
+
+def test_unreachable_database_fails_the_batch_at_once():
+    calls = []
+
+    def write_batch(rows):
+        calls.append(len(rows))
+        return None
+
+    batch = _batch(range(500))
+    InsertBatcher(write_batch)._write(batch)
+    assert calls == [500]
+    assert all(future.result() is None for _, future in batch)
+
+@pytest.fixture
+def api(db):
+    server = APIServer(('127.0.0.1', 0), workers=4)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def _request(url, body=None):
+    data = None if body is None else json.dumps(body).encode('utf-8')
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=5) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+def test_insert_and_page(api):
+    for day in range(1, 4):
+        status, _ = _request(f"{api}/transactions", {'amount': '2.50', 'category': 'Food', 'date': f"2026-07-0{day}"})
+        assert status == 201
+    status, page = _request(f"{api}/transactions?start=2026-07-01&end=2026-08-01&limit=2")
+    assert status == 200
+    assert [row['date'] for row in page['transactions']] == ['2026-07-03', '2026-07-02']
+    status, rest = _request(f"{api}/transactions?start=2026-07-01&end=2026-08-01&limit=2&after={page['next']}")
+    assert [row['date'] for row in rest['transactions']] == ['2026-07-01'] and rest['next'] is None
+
+@pytest.mark.parametrize('limit', ['0', '-1'])
+def test_limit_must_be_positive(api, limit):
+    status, payload = _request(f"{api}/transactions?start=2026-07-01&end=2026-08-01&limit={limit}")
+    assert status == 400
+    assert 'limit' in payload['error']
+
+def test_limit_is_capped(api, monkeypatch):
+    limits = []
+    monkeypatch.setattr(database, 'get_expenses_page', lambda *args, **kwargs: limits.append(kwargs['limit']) or [])
+    status, _ = _request(f"{api}/transactions?start=2026-07-01&end=2026-08-01&limit=100000")
+    assert status == 200 and limits == [1000]
+
+def test_archived_year_answers_409(api, monkeypatch):
+    monkeypatch.setattr(database, 'ARCHIVE_STATE_TTL', 0)
+    status, row = _request(f"{api}/transactions", {'amount': '4.00', 'category': 'Food', 'date': '2024-02-01'})
+    assert status == 201
+    assert database.archive_year(2024) == 1
+    status, payload = _request(f"{api}/transactions", {'amount': '4.00', 'category': 'Food', 'date': '2024-02-02'})
+    assert status == 409 and '2024' in payload['error']
+    request = urllib.request.Request(f"{api}/transactions/{row['id']}", method='DELETE')
+    with pytest.raises(urllib.error.HTTPError) as raised:
+        urllib.request.urlopen(request, timeout=5)
+    assert raised.value.code == 409
@@ -0,0 +1,37 @@
+import datetime
+import decimal
+import threading
+
+from storage import SQLiteBackend, _sqlite_dialect
+
+def test_locking_read_opens_a_write_transaction(tmp_path):
+    connection = SQLiteBackend(str(tmp_path / 'lock.db')).connect()
+    cursor = connection.cursor()
+    cursor.execute("CREATE TABLE t (x INT)")
+    connection.commit()
+    cursor.execute("SELECT x FROM t WHERE x = %s", (1,))
+    assert not connection.in_transaction
+    cursor.execute("SELECT x FROM t WHERE x = %s FOR UPDATE", (1,))
+    assert connection.in_transaction
+    connection.rollback()
+    connection.close()
+
+def test_dialect_memo_is_bounded():
+    assert _sqlite_dialect("SELECT * FROM t WHERE id = %s FOR UPDATE") == "SELECT * FROM t WHERE id = ?"
+    assert _sqlite_dialect.cache_info().maxsize is not None
+
+def test_concurrent_updates_keep_rollups_exact(db):
+    day = datetime.date(2026, 5, 1)
+    ids = [db.add_transaction(decimal.Decimal('1.00'), 'Food', day, None) for _ in range(3)]
+
+    def worker(n):
+        for i in range(20):
+            category = ('Food', 'Bills', 'Travel')[(n + i) % 3]
+            db.update_transaction(ids[i % 3], decimal.Decimal(n + i), category, day, None)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert db.verify_category_totals() == []
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from storage import SQLiteBackend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_database_module_does_not_load_numpy():
+    loaded = subprocess.run(
+        [sys.executable, '-c', "import sys, database; print('numpy' in sys.modules)"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.split()[-1]
+    assert loaded == 'False'
+
+def test_current_schema_skips_the_ddl(db, monkeypatch):
+    db.set_backend(SQLiteBackend(db.get_backend().path))
+    monkeypatch.setattr(db, 'create_database', lambda: pytest.fail("the schema was set up again"))
+    db.create_tables()
+    assert db.schema_is_current()